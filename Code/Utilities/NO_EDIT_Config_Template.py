@@ -34,6 +34,21 @@ MEASUREMENT_CHANNEL_1_8V = 2  # AD2 scope channel for measuring the 1.8V referen
 ACCEPTABLE_VOLTAGE_RANGE_1_1V = [1.0, 1.2]  # Acceptable range (in volts) for the 1.1V reference voltage
 ACCEPTABLE_VOLTAGE_RANGE_1_8V = [1.7, 1.9]  # Acceptable range (in volts) for the 1.8V reference voltage
 
+REFERENCE_VOLTAGE_SAMPLES = 4096  # Samples per channel averaged for each reference voltage measurement
+REFERENCE_VOLTAGE_SAMPLE_RATE_HZ = 1e6  # Sample rate (in Hz) used for the reference voltage measurements
+
+ANALOG_CALIBRATION_ENABLED = True  # Correct scope offset/gain per (device, channel, mux route) using the AD2 wavegen
+CALIBRATION_LEVELS_V = [0.2, 1.0, 1.8]  # DC levels (in volts) driven by the wavegen to fit offset and gain
+CALIBRATION_MAX_AGE_HOURS = 24  # Calibrations (and failed calibrations) older than this are measured again
+CALIBRATION_MUX_INPUT = None  # Unused Pico mux input (nothing wired to it) the wavegen is looped back to the scope through, 'direct' if the wavegen is wired straight to the scope channels, None skips calibration. Never a SCuM output
+
+FREQUENCY_ACCURACY_CORRECTION = True  # Correct determine_signal_frequency (the averaged estimator) with the table from test_frequency_measurement_accuracy, the table holds that estimator's own error
+
+SEQUENTIAL_TESTING = True  # Acquire only until each voltage/clock result is clearly inside or outside its limits (clocks only with the single-pass FREQUENCY_ESTIMATOR of analog_test.py)
+SEQUENTIAL_MAX_ACQUISITIONS = 10  # Maximum acquisitions per check when SEQUENTIAL_TESTING is enabled
+SEQUENTIAL_MIN_ACQUISITIONS = 2  # Agreeing clock acquisitions needed before a SEQUENTIAL_TESTING early decision
+PIPELINED_CLOCK_VALIDATION = True  # Analyze each clock capture while the next clock is switched in and acquired
+
 CLOCKS_TO_TEST = [    # List of clocks to test     
     {'name': "HFCLK",   'exp_freq_hz': 20000000,    'tolerance_ppm': 40, 'mux-command': '1_5'},
     {'name': "LFCLK",   'exp_freq_hz': 20000000,    'tolerance_ppm': 40, 'mux-command': '1_15'}
@@ -42,6 +57,53 @@ CLOCKS_TO_TEST = [    # List of clocks to test
 PPM = ((exp_freq_hz - measured_freq_hz) / exp_freq_hz) * 1_000_000
 ''' 
 
+########################
+# Serial Test Configuration
+# (Configuration settings for serial_baud_test.py)
+########################
+
+SERIAL_BAUD_FROM_LOGIC = False  # Serial communication test: detect the baud rate from SCuM's UART TX line with the logic analyzer instead of probing SCUM_SERIAL_COM_PORT
+SCUM_UART_TX_PIN = 2  # DIO pin on the DD connected to SCuM's UART TX (for find_baud_rate_from_logic)
+UART_LOGIC_SAMPLE_RATE_HZ = 2e6  # Logic analyzer sample rate (in Hz) used to capture the UART line
+UART_LOGIC_CAPTURE_SAMPLES = 262144  # Samples captured from the UART line (262144 at 2 MHz = 131 ms)
+
+########################
+# RF Test Configuration
+# (Configuration settings for RF_tx_rx_tests.py)
+########################
+
+RF_SDR_SESSION_REUSE = True  # Keep each Pluto SDR connected for the whole run instead of reconnecting in every RF test and retry
+RF_SDR_REUSE_FLUSH_BUFFERS = 4  # Rx buffers discarded when a Pluto is reused with unchanged settings (instead of the full warm-up)
+
+RF_SELF_TEST_SYMBOLS = 6400  # FSK symbols compared by the radio self test (6400 keeps the original 12800 sample Rx buffer, a BER of 0 then bounds it below 0.06%)
+
+RF_RAW_IQ_RETENTION = None  # Raw IQ kept from the LUT sweep: None (per-step summary only), 'archive' (every step written to raw_iq.npy as it is received) or 'slice' (the start of every step)
+RF_RAW_IQ_SLICE_SAMPLES = 8192  # Samples kept per sweep step when RF_RAW_IQ_RETENTION is 'slice' (written to raw_iq_slices.npy at the end of the sweep)
+
+RF_PEAK_FFT_SIZE = 131072  # FFT length used to find the peak of each sweep step (None for the longest power of two that fits the Rx buffer)
+RF_PEAK_SEGMENTS = 1  # Number of 50% overlapping FFT segments averaged per step (Welch), 1 for a single FFT
+RF_PEAK_INTERPOLATE = True  # Interpolate the peak frequency between FFT bins
+
+RF_SWEEP_PIPELINED = True  # Receive the next sweep step on one thread while worker threads find the peaks of the previous ones
+RF_SWEEP_QUEUE_DEPTH = 4  # Received buffers waiting for analysis before the receiver is held back
+RF_SWEEP_WORKERS = 2  # Worker threads analyzing the sweep buffers
+
+RF_SCUM_FULL_LUT = False  # Run the full 7x32x32 coarse/mid/fine LUT sweep instead of the 126 step sweep (needs a SCuM binary transmitting every setting)
+RF_FULL_LUT_RESOLUTION_HZ = 5e3  # Frequency resolution (in Hz) the Rx buffer of each full LUT step is sized for
+RF_FULL_LUT_MIN_SNR_DB = 15  # A full LUT step is captured again (up to RF_FULL_LUT_MAX_CAPTURES) until its tone is this far above the noise
+RF_FULL_LUT_MAX_CAPTURES = 4  # Maximum captures per full LUT step
+
+RF_SCUM_CHIP_ID = None  # Unique name of the SCuM chip under test (e.g. "scum-A07"), the LUT of every sweep is saved under it. Set it for every chip, RF_LUT_INCREMENTAL is refused without it
+RF_LUT_LIBRARY_DIR = "LUTs"  # Folder of the saved LUTs (one binary file per chip and run), relative to the Pluto results folder
+
+RF_LUT_INCREMENTAL = False  # Start from the last saved LUT of RF_SCUM_CHIP_ID and only capture the regions that drifted from it
+RF_LUT_RESWEEP_THRESHOLD_HZ = 25e3  # Drift of a region's first step (probe) from the saved LUT above which the region is captured again
+RF_LUT_RESWEEP_REGION_MIDS = 6  # Mid settings per region (of one coarse setting) decided by one probe
+
+RF_LUT_MODEL_SPARSE = False  # Full LUT sweep: capture a sparse grid of fine codes and predict the rest from a per coarse band model
+RF_LUT_MODEL_FINE_STRIDE = 8  # Fine code spacing of the sparse grid (the first row of each coarse band and the last fine code are always captured)
+RF_LUT_MODEL_TOLERANCE_HZ = 10e3  # A grid step further than this from the model's prediction makes the rest of its row captured densely
+
 #########################
 # Joulescope Configuration
 # (Used by power_test.py)
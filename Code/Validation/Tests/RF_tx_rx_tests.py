@@ -1,5 +1,4 @@
 import numpy as np
-import adi 
 import matplotlib.pyplot as plt
 import time
 import pandas as pd
@@ -8,7 +7,21 @@ import os
 import sys
 import contextlib
 import io
+import json
+import queue
+import threading
 from Validation.Tests.helpers import wait_for_trigger
+from Validation.Tests.sdr_session import open_pluto, close_pluto
+from Validation.Tests.rf_spectrum import SpectralPeakFinder, buffer_size_for_resolution
+from Validation.Tests.lut_store import LutStore, lut_path, latest_lut_path
+from Validation.Tests.lut_resweep import IncrementalResweep
+from Validation.Tests.lut_model import SparseLutPlanner
+from config import RF_RAW_IQ_RETENTION, RF_RAW_IQ_SLICE_SAMPLES, RF_PEAK_FFT_SIZE, RF_PEAK_SEGMENTS, RF_PEAK_INTERPOLATE
+from config import RF_SWEEP_PIPELINED, RF_SWEEP_QUEUE_DEPTH, RF_SWEEP_WORKERS
+from config import RF_FULL_LUT_RESOLUTION_HZ, RF_FULL_LUT_MIN_SNR_DB, RF_FULL_LUT_MAX_CAPTURES, RF_SDR_REUSE_FLUSH_BUFFERS
+from config import RF_SELF_TEST_SYMBOLS, RF_SCUM_CHIP_ID, RF_LUT_LIBRARY_DIR
+from config import RF_LUT_INCREMENTAL, RF_LUT_RESWEEP_THRESHOLD_HZ, RF_LUT_RESWEEP_REGION_MIDS
+from config import RF_LUT_MODEL_SPARSE, RF_LUT_MODEL_FINE_STRIDE, RF_LUT_MODEL_TOLERANCE_HZ
 
 
 
@@ -16,16 +29,418 @@ from Validation.Tests.helpers import wait_for_trigger
 sr = 1e6 # Sample rate
 cw = 2.405e9 # Center frequency
 samples = 100
-num_symbols = 100
+num_symbols = RF_SELF_TEST_SYMBOLS
 samples_per_symbol = 2
+ber_confidence_z = 1.96  # Normal quantile of the reported BER upper bound (95% confidence)
+
+# Peak finder settings, stage timings, full LUT counts, incremental resweep report and LUT file of the last sweep (reported by RF_end_test)
+peak_finder_summary = None
+sweep_timings = None
+full_lut_summary = None
+resweep_summary = None
+lut_file = None
+
+# Rx and Tx Pluto SDRs
+RX_PLUTO_URI = "ip:192.168.2.2"
+TX_PLUTO_URI = "ip:192.168.2.3"
 
 # General overall test result storage folder
 default_results_path = os.path.join(os.path.dirname(__file__), '..\\..', 'ResultBackups\\PlutoResults')
 
+# SCuM LUT sweep (RF_SCuM_test)
+SWEEP_COARSE_START = 23         # First coarse setting transmitted by SCuM
+SWEEP_COARSE_STEPS = 7          # Coarse settings in the sweep
+SWEEP_MID_STEPS = 18            # Mid settings per coarse setting
+SWEEP_START_LO_HZ = 2.3808e9    # Rx LO of the first step
+SWEEP_LO_STEP_HZ = 800000       # Rx LO increment per step
+SWEEP_SAMPLE_RATE_HZ = 5e6
+SWEEP_RF_BANDWIDTH_HZ = 1.6e6
+SWEEP_BUFFER_SIZE = 1600000     # Rx samples per step
+
+# Full resolution SCuM LUT sweep (RF_SCuM_full_lut_test), same coarse range as above
+FULL_LUT_MID_STEPS = 32
+FULL_LUT_FINE_STEPS = 32
+FULL_LUT_FINE_LO_STEP_HZ = 100000       # Planned LO increment per fine step (per mid step: SWEEP_LO_STEP_HZ)
+FULL_LUT_COARSE_LO_STEP_HZ = 15000000   # Planned LO increment per coarse step
+FULL_LUT_SAMPLE_RATE_HZ = 5e6
+FULL_LUT_RF_BANDWIDTH_HZ = 4e6
+FULL_LUT_TUNE_OFFSET_HZ = 300000        # The expected tone is placed this far above the LO when retuning
+FULL_LUT_DC_GUARD_HZ = 100000           # Retune when the expected tone gets closer than this to the LO (DC)...
+FULL_LUT_EDGE_GUARD_HZ = 300000         # ...or to the edge of the Rx bandwidth
+FULL_LUT_DTYPE = np.dtype([('coarse', np.uint8), ('mid', np.uint8), ('fine', np.uint8), ('frequency_hz', np.float64), ('snr_db', np.float32), ('captures', np.uint8), ('rx_lo_hz', np.int64), ('measured', np.bool_)])
+
+RAW_IQ_ARCHIVE = 'archive'
+RAW_IQ_SLICE = 'slice'
+
+
+# LUTs of sweeps run without RF_SCUM_CHIP_ID are saved under this name (and never reused)
+UNNAMED_CHIP_ID = 'unnamed'
+
+
+def lut_library_path():
+    '''
+    The directory of the saved LUTs of every chip (RF_LUT_LIBRARY_DIR, under the results folder if relative)
+    '''
+    return os.path.join(default_results_path, RF_LUT_LIBRARY_DIR)
+
+
+def save_lut(settings, frequencies, measured=None, measured_runs=None):
+    '''
+    Index the LUT of the sweep and save it in the LUT library, as the run of RF_SCUM_CHIP_ID
+    (UNNAMED_CHIP_ID if not set) named after the timestamped results folder
+
+    Parameters:
+        settings (list): [coarse, mid, fine] of each step
+        frequencies (list): The frequency of each step in Hz (None or NaN if not measured)
+        measured (list): Whether each step was measured (False if predicted), None if all were
+        measured_runs (list): The run each step was last measured in, None if the measured steps all were in this run
+
+    Returns:
+        lut (LutStore): The indexed LUT
+    '''
+    global lut_file
+    run = os.path.basename(timestamped_path)
+    if measured_runs is None:
+        measured_runs = [run if step_measured else '' for step_measured in (np.ones(len(settings), dtype=bool) if measured is None else measured)]
+    lut = LutStore.from_settings(settings, np.array(frequencies, dtype=np.float64), measured, measured_runs)
+    chip_id = UNNAMED_CHIP_ID if RF_SCUM_CHIP_ID is None else RF_SCUM_CHIP_ID
+    lut_file = lut_path(lut_library_path(), chip_id, run)
+    lut.save(lut_file)
+    print(f"LUT of {len(lut)} settings saved to {lut_file}")
+    return lut
+
+
+def lut_sweep_settings():
+    '''
+    The steps of the SCuM LUT sweep, in the order SCuM transmits them
+
+    Returns:
+        steps (list): [coarse, mid, fine, rx_lo] of each step, rx_lo in Hz
+    '''
+    steps = []
+    lo = SWEEP_START_LO_HZ
+    for coarse in range(SWEEP_COARSE_START, SWEEP_COARSE_START + SWEEP_COARSE_STEPS):
+        for mid in range(SWEEP_MID_STEPS):
+            steps.append([coarse, mid, 0, int(lo)])
+            lo += SWEEP_LO_STEP_HZ
+    return steps
+
+
+class RawIQStore:
+    '''
+    Opt-in retention of the raw IQ buffers of a sweep, one row per step.
+
+    'archive' appends every buffer to a complex64 .npy file (raw_iq.npy) as it arrives (open it
+    with np.load(path, mmap_mode='r')), 'slice' keeps the first slice_samples of every buffer
+    in memory and writes them to raw_iq_slices.npy on close(). Either way at most one full
+    buffer is held at a time, and the step names are written to a .json file next to the .npy.
+    '''
+
+    def __init__(self, mode, n_steps, n_samples, output_dir, slice_samples=RF_RAW_IQ_SLICE_SAMPLES):
+        '''
+        Parameters:
+            mode (str): RAW_IQ_ARCHIVE, RAW_IQ_SLICE or None to keep nothing
+            n_steps (int): The number of steps in the sweep
+            n_samples (int): The samples per step (shorter buffers are zero padded)
+            output_dir (str): The directory of the .npy and .json files
+            slice_samples (int): The samples kept per step in 'slice' mode
+        '''
+        if mode not in (None, RAW_IQ_ARCHIVE, RAW_IQ_SLICE):
+            raise ValueError(f"Unknown raw IQ retention mode: {mode}")
+        self.mode = mode
+        self.n_steps = n_steps
+        self.n_samples = n_samples
+        self.headers = [None] * n_steps
+        self.slices = None
+        self.path = None
+        self._file = None
+        self._lock = threading.Lock()
+
+        if mode == RAW_IQ_ARCHIVE:
+            self.path = os.path.join(output_dir, "raw_iq.npy")
+            self._file = open(self.path, "wb")
+            np.lib.format.write_array_header_1_0(self._file, {'descr': np.lib.format.dtype_to_descr(np.dtype(np.complex64)), 'fortran_order': False, 'shape': (n_steps, n_samples)})
+            self._data_offset = self._file.tell()
+        elif mode == RAW_IQ_SLICE:
+            self.path = os.path.join(output_dir, "raw_iq_slices.npy")
+            self.slice_samples = slice_samples
+            self.slices = np.zeros((n_steps, slice_samples), dtype=np.complex64)
+
+    def add(self, step, header, samples):
+        '''
+        Keep the buffer of a step (steps can be added in any order, from any thread)
+
+        Parameters:
+            step (int): The index of the step in the sweep
+            header (str): The step name ("coarse, mid, fine")
+            samples (numpy array): The received IQ samples
+        '''
+        if self.mode is None:
+            return
+        self.headers[step] = header
+        if self.mode == RAW_IQ_SLICE:
+            kept = samples[:self.slice_samples]
+            self.slices[step, :len(kept)] = kept
+            return
+
+        row = np.zeros(self.n_samples, dtype=np.complex64)
+        row[:min(len(samples), self.n_samples)] = samples[:self.n_samples]
+        with self._lock:
+            self._file.seek(self._data_offset + step * row.nbytes)
+            self._file.write(row.tobytes())
+
+    def close(self, sample_rate_hz):
+        '''
+        Finish the archive (or write the slices) and write the step names next to it
+
+        Parameters:
+            sample_rate_hz (float): The sample rate of the buffers
+        '''
+        if self._file is None and self.slices is None:
+            return
+        # Steps that were never received (aborted sweep) are left as zeros
+        if self.mode == RAW_IQ_SLICE:
+            np.save(self.path, self.slices)
+            self.slices = None
+        else:
+            self._file.truncate(self._data_offset + self.n_steps * self.n_samples * np.dtype(np.complex64).itemsize)
+            self._file.close()
+            self._file = None
+        with open(os.path.splitext(self.path)[0] + ".json", "w") as f:
+            json.dump({'file': os.path.basename(self.path), 'dtype': 'complex64', 'sample_rate_hz': sample_rate_hz, 'steps': self.headers}, f, indent=4)
+
+
+def show_sweep_step(coarse, mid, fine):
+    '''
+    Write the triplet DAC values to the console over the previous line
+    '''
+    sys.stdout.write("\r")
+    sys.stdout.write(f"\rSCuM Radio Setting: {coarse}, {mid}, {fine}   ")
+    sys.stdout.flush()
+
+
+def sweep_bound_times(timings):
+    '''
+    Split the wall time of a sweep into the time bound by the radio (Rx and trigger waits)
+    and the time bound by the analysis (Rx held back by a full queue, or waiting for the
+    last steps to be analyzed)
+
+    Parameters:
+        timings (dict): The stage timings of rx_sweep_sequential or rx_sweep_pipelined
+    '''
+    timings['rx bound'] = timings['rx'] + timings['trigger wait']
+    timings['compute bound'] = timings['queue wait'] + timings['drain']
+    return timings
+
+
+def rx_sweep_sequential(sdr_rx, handle, steps, process_step, capture_step=None):
+    '''
+    Run the sweep one step at a time: receive, analyze, wait for the next trigger
+
+    Parameters:
+        sdr_rx (PlutoSession): The configured Rx Pluto
+        handle (object): The device data object used to wait for the triggers
+        steps (list): The steps from lut_sweep_settings
+        process_step (callable): Called as process_step(index, lo, samples) for every captured step
+        capture_step (callable): Called as capture_step(index) before every step, the step is
+            only received if it returns True (None to capture every step)
+
+    Returns:
+        [complete, timings] (list): False if a buffer came back empty, and the time spent in each stage in seconds
+    '''
+    timings = {'rx': 0.0, 'trigger wait': 0.0, 'queue wait': 0.0, 'compute': 0.0, 'drain': 0.0}
+    start = time.perf_counter()
+    complete = True
+
+    for index, (coarse, mid, fine, lo) in enumerate(steps):
+        show_sweep_step(coarse, mid, fine)
+        if capture_step is None or capture_step(index):
+            sdr_rx.rx_lo = lo
+
+            # Receive the data
+            stage_start = time.perf_counter()
+            received_data = sdr_rx.rx()
+            timings['rx'] += time.perf_counter() - stage_start
+            if received_data.size == 0:
+                print("Warning: Received empty data from sdr_rx.rx() Channel 1")
+                complete = False
+                break
+
+            # Analyze it, the host is the bottleneck while this runs
+            stage_start = time.perf_counter()
+            process_step(index, lo, received_data)
+            elapsed = time.perf_counter() - stage_start
+            timings['compute'] += elapsed
+            timings['queue wait'] += elapsed
+            del received_data
+
+        # Wait for the next tone to transmit
+        stage_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            wait_for_trigger(handle)
+        timings['trigger wait'] += time.perf_counter() - stage_start
+
+    timings['total'] = time.perf_counter() - start
+    return [complete, sweep_bound_times(timings)]
+
+
+def rx_sweep_pipelined(sdr_rx, handle, steps, process_step, queue_depth=RF_SWEEP_QUEUE_DEPTH, workers=RF_SWEEP_WORKERS, capture_step=None):
+    '''
+    Run the sweep with a producer thread that owns the Pluto (sets the LO, receives,
+    waits for the next trigger) and pushes every buffer into a bounded queue, while
+    a pool of worker threads analyzes the buffers. At most queue_depth + workers
+    buffers are held at a time.
+
+    Parameters:
+        sdr_rx (PlutoSession): The configured Rx Pluto
+        handle (object): The device data object used to wait for the triggers
+        steps (list): The steps from lut_sweep_settings
+        process_step (callable): Called as process_step(index, lo, samples) for every captured step, from the workers
+        queue_depth (int): The number of received buffers waiting for a worker
+        workers (int): The number of worker threads
+        capture_step (callable): Called as capture_step(index) by the producer before every step, the step is
+            only received if it returns True (None to capture every step). Time spent blocked in it counts as queue wait.
+
+    Returns:
+        [complete, timings] (list): False if a buffer came back empty or a step failed, and the time spent in each stage in seconds
+    '''
+    timings = {'rx': 0.0, 'trigger wait': 0.0, 'queue wait': 0.0, 'compute': 0.0, 'drain': 0.0}
+    buffers = queue.Queue(maxsize=queue_depth)
+    errors = []
+    timings_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def produce():
+        try:
+            for index, (coarse, mid, fine, lo) in enumerate(steps):
+                show_sweep_step(coarse, mid, fine)
+                if capture_step is not None:
+                    stage_start = time.perf_counter()
+                    capture = capture_step(index)
+                    timings['queue wait'] += time.perf_counter() - stage_start
+                else:
+                    capture = True
+
+                if capture:
+                    sdr_rx.rx_lo = lo
+
+                    stage_start = time.perf_counter()
+                    received_data = sdr_rx.rx()
+                    timings['rx'] += time.perf_counter() - stage_start
+                    if received_data.size == 0:
+                        print("Warning: Received empty data from sdr_rx.rx() Channel 1")
+                        errors.append("empty buffer")
+                        break
+
+                    # Blocks only when the workers fall behind
+                    stage_start = time.perf_counter()
+                    buffers.put((index, lo, received_data))
+                    timings['queue wait'] += time.perf_counter() - stage_start
+                    del received_data
+
+                stage_start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    wait_for_trigger(handle)
+                timings['trigger wait'] += time.perf_counter() - stage_start
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                buffers.put(None)
+
+    def consume():
+        compute = 0.0
+        while True:
+            item = buffers.get()
+            if item is None:
+                break
+            stage_start = time.perf_counter()
+            try:
+                process_step(*item)
+            except Exception as e:
+                errors.append(e)
+            compute += time.perf_counter() - stage_start
+            del item
+        with timings_lock:
+            timings['compute'] += compute
+
+    threads = [threading.Thread(target=consume, daemon=True) for _ in range(workers)]
+    producer = threading.Thread(target=produce, daemon=True)
+    for thread in threads + [producer]:
+        thread.start()
+
+    producer.join()
+    rx_done = time.perf_counter()
+    for thread in threads:
+        thread.join()
+
+    # Analysis left over once the radio is done
+    timings['drain'] = time.perf_counter() - rx_done
+    timings['total'] = time.perf_counter() - start
+    for error in errors:
+        if not isinstance(error, str):
+            print(f"Error in the RF sweep: {error}")
+    return [not errors, sweep_bound_times(timings)]
+
+
+def align_cyclic(rx_samples, reference):
+    '''
+    Align one period of a cyclically transmitted reference, received in rx_samples,
+    to the start of the reference using an FFT based circular cross-correlation
+
+    Parameters:
+        rx_samples (numpy array): At least len(reference) received samples
+        reference (numpy array): One period of the transmitted samples
+
+    Returns:
+        [rx_aligned, delay] (list): The received period starting with the first reference sample, and its delay in samples
+    '''
+    period = rx_samples[:len(reference)]
+    corr = np.fft.ifft(np.fft.fft(period) * np.conj(np.fft.fft(reference)))
+    delay = int(np.argmax(np.abs(corr)))
+    return [np.roll(period, -delay), delay]
+
+
+def demodulate_fsk(rx_aligned, n_symbols, symbol_samples):
+    '''
+    Binary FSK discriminator over all symbols at once: the phase step between
+    successive samples of a symbol, averaged per symbol, gives its frequency sign
+
+    Parameters:
+        rx_aligned (numpy array): The aligned received samples
+        n_symbols (int): The number of symbols
+        symbol_samples (int): The samples per symbol
+
+    Returns:
+        bits (numpy array): 1 where the symbol frequency is above 0, otherwise 0
+    '''
+    blocks = rx_aligned[:n_symbols * symbol_samples].reshape(n_symbols, symbol_samples)
+    phase_steps = np.angle(blocks[:, 1:] * np.conj(blocks[:, :-1]))
+    return (phase_steps.mean(axis=1) > 0).astype(np.int64)
+
+
+def ber_upper_bound(bit_errors, n_bits, z=ber_confidence_z):
+    '''
+    Upper limit of the Wilson score interval of a bit error rate
+
+    Parameters:
+        bit_errors (int): The number of wrong bits
+        n_bits (int): The number of bits compared
+        z (float): The normal quantile of the confidence level
+
+    Returns:
+        upper (float): The upper bound of the bit error rate (0-1)
+    '''
+    ber = bit_errors / n_bits
+    center = ber + z**2 / (2 * n_bits)
+    spread = z * np.sqrt(ber * (1 - ber) / n_bits + z**2 / (4 * n_bits**2))
+    return float((center + spread) / (1 + z**2 / n_bits))
+
+
 def RF_self_test():
-    # Setup Rx Pluto 
+    # Setup Rx Pluto (kept open between tests and retries)
     try:
-        sdr_rx = adi.Pluto("ip:192.168.2.2")
+        sdr_rx = open_pluto(RX_PLUTO_URI)
     except OSError as e:
         print(f"Error: {e}. Please ensure the Pluto SDR is connected and accessible.\n\nIf this is the first boot of the SDR, please wait a few minutes for it to initialize and try again.")
         return [{'sub-test': 'Radio(RF)', 'pass': False, 'values': [{'name': 'Error', 'value': str(e)}]}]
@@ -37,11 +452,11 @@ def RF_self_test():
     sdr_rx.rx_lo = int(cw)
     sdr_rx.sample_rate = int(sr)
     sdr_rx.rx_rf_bandwidth = int(sr)
-    sdr_rx.rx_buffer_size = num_symbols * samples_per_symbol * 64
+    sdr_rx.rx_buffer_size = num_symbols * samples_per_symbol  # One period of the cyclic Tx buffer
 
     # Setup Tx Pluto
     try:
-        sdr_tx = adi.Pluto("ip:192.168.2.3")
+        sdr_tx = open_pluto(TX_PLUTO_URI)
     except OSError as e:
         print(f"Error: {e}. Please ensure the Pluto SDR is connected and accessible.\n\nIf this is the first boot of the SDR, please wait a few minutes for it to initialize and try again.")
         return [{'sub-test': 'Radio(RF)', 'pass': False, 'values': [{'name': 'Error', 'value': str(e)}]}]
@@ -54,7 +469,7 @@ def RF_self_test():
     sdr_tx.tx_lo = int(cw)
     sdr_tx.tx_hardwaregain_chan0 = -20   
     pattern = np.array([0, 0, 1, 1]) # Control pattern to simplify determining the bit error rate
-    bits = np.tile(pattern, num_symbols // len(pattern))
+    bits = np.resize(pattern, num_symbols)
 
     # Binary FSK generation
     delta = 100e3
@@ -79,59 +494,31 @@ def RF_self_test():
     sdr_tx.tx(sample) # start transmitting
 
     # Clear any existing buffer contents
-    for i in range (0, 10):
-        raw_data = sdr_rx.rx()
+    try:
+        sdr_rx.flush_rx(10)
 
-    # Receive samples
-    rx_samples = sdr_rx.rx()
+        # Receive samples
+        rx_samples = sdr_rx.rx()
+    except Exception as e:
+        print(f"Error: {e}. The Pluto SDRs will be reconnected on the next run.")
+        close_pluto(RX_PLUTO_URI)
+        close_pluto(TX_PLUTO_URI)
+        return [{'sub-test': 'Radio(RF)', 'pass': False, 'values': [{'name': 'Error', 'value': str(e)}]}]
       
     # Stop transmitting
     sdr_tx.tx_destroy_buffer()
     
-    # Calculate power spectral density (frequency domain version of signal)
-    psd = np.abs(np.fft.fftshift(np.fft.fft(rx_samples)))**2
-    psd_dB = 10*np.log10(psd)
-    f = np.linspace(sr/-2, sr/2, len(psd))
-
-    # Compute cross-correlation between rx_samples and sample
-    corr = np.correlate(rx_samples, sample, mode='full')
-    peak_idx = np.argmax(np.abs(corr))
-    
-    # Bit error rate
-    # The delay in samples is given by the peak index offset relative to no delay
-    delay = peak_idx - (len(sample) - 1)
-    if delay < 0:
-        delay = 0  # In case of a negative delay, default to 0 for simplicity
-
     # Align the received signal to the start of the transmitted signal
-    rx_aligned = rx_samples[delay:delay+len(sample)]
-    
-    # Demodulation: Process the received signal symbol by symbol
-    estimated_bits = np.zeros(num_symbols)
-    
-    for i in range(num_symbols):
-        block = rx_aligned[i*samples_per_symbol:(i+1)*samples_per_symbol]
-        # Get the instantaneous phase of the symbol block
-        phase_block = np.angle(block)
-        # Unwrap the phase to avoid 2pi discontinuities
-        phase_block = np.unwrap(phase_block)
-        # Calculate the phase differences between successive samples
-        phase_diff_block = np.diff(phase_block)
-        # Average the phase difference over the symbol duration
-        avg_phase_diff = np.mean(phase_diff_block)
-        # Convert the average phase difference to an estimated frequency (Hz)
-        f_est = avg_phase_diff * sr / (2 * np.pi)
-        # Decision threshold: if the estimated frequency is greater than 0, decide '1'; otherwise, '0'
-        
-        if f_est > 0:
-            estimated_bits[i] = 1
-        else:
-            estimated_bits[i] = 0
+    # (the Tx buffer is cyclic, so any received period holds every symbol)
+    rx_aligned, delay = align_cyclic(rx_samples, sample)
 
+    # Demodulation: all symbols at once
+    estimated_bits = demodulate_fsk(rx_aligned, num_symbols, samples_per_symbol)
 
-    # Calculate Bit Error Rate (BER)
-    bit_errors = np.sum(estimated_bits != bits)
+    # Calculate Bit Error Rate (BER) and its upper bound
+    bit_errors = int(np.sum(estimated_bits != bits))
     ber = bit_errors / num_symbols * 100
+    ber_upper = ber_upper_bound(bit_errors, num_symbols) * 100
 
     # Compute FFT of the received signal
     set_freq = 2405000000
@@ -159,13 +546,17 @@ def RF_self_test():
        
     
     if(ber != 0.00):
-        value = [{'name': 'Bit-Error-Rate', 'value': ber}]
+        value = [{'name': 'Bit-Error-Rate', 'value': ber},
+        {'name': 'Symbols Compared', 'value': num_symbols},
+        {'name': 'BER 95% Upper Bound (%)', 'value': np.round(ber_upper, 4)}]
         results = [{'sub-test': 'Radio(RF)', 'pass': False, 'values': value}]
         #print(value)
         return results
     
     else:
         values =[ {'name': 'Bit-Error-Rate (BER)', 'value': ber},
+        {'name': 'Symbols Compared', 'value': num_symbols},
+        {'name': 'BER 95% Upper Bound (%)', 'value': np.round(ber_upper, 4)},
         {'name': 'Set Transmission Frequency (GHz)', 'value': np.round(set_freq, 4)},
         {'name': 'Transmitted Peak Frequency (GHz)', 'value': np.round(peak_freq_Tx, 4)},
         {'name': 'Received Peak Frequency (GHz)', 'value': np.round(peak_freq_Rx, 4)},
@@ -185,9 +576,9 @@ def RF_self_test():
 def RF_SCuM_test(handle):
 
     # Ensure the ResultsBackups directory exists
-    if not os.path.exists(os.path.join(os.path.dirname(__file__), '..\\..', 'ResultBackups')):
+    if not os.path.exists(os.path.dirname(default_results_path)):
         print("Error: The directory 'ResultBackups' does not exist. Please run the setup script to initialize the environment.")
-        os.exit(1)
+        sys.exit(1)
 
     # Create folder were all the timestamped data will be stored
     elif not os.path.exists(default_results_path):
@@ -195,7 +586,7 @@ def RF_SCuM_test(handle):
 
     # Setup Rx Pluto 
     try:
-        sdr_rx = adi.Pluto("ip:192.168.2.2")
+        sdr_rx = open_pluto(RX_PLUTO_URI)
     except OSError as e:
         print(f"Error: {e}. Please ensure the Pluto SDR is connected and accessible.\n\nIf this is the first boot of the SDR, please wait a few minutes for it to initialize and try again.")
         return False
@@ -205,88 +596,98 @@ def RF_SCuM_test(handle):
 
     global fs 
     sdr_rx.gain_control_mode_chan0 = "fast_attack"  # for Automatic Gain Control
-    sdr_rx.rx_lo = int(2.3808e9)
-    sdr_rx.sample_rate = int(5e6)
-    sdr_rx.rx_rf_bandwidth = int(1.6e6)
-    sdr_rx.rx_buffer_size = int(1.6e6)
+    sdr_rx.rx_lo = int(SWEEP_START_LO_HZ)
+    sdr_rx.sample_rate = int(SWEEP_SAMPLE_RATE_HZ)
+    sdr_rx.rx_rf_bandwidth = int(SWEEP_RF_BANDWIDTH_HZ)
+    sdr_rx.rx_buffer_size = SWEEP_BUFFER_SIZE
     fs = sdr_rx.sample_rate
 
-    # Raw data (rd) and LUT Values (lv) dictionaries
-    rd_data = {}
-    lv_data = {}
-
-
-    # Clear any potential data in the buffer
-    for i in range(0, 10):
-        raw_data = sdr_rx.rx()
-
-    
-
-
-    # Course loop
-    coarse = 23
-    fine = 0
-    for i in range(7):
-        
-        mid = 0       
-        # Mid loop
-        for i in range(18):
-            # Write the triplet DAC values to the console over previous line
-            sys.stdout.write("\r")
-            sys.stdout.write(f"\rSCuM Radio Setting: {coarse}, {mid}, {fine}   ")
-            #sys.stdout.write(f"\rSCuM Radio Setting: ", coarse, ", ", mid, ", ", fine)
-            sys.stdout.flush()
-            #print("SCuM Radio Setting: ", coarse, ", ", mid, ", ", fine)
-            # Update of df header name to match triplet DAC values for RF sweep
-            df_header = f"{coarse}, {mid}, {fine}"
-
-            # Receive the data
-            received_data = sdr_rx.rx()
-            if received_data.size == 0:
-                print("Warning: Received empty data from sdr_rx.rx() Channel 1")
-                return False
-            
-            # Put raw data to rd dataframe
-            #rd_df[df_header] = received_data
-            rd_data[df_header] = received_data
-
-            # FFT the data
-            fft = np.fft.fft(received_data)
-            freqs = np.fft.fftfreq(len(received_data), 1/fs)  # fs is the sampling rate
-            max_index = np.argmax(np.abs(fft))                # use magnitude
-            max_freq = freqs[max_index] + sdr_rx.rx_lo  # Add the LO frequency to get the actual frequency       
+    # Create timestamped data folder
+    global timestamped_path
+    now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    timestamped_path = os.path.join(default_results_path, now)
+    os.makedirs(timestamped_path, exist_ok=True)
 
-            # Put the max_freq data to lv dataframe
-            lv_data[df_header] = max_freq
+    # Peak finder used for every step, its resolution is reported with the results
+    global peak_finder_summary, full_lut_summary, resweep_summary, lut_file
+    full_lut_summary = None
+    resweep_summary = None
+    lut_file = None
+    peak_finder = SpectralPeakFinder(fs, RF_PEAK_FFT_SIZE, RF_PEAK_SEGMENTS, interpolate=RF_PEAK_INTERPOLATE)
+    peak_finder_summary = peak_finder.summary(SWEEP_BUFFER_SIZE)
+    peak_finder_summary['separates_steps'] = peak_finder.separates(SWEEP_LO_STEP_HZ, SWEEP_BUFFER_SIZE)
+    print(f"Peak finder: {peak_finder_summary['fft_size']}-point FFT x {peak_finder_summary['segments']}, resolution {peak_finder_summary['resolution_hz']:.1f} Hz")
+    if not peak_finder_summary['separates_steps']:
+        print(f"Warning: the peak finder resolution does not separate the {SWEEP_LO_STEP_HZ / 1e3:.0f} kHz sweep steps")
+    with open(os.path.join(timestamped_path, "peak_finder.json"), "w") as f:
+        json.dump(peak_finder_summary, f, indent=4)
+
+    # LUT Values (lv) of each step (df header names match the triplet DAC values),
+    # the raw data is only kept if enabled in the config
+    steps = lut_sweep_settings()
+    headers = [f"{coarse}, {mid}, {fine}" for coarse, mid, fine, _ in steps]
+    lv_data = dict.fromkeys(headers)
+    raw_iq = RawIQStore(RF_RAW_IQ_RETENTION, len(steps), SWEEP_BUFFER_SIZE, timestamped_path)
+
+    # Incremental mode: only the regions that drifted from the last saved LUT of the chip are captured again
+    # (a LUT is only reused for the same chip, so this needs the chip named in RF_SCUM_CHIP_ID)
+    resweep = None
+    previous_lut = None
+    if RF_LUT_INCREMENTAL and RF_SCUM_CHIP_ID is None:
+        print("Warning: RF_LUT_INCREMENTAL needs the chip under test set in RF_SCUM_CHIP_ID, sweeping every setting")
+    elif RF_LUT_INCREMENTAL:
+        previous_lut = latest_lut_path(lut_library_path(), RF_SCUM_CHIP_ID)
+        if previous_lut is not None:
+            print(f"Incremental sweep against {previous_lut}")
+            resweep = IncrementalResweep(LutStore.load(previous_lut), steps, RF_LUT_RESWEEP_THRESHOLD_HZ, RF_LUT_RESWEEP_REGION_MIDS)
+        else:
+            print(f"No saved LUT for chip '{RF_SCUM_CHIP_ID}', sweeping every setting")
 
-            # Increment values and wait for the next tone to transmit
-            mid += 1
-            sdr_rx.rx_lo += 800000
-            with contextlib.redirect_stdout(io.StringIO()):
-                wait_for_trigger(handle)
-            #wait_for_trigger(handle)
+    def process_step(index, lo, received_data):
+        try:
+            raw_iq.add(index, headers[index], received_data)
 
-        coarse += 1
-        sdr_rx.rx_lo + 600000 #Increment the LO to match the sweep values on SCuM
+            # Find the tone, only the summary of the step is kept
+            peak = peak_finder.find_peak(received_data)
+            lv_data[headers[index]] = peak['frequency_hz'] + lo  # Add the LO frequency to get the actual frequency
+        finally:
+            # A probe decides whether the rest of its region is captured, even if it failed
+            if resweep is not None:
+                resweep.record(index, lv_data[headers[index]])
 
+    # Clear any potential data in the buffer
+    sdr_rx.flush_rx(10)
 
-        
+    global sweep_timings
+    capture_step = None if resweep is None else resweep.capture
+    if RF_SWEEP_PIPELINED:
+        complete, sweep_timings = rx_sweep_pipelined(sdr_rx, handle, steps, process_step, capture_step=capture_step)
+    else:
+        complete, sweep_timings = rx_sweep_sequential(sdr_rx, handle, steps, process_step, capture_step=capture_step)
+    raw_iq.close(fs)
+    if not complete:
+        return False
 
     print("\nSCuM Radio Sweep Complete!\n")
-    #rd_df = pd.DataFrame.from_dict(rd_data, orient='columns')
+    print(f"Sweep time: {sweep_timings['total']:.2f} s, Rx bound {sweep_timings['rx bound']:.2f} s, compute bound {sweep_timings['compute bound']:.2f} s\n")
+
+    # Steps that were not captured keep their frequency from the saved LUT
+    if resweep is not None:
+        lv_data = dict(zip(headers, resweep.merge([lv_data[header] for header in headers])))
+        resweep_summary = resweep.report()
+        resweep_summary['baseline'] = previous_lut
+        with open(os.path.join(timestamped_path, "resweep.json"), "w") as f:
+            json.dump(resweep_summary, f, indent=4)
+        print(f"Incremental sweep: {resweep_summary['captures']} of {resweep_summary['steps']} steps captured, "
+              f"{resweep_summary['re_measured']} of {len(resweep_summary['regions'])} regions re-measured\n")
     lv_df = pd.DataFrame([lv_data])  # one row of LUT values
 
-    # Create timestamped data folder
-    global timestamped_path
-    now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    timestamped_path = os.path.join(default_results_path, now)
-    os.makedirs(timestamped_path, exist_ok=True)
-
     # Write data to timestamped data folder
-    #rd_csv_path = os.path.join(timestamped_path, "results.csv")
     lv_csv_path = os.path.join(timestamped_path, "lut_values.csv")
-    #rd_df.to_csv(rd_csv_path, index=False) try not saving raw data to save space because its A LOT of data
     lv_df.to_csv(lv_csv_path, index=False)   
+    # Steps carried over from the saved LUT keep the run they were measured in
+    save_lut([step[:3] for step in steps], [lv_data[header] for header in headers],
+             measured_runs=None if resweep is None else resweep.measured_runs(os.path.basename(timestamped_path)))
 
     # Plot the LUT
     # Use DataFrame to create PSD .png file
@@ -314,7 +715,7 @@ def RF_SCuM_test(handle):
     plt.savefig(image_path)
     plt.close()
 
-    # Kill Pluto Rx
+    # Release the Pluto Rx (its session stays open for the next test)
     del sdr_rx
 
     return True
@@ -325,94 +726,284 @@ def RF_end_test():
     image_path = os.path.join(timestamped_path, "LUT.png")
     
     # Return results
-    return [{'sub-test': 'RF Test', 'pass': True, 'values': [{'name': 'PSD Image', 'value': image_path}]}]
-
-
-
-
+    values = [{'name': 'PSD Image', 'value': image_path}]
+    if peak_finder_summary is not None:
+        values.extend([
+            {'name': 'Peak FFT Size', 'value': f"{peak_finder_summary['fft_size']} x {peak_finder_summary['segments']}"},
+            {'name': 'Peak Bin Width (Hz)', 'value': np.round(peak_finder_summary['bin_width_hz'], 1)},
+            {'name': 'Peak Resolution (Hz)', 'value': np.round(peak_finder_summary['resolution_hz'], 1)},
+            {'name': 'Resolves Sweep Steps', 'value': peak_finder_summary['separates_steps']},
+        ])
+    if sweep_timings is not None:
+        values.extend([
+            {'name': 'Sweep Time (s)', 'value': np.round(sweep_timings['total'], 2)},
+            {'name': 'Rx Bound Time (s)', 'value': np.round(sweep_timings['rx bound'], 2)},
+            {'name': 'Compute Bound Time (s)', 'value': np.round(sweep_timings['compute bound'], 2)},
+        ])
+    if lut_file is not None:
+        values.append({'name': 'LUT File', 'value': lut_file})
+    if resweep_summary is not None:
+        re_measured = [f"{region['coarse']}/{region['mids'][0]}-{region['mids'][1]}" for region in resweep_summary['regions'] if region['re_measured']]
+        values.extend([
+            {'name': 'Baseline LUT', 'value': resweep_summary['baseline']},
+            {'name': 'Steps Captured', 'value': f"{resweep_summary['captures']} / {resweep_summary['steps']}"},
+            {'name': 'Regions Re-measured', 'value': f"{resweep_summary['re_measured']} / {len(resweep_summary['regions'])}"},
+            {'name': 'Re-measured Coarse/Mids', 'value': ', '.join(re_measured) if re_measured else 'None'},
+        ])
+    if full_lut_summary is not None:
+        values.extend([
+            {'name': 'LUT Steps Measured', 'value': f"{full_lut_summary['measured']} / {full_lut_summary['steps']}"},
+            {'name': 'Low SNR Steps', 'value': full_lut_summary['low_snr']},
+            {'name': 'Extra Captures', 'value': full_lut_summary['extra_captures']},
+            {'name': 'LO Retunes', 'value': full_lut_summary['retunes']},
+        ])
+        if 'predicted' in full_lut_summary:
+            values.extend([
+                {'name': 'LUT Steps Predicted', 'value': f"{full_lut_summary['predicted']} / {full_lut_summary['steps']}"},
+                {'name': 'Rows Captured Densely', 'value': full_lut_summary['refined_rows']},
+            ])
+    return [{'sub-test': 'RF Test', 'pass': True, 'values': values}]
+
+
+def full_lut_sweep_settings():
+    '''
+    The steps of the full coarse/mid/fine SCuM LUT sweep, in the order SCuM transmits them
+
+    Returns:
+        steps (list): [coarse, mid, fine, planned_lo] of each step, planned_lo in Hz
+    '''
+    steps = []
+    for coarse_index in range(SWEEP_COARSE_STEPS):
+        for mid in range(FULL_LUT_MID_STEPS):
+            for fine in range(FULL_LUT_FINE_STEPS):
+                lo = SWEEP_START_LO_HZ + coarse_index * FULL_LUT_COARSE_LO_STEP_HZ + mid * SWEEP_LO_STEP_HZ + fine * FULL_LUT_FINE_LO_STEP_HZ
+                steps.append([SWEEP_COARSE_START + coarse_index, mid, fine, int(lo)])
+    return steps
+
+
+class FullLutWriter:
+    '''
+    Writes every step of the full LUT sweep as soon as it is measured (or predicted, in a
+    sparse sweep), to a CSV file (flushed per row) and to a .npy file of FULL_LUT_DTYPE records (one row per step,
+    rows of steps never reached are left as zeros), so an interrupted sweep keeps its data.
+    '''
+
+    def __init__(self, output_dir, n_steps):
+        '''
+        Parameters:
+            output_dir (str): The directory the files are written to
+            n_steps (int): The number of steps in the sweep
+        '''
+        self.csv_path = os.path.join(output_dir, "lut_full.csv")
+        self.npy_path = os.path.join(output_dir, "lut_full.npy")
+        self.n_steps = n_steps
+
+        self._csv = open(self.csv_path, "w")
+        self._csv.write(",".join(FULL_LUT_DTYPE.names) + "\n")
+        self._npy = open(self.npy_path, "wb")
+        np.lib.format.write_array_header_1_0(self._npy, {'descr': np.lib.format.dtype_to_descr(FULL_LUT_DTYPE), 'fortran_order': False, 'shape': (n_steps,)})
+        self._data_offset = self._npy.tell()
+
+    def add(self, step, record):
+        '''
+        Write the result of a step
+
+        Parameters:
+            step (int): The index of the step in the sweep
+            record (tuple): The values of the FULL_LUT_DTYPE fields
+        '''
+        row = np.array([record], dtype=FULL_LUT_DTYPE)
+        self._npy.seek(self._data_offset + step * FULL_LUT_DTYPE.itemsize)
+        self._npy.write(row.tobytes())
+        self._csv.write(",".join(str(value) for value in record) + "\n")
+        self._csv.flush()
+
+    def close(self):
+        self._npy.truncate(self._data_offset + self.n_steps * FULL_LUT_DTYPE.itemsize)
+        self._npy.close()
+        self._csv.close()
+
+
+def format_duration(seconds):
+    '''
+    Seconds as h:mm:ss
+    '''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def RF_SCuM_full_lut_test(handle):
+    '''
+    Full resolution (7 x 32 x 32) SCuM LUT sweep. Needs a SCuM binary that transmits
+    every coarse/mid/fine setting, one per trigger.
+
+    Each step is captured with a short Rx buffer, sized for RF_FULL_LUT_RESOLUTION_HZ, and
+    captured again (averaging the spectra) only while the tone is below RF_FULL_LUT_MIN_SNR_DB.
+    The LO is only retuned when the expected tone leaves the capture bandwidth, and every
+    step is written to lut_full.csv/lut_full.npy as it is measured.
+
+    Parameters:
+        handle (object): The device data object used to wait for the triggers
+
+    Returns:
+        success (bool): True if the sweep ran to the end
+    '''
+    # Create folder were all the timestamped data will be stored
+    if not os.path.exists(default_results_path):
+        os.makedirs(default_results_path)
 
+    # Setup Rx Pluto
+    try:
+        sdr_rx = open_pluto(RX_PLUTO_URI)
+    except OSError as e:
+        print(f"Error: {e}. Please ensure the Pluto SDR is connected and accessible.\n\nIf this is the first boot of the SDR, please wait a few minutes for it to initialize and try again.")
+        return False
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return False
 
+    global fs, timestamped_path, peak_finder_summary, sweep_timings, full_lut_summary, resweep_summary, lut_file
+    resweep_summary = None
+    lut_file = None
+    buffer_size = buffer_size_for_resolution(RF_FULL_LUT_RESOLUTION_HZ, FULL_LUT_SAMPLE_RATE_HZ)
+    sdr_rx.gain_control_mode_chan0 = "fast_attack"  # for Automatic Gain Control
+    sdr_rx.sample_rate = int(FULL_LUT_SAMPLE_RATE_HZ)
+    sdr_rx.rx_rf_bandwidth = int(FULL_LUT_RF_BANDWIDTH_HZ)
+    sdr_rx.rx_buffer_size = buffer_size
+    fs = sdr_rx.sample_rate
 
+    now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    timestamped_path = os.path.join(default_results_path, now)
+    os.makedirs(timestamped_path, exist_ok=True)
 
-""" # Course loop
-    coarse = 23
-    for i in range(7):
-        mid = 0
-        for i in range(32):
-            # Mid loop
-            fine = 0
-            for i in range(32):
-                # Write the triplet DAC values to the console over previous line
-                sys.stdout.write("\r")
-                sys.stdout.write(f"\rSCuM Radio Setting: {coarse}, {mid}, {fine}   ")
-                #sys.stdout.write(f"\rSCuM Radio Setting: ", coarse, ", ", mid, ", ", fine)
-                sys.stdout.flush()
-                #print("SCuM Radio Setting: ", coarse, ", ", mid, ", ", fine)
-                # Update of df header name to match triplet DAC values for RF sweep
-                df_header = f"{coarse}, {mid}, {fine}"
+    peak_finder = SpectralPeakFinder(fs, buffer_size)
+    peak_finder_summary = peak_finder.summary(buffer_size)
+    peak_finder_summary['separates_steps'] = peak_finder.separates(FULL_LUT_FINE_LO_STEP_HZ, buffer_size)
+    print(f"Full LUT sweep: {buffer_size} samples per capture, resolution {peak_finder_summary['resolution_hz'] / 1e3:.1f} kHz")
+
+    steps = full_lut_sweep_settings()
+    writer = FullLutWriter(timestamped_path, len(steps))
+    timings = {'rx': 0.0, 'retune': 0.0, 'trigger wait': 0.0, 'queue wait': 0.0, 'compute': 0.0, 'drain': 0.0}
+    summary = {'steps': len(steps), 'measured': 0, 'low_snr': 0, 'extra_captures': 0, 'retunes': 0}
+    frequencies = np.full(len(steps), np.nan)
+
+    # Sparse sweep: a grid of each row is captured and the rest predicted from a per coarse band model
+    planner = None
+    if RF_LUT_MODEL_SPARSE:
+        planner = SparseLutPlanner(steps, RF_LUT_MODEL_FINE_STRIDE, RF_LUT_MODEL_TOLERANCE_HZ)
+        print(f"Sparse sweep: every {RF_LUT_MODEL_FINE_STRIDE} fine codes, denser where the model is off by more than {RF_LUT_MODEL_TOLERANCE_HZ / 1e3:.0f} kHz")
+
+    # Offset of the measured tone from the planned LO, carried from step to step to predict the next tone
+    # (the first step is received with the LO on its planned value)
+    tone_offset = FULL_LUT_TUNE_OFFSET_HZ
+    lo = None
+    start = time.perf_counter()
 
-                # Receive the data
+    # Clear any potential data in the buffer
+    sdr_rx.flush_rx(10)
+
+    for index, (coarse, mid, fine, planned_lo) in enumerate(steps):
+        # In a sparse sweep, steps off the grid of the model are not captured
+        if planner is None or planner.capture(index):
+            # Retune only when the expected tone is too close to DC or to the band edge
+            expected = planned_lo + tone_offset
+            if lo is None or not (FULL_LUT_DC_GUARD_HZ <= expected - lo <= FULL_LUT_RF_BANDWIDTH_HZ / 2 - FULL_LUT_EDGE_GUARD_HZ):
+                stage_start = time.perf_counter()
+                lo = int(expected - FULL_LUT_TUNE_OFFSET_HZ)
+                sdr_rx.rx_lo = lo
+                timings['retune'] += time.perf_counter() - stage_start
+                summary['retunes'] += 1
+
+            # Buffers already queued in libiio were received before the retune or the trigger of this step
+            stage_start = time.perf_counter()
+            sdr_rx.flush_rx(RF_SDR_REUSE_FLUSH_BUFFERS)
+            timings['rx'] += time.perf_counter() - stage_start
+
+            # Short captures, averaged until the tone stands out
+            power = None
+            for captures in range(1, RF_FULL_LUT_MAX_CAPTURES + 1):
+                stage_start = time.perf_counter()
                 received_data = sdr_rx.rx()
+                timings['rx'] += time.perf_counter() - stage_start
                 if received_data.size == 0:
                     print("Warning: Received empty data from sdr_rx.rx() Channel 1")
+                    writer.close()
                     return False
 
-                # --- keep this line REMOVED or store only a tiny slice ---
-                # rd_data[df_header] = received_data            # REMOVE
-
-                # Compute peak on a smaller window & FFT length
-                NFFT = 131072            # 128k – plenty for 800 kHz steps
-                win = received_data[:NFFT]
-
-                # FFT and peak
-                fft = np.fft.fft(win, n=NFFT)
-                freqs = np.fft.fftfreq(NFFT, 1/fs)
-                max_index = np.argmax(np.abs(fft))
-                max_freq = freqs[max_index] + sdr_rx.rx_lo
-
-                # Store only the summary
-                lv_data[df_header] = max_freq
-
-                # Free big arrays before next iteration
-                del fft, freqs, win, received_data
-                import gc; gc.collect()
-
-                # Increment sweep and wait
-                fine += 1
-                sdr_rx.rx_lo += 100000
-                with contextlib.redirect_stdout(io.StringIO()):
-                    wait_for_trigger(handle)
+                stage_start = time.perf_counter()
+                capture_power = peak_finder.power_spectrum(received_data)
+                power = capture_power if power is None else power + capture_power
+                peak = peak_finder.peak_of(power)
+                timings['compute'] += time.perf_counter() - stage_start
+                if peak['snr_db'] >= RF_FULL_LUT_MIN_SNR_DB:
+                    break
+            summary['extra_captures'] += captures - 1
+
+            frequency = peak['frequency_hz'] + lo
+            if peak['snr_db'] >= RF_FULL_LUT_MIN_SNR_DB:
+                frequencies[index] = frequency
+                tone_offset = frequency - planned_lo
+                summary['measured'] += 1
+            else:
+                summary['low_snr'] += 1
+            if planner is not None:
+                planner.record(index, frequencies[index])
+            writer.add(index, (coarse, mid, fine, frequency, peak['snr_db'], captures, lo, True))
+
+        # Steps of a finished row that were not captured are predicted by the model
+        if planner is not None:
+            for predicted in planner.finish_row(index):
+                frequencies[predicted] = planner.frequencies[predicted]
+                writer.add(predicted, (*steps[predicted][:3], frequencies[predicted], np.nan, 0, 0, False))
+
+        # Progress with the expected time left
+        elapsed = time.perf_counter() - start
+        eta = elapsed / (index + 1) * (len(steps) - index - 1)
+        sys.stdout.write(f"\rSCuM Radio Setting: {coarse}, {mid}, {fine}   [{index + 1}/{len(steps)}] ETA {format_duration(eta)}   ")
+        sys.stdout.flush()
+
+        # Wait for the next tone to transmit
+        stage_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            wait_for_trigger(handle)
+        timings['trigger wait'] += time.perf_counter() - stage_start
+
+    writer.close()
+    measured = np.ones(len(steps), dtype=bool) if planner is None else planner.measured
+    save_lut([step[:3] for step in steps], frequencies, measured)
+    timings['rx'] += timings['retune']
+    timings['queue wait'] = timings['compute']
+    timings['total'] = time.perf_counter() - start
+    sweep_timings = sweep_bound_times(timings)
+    if planner is not None:
+        model_summary = planner.summary()
+        summary['predicted'] = model_summary['predicted']
+        summary['refined_rows'] = len(model_summary['refined_rows'])
+        with open(os.path.join(timestamped_path, "lut_model.json"), "w") as f:
+            json.dump(model_summary, f, indent=4)
+    full_lut_summary = summary
+
+    print("\nSCuM Full LUT Sweep Complete!\n")
+    print(f"Sweep time: {format_duration(timings['total'])}, {summary['measured']} of {summary['steps']} steps measured, {summary['retunes']} LO retunes\n")
+    if planner is not None:
+        print(f"Model: {summary['predicted']} steps predicted, {summary['refined_rows']} rows captured densely after a grid miss\n")
+
+    # Plot the LUT (predicted steps in a lighter color)
+    image_path = os.path.join(timestamped_path, "LUT.png")
+    plt.figure(figsize=(8, 4))
+    plt.scatter(np.flatnonzero(measured), frequencies[measured] / 1e9, s=1, label='Measured')
+    if not measured.all():
+        plt.scatter(np.flatnonzero(~measured), frequencies[~measured] / 1e9, s=1, alpha=0.4, label='Predicted')
+        plt.legend(markerscale=8)
+    plt.xlabel(f'Sweep step (coarse {SWEEP_COARSE_START}-{SWEEP_COARSE_START + SWEEP_COARSE_STEPS - 1} x mid x fine)')
+    plt.ylabel('Frequency (GHz)')
+    plt.title('Look-up-table (LUT) of SCuM Radio Values')
+    plt.tight_layout()
+    plt.savefig(image_path)
+    plt.close()
 
+    # Release the Pluto Rx (its session stays open for the next test)
+    del sdr_rx
 
-                # Receive the data
-                received_data = sdr_rx.rx()
-                if received_data.size == 0:
-                    print("Warning: Received empty data from sdr_rx.rx() Channel 1")
-                    return False
-                
-                # Put raw data to rd dataframe
-                #rd_df[df_header] = received_data
-                rd_data[df_header] = received_data
-
-                # FFT the data
-                fft = np.fft.fft(received_data)
-                freqs = np.fft.fftfreq(len(received_data), 1/fs)  # fs is the sampling rate
-                max_index = np.argmax(np.abs(fft))                # use magnitude
-                max_freq = freqs[max_index] + sdr_rx.rx_lo  # Add the LO frequency to get the actual frequency       
-
-                # Put the max_freq data to lv dataframe
-                lv_data[df_header] = max_freq
-
-                # Increment values and wait for the next tone to transmit
-                fine += 1
-                sdr_rx.rx_lo += 100000
-                with contextlib.redirect_stdout(io.StringIO()):
-                    wait_for_trigger(handle)
-                #wait_for_trigger(handle)
-            sdr_rx.rx_lo -= 3200000 #Reset LO to beginning of next mid step
-            mid += 1
-            sdr_rx.rx_lo += 800000 #Increment the LO to match the sweep values on SCuM
-        sdr_rx.rx_lo -= 25600000 #Reset LO to beginning of next course step
-        coarse += 1
-        sdr_rx.rx_lo += 15000000 #Increment the LO to match the sweep values on SCuM
- """
\ No newline at end of file
+    return True
@@ -0,0 +1,183 @@
+'''
+Offset/gain calibration cache for the AD2 scope channels.
+
+Each entry corrects one scope channel, identified by the device serial, the
+channel and the route the wavegen reached it through (an unused Pico mux input
+or a direct connection). Entries are fitted from DC levels driven by the AD2
+wavegen (see calibrate_scope_route in analog_test.py) and stored in a JSON
+file so a calibration is reused until it expires. A failed calibration is stored
+too (with its error), so it is not attempted again on every run until it expires.
+
+Correction: corrected = (raw - offset) / gain
+'''
+import datetime
+import json
+import os
+from ctypes import *
+
+import numpy as np
+
+from Validation.Tests.dwf_backend import dwf, enumfilterAll
+from config import CALIBRATION_MAX_AGE_HOURS
+
+CALIBRATION_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'ResultBackups', 'Calibration')
+CALIBRATION_FILE = 'analog_calibration.json'
+
+# Route of a wavegen wired straight to the scope channels, without going through the mux
+DIRECT_ROUTE = 'direct'
+
+
+def calibration_key(serial, channel, route):
+    '''
+    Cache key of a measurement path
+
+    Parameters:
+        serial (str): The device serial number
+        channel (int): The scope channel (1-based)
+        route (int or str): The Pico mux input in front of the channel, DIRECT_ROUTE for a direct connection
+
+    Returns:
+        key (str): The cache key
+    '''
+    return f"{serial}/ch{channel}/{route}"
+
+
+def device_serial(device_data):
+    '''
+    Serial number of an opened WaveForms device, found by matching the device name
+    in the enumeration (falls back to the device name)
+
+    Parameters:
+        device_data (object): The device data object
+
+    Returns:
+        serial (str): The device serial number
+    '''
+    serial = getattr(device_data, 'serial', '')
+    if serial:
+        return serial
+
+    count = c_int()
+    dwf.FDwfEnum(enumfilterAll, byref(count))
+    for index in range(count.value):
+        name = create_string_buffer(64)
+        dwf.FDwfEnumDeviceName(c_int(index), name)
+        if name.value.decode() == device_data.name:
+            serial = create_string_buffer(16)
+            dwf.FDwfEnumSN(c_int(index), serial)
+            return serial.value.decode().replace('SN:', '')
+    return device_data.name
+
+
+def fit_offset_gain(applied, measured):
+    '''
+    Least-squares fit of measured = gain * applied + offset
+
+    Parameters:
+        applied (list): The applied (true) voltages
+        measured (list): The mean measured voltage at each applied voltage
+
+    Returns:
+        calibration (dict): gain, offset (V) and the worst residual after correction (V)
+    '''
+    applied = np.asarray(applied, dtype=float)
+    measured = np.asarray(measured, dtype=float)
+    if len(applied) < 2:
+        raise ValueError("At least two calibration levels are required")
+
+    gain, offset = np.polyfit(applied, measured, 1)
+    residual = np.max(np.abs((measured - offset) / gain - applied))
+    return {'gain': float(gain), 'offset': float(offset), 'residual_v': float(residual)}
+
+
+def apply_calibration(samples, calibration):
+    '''
+    Correct a capture in place
+
+    Parameters:
+        samples (numpy array): The raw voltages (modified in place)
+        calibration (dict): Entry with 'gain' and 'offset', None leaves the samples unchanged
+
+    Returns:
+        samples (numpy array): The corrected voltages
+    '''
+    if calibration is not None:
+        np.subtract(samples, calibration['offset'], out=samples)
+        np.divide(samples, calibration['gain'], out=samples)
+    return samples
+
+
+class AnalogCalibrationCache:
+    '''
+    On-disk store of calibration entries with an expiry
+
+    Usage:
+        cache = AnalogCalibrationCache()
+        entry = cache.get(serial, channel, route)   # None if missing or expired
+        cache.put(serial, channel, route, fit_offset_gain(levels, means))
+        cache.put_failure(serial, channel, route, error)
+        cache.save()
+    '''
+
+    def __init__(self, path=None, max_age_hours=CALIBRATION_MAX_AGE_HOURS):
+        self.path = path or os.path.join(CALIBRATION_DIR, CALIBRATION_FILE)
+        self.max_age = datetime.timedelta(hours=max_age_hours)
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        '''
+        Load the cache file, an unreadable file starts an empty cache
+        '''
+        try:
+            with open(self.path, 'r') as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            self.entries = {}
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Calibration cache unreadable ({e}), recalibrating")
+            self.entries = {}
+
+    def save(self):
+        '''
+        Write the cache file (atomically, so an interrupted run can't corrupt it)
+        '''
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.entries, file, indent=2)
+        os.replace(temp_path, self.path)
+
+    def get(self, serial, channel, route):
+        '''
+        Returns the entry of a measurement path, None if missing or expired
+        (the entry of a failed calibration holds an 'error' instead of the correction)
+        '''
+        entry = self.entries.get(calibration_key(serial, channel, route))
+        if entry is None:
+            return None
+
+        calibrated_at = datetime.datetime.fromisoformat(entry['timestamp'])
+        if datetime.datetime.now() - calibrated_at > self.max_age:
+            return None
+        return entry
+
+    def put(self, serial, channel, route, calibration):
+        '''
+        Store a calibration for a measurement path (timestamped now)
+
+        Returns:
+            entry (dict): The stored entry
+        '''
+        entry = dict(calibration, timestamp=datetime.datetime.now().isoformat(timespec='seconds'))
+        self.entries[calibration_key(serial, channel, route)] = entry
+        return entry
+
+    def put_failure(self, serial, channel, route, error):
+        '''
+        Store a failed calibration of a measurement path (timestamped now), it expires like a calibration
+
+        Returns:
+            entry (dict): The stored entry
+        '''
+        return self.put(serial, channel, route, {'error': str(error)})
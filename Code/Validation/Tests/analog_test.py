@@ -10,120 +10,440 @@ C:\Program Files (x86)\Digilent\WaveFormsSDK\samples\py\AnalogIn_Record.py
 C:\Program Files (x86)\Digilent\WaveFormsSDK\samples\py\AnalogIn_Frequency.py
 '''
 import csv
+import datetime
+import json
 import math
 import matplotlib.pyplot as plt
 import numpy as np
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import *
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../__VendorAPIs/Diligent')))
-import WF_SDK
-from WF_SDK.device import check_error
 from Utilities.PicoControl.pico_control import send_command_to_pico
+from Validation.Tests.helpers import wait_for_acquisition, collect_acquisition_waits, acquisition_wait_summary
+from Validation.Tests.analog_calibration import AnalogCalibrationCache, apply_calibration, device_serial, fit_offset_gain, DIRECT_ROUTE
+from Validation.Tests.frequency_accuracy import FrequencyAccuracyTable
 from config import *
 
-##################
-# Stuff for interfacing with the Digilent WaveForms SDK
-##################
-
-# load the dynamic library, get constants path (the path is OS specific)
-if sys.platform.startswith("win"):
-    # on Windows
-    dwf = cdll.dwf
-    constants_path = "C:" + os.sep + "Program Files (x86)" + os.sep + "Digilent" + os.sep + "WaveFormsSDK" + os.sep + "samples" + os.sep + "py"
-elif sys.platform.startswith("darwin"):
-    # on macOS
-    lib_path = os.sep + "Library" + os.sep + "Frameworks" + os.sep + "dwf.framework" + os.sep + "dwf"
-    dwf = cdll.LoadLibrary(lib_path)
-    constants_path = os.sep + "Applications" + os.sep + "WaveForms.app" + os.sep + "Contents" + os.sep + "Resources" + os.sep + "SDK" + os.sep + "samples" + os.sep + "py"
-else:
-    # on Linux
-    dwf = cdll.LoadLibrary("libdwf.so")
-    constants_path = os.sep + "usr" + os.sep + "share" + os.sep + "digilent" + os.sep + "waveforms" + os.sep + "samples" + os.sep + "py"
-
-# import constants
-sys.path.append(constants_path)
-from dwfconstants import *
+# libdwf, WF_SDK and the dwf constants (hardware or simulated, see dwf_backend.py)
+from Validation.Tests.dwf_backend import *
 
 DEBUG = False
 
+# Recordings from timed_scope_capture
+SCOPE_CAPTURE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'ResultBackups', 'ScopeCaptures')
+SCOPE_CAPTURE_CHUNK_SAMPLES = 65536  # Samples read from the device per FDwfAnalogInStatusData2 call
+SCOPE_CAPTURE_POLL_SAMPLES = 2048    # Samples expected between record polls (kept well below the device FIFO)
+
+# FFT implementations available to determine_signal_frequency
+FFT_BACKEND_NUMPY = 'numpy'  # Window, FFT and peak search as NumPy array operations
+FFT_BACKEND_DWF = 'dwf'      # FDwfSpectrumFFT from the WaveForms SDK
+FFT_BACKEND = FFT_BACKEND_NUMPY
+
+# Frequency estimators available to validate_analog_signals
+# (SEQUENTIAL_TESTING and PIPELINED_CLOCK_VALIDATION combine single-pass estimates, so they
+# only apply to the clocks with the single-pass estimator)
+FREQUENCY_ESTIMATOR_AVERAGED = 'averaged'        # n_measurements captures, recursive sample rate fallback
+FREQUENCY_ESTIMATOR_SINGLE_PASS = 'single-pass'  # One capture, zoom DFT refinement with an uncertainty
+FREQUENCY_ESTIMATOR = FREQUENCY_ESTIMATOR_SINGLE_PASS
+
+# Single-pass estimator settings
+ZOOM_POINTS = 33                       # DFT points evaluated across the +/-1 bin zoom span
+HANN_CRLB_FACTOR = 1.5                 # Widening of the Cramer-Rao bound due to the Hann window
+MIN_CYCLES_PER_CAPTURE = 20            # Minimum signal periods per capture before the sample rate is retuned
+SAMPLES_PER_PERIOD_TARGET = 16         # Samples per signal period after a retune (approximately, see retune_sample_rate)
+MIN_SAMPLES_PER_PERIOD = 4             # Fewest samples per signal period a retune may pick
+MIN_FREQUENCY_SAMPLE_RATE_HZ = 100e3   # Lowest sample rate the estimator retunes to
+MAX_SAMPLE_RATE_RETUNES = 2            # Extra acquisitions allowed for retuning (one is enough unless the first estimate was off)
+RETUNE_RATE_SPAN = 0.5                 # Retuned sample rates are picked within this fraction of the target
+SCOPE_BANDWIDTH_HZ = 30e6              # Scope analog bandwidth, clock harmonics above it roll off at first order
+MAX_ALIAS_CHECK_HARMONIC = 1001        # Highest odd harmonic of a square clock counted in the alias bias
+ANALOG_IN_CLOCK_HZ = 100e6             # Scope sample clock, the sample rate is this divided by an integer
+PARABOLIC_BIAS_BINS = 0.05             # Worst parabolic interpolation bias on the Hann main lobe, in bins per zoom step (in bins) cubed
+FREQUENCY_UNCERTAINTY_SIGMAS = 3       # Sigmas an early pass/fail decision must hold for
+
+# Worst bias of refine_signal_frequency from an interfering tone d bins from the signal, per unit of its
+# relative amplitude: min(HARMONIC_BIAS_SLOPE * d, HARMONIC_BIAS_PEAK_BINS, HARMONIC_BIAS_TAIL_BINS / d**3) bins
+# (measured over frequency and phase, the bias peaks at 0.58 bins around d = 1 and falls with d**3 from d = 2)
+HARMONIC_BIAS_SLOPE = 1.0
+HARMONIC_BIAS_PEAK_BINS = 0.6
+HARMONIC_BIAS_TAIL_BINS = 1.4
+
+# Pico mux prefixes ("<prefix>_<input>" commands)
+SCOPE_MUX_PREFIX = {1: 1, 2: 0}  # Scope channel -> mux prefix
+WAVEGEN_MUX_PREFIX = 2
+MUX_DISABLE_INPUT = 32
+CALIBRATION_SETTLE_S = 0.01      # Wavegen DC settling time before each calibration capture
+CALIBRATION_GAIN_RANGE = (0.8, 1.2)  # Plausible scope gains, anything else means the wavegen did not reach the scope
+
+# Mux inputs of the reference voltages
+REFERENCE_MUX_INPUTS = {MEASUREMENT_CHANNEL_1_1V: 28, MEASUREMENT_CHANNEL_1_8V: 27}
+
+# Frequency accuracy characterization (test_frequency_measurement_accuracy)
+FREQUENCY_CHARACTERIZATION_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'ResultBackups', 'FrequencyCharacterization')
+FREQUENCY_CHARACTERIZATION_RANGES = [  # (min_freq, max_freq, step_freq) in Hz
+    (10, 800, 10),
+    (800, 1000, 100),
+    (1000, 60000, 1000),
+    (60000, 49000000, 50000)
+]
+FREQUENCY_BANDS = [  # (sample rate, frequencies measured at it are below this), shared by determine_signal_frequency and the characterization
+    (100e3, 800),
+    (1e6, 60e3),
+    (100e6, math.inf),
+]
+SETTLE_BINS = 2                # Settled when a capture lands within this many FFT bins of the target...
+SETTLE_RELATIVE_TOLERANCE = 1e-3  # ...or within this fraction of it, and agrees with the previous capture
+SETTLE_TIMEOUT_S = 0.5         # Longest settle wait (the fixed delay this replaces)
+
+# Lazily created caches
+_flat_top_windows = {}           # n_samples -> flat top window
+_frequency_accuracy_table = None  # FrequencyAccuracyTable used by determine_signal_frequency
+
 # Dont allow this file to be run directly
 if __name__ == '__main__':
     print("\n\nThis file cannot be run directly. Please run the main script.\n\n")
     sys.exit(1)
 
 
-def validate_1_1V_reference_voltage(device_data):
+class AnalogMeasurementSession:
     '''
-    Validate the 1.1V reference voltage
+    Scope session that configures the AD2 scope once and captures several
+    channels in the same acquisition
+
+    Usage:
+        with AnalogMeasurementSession(device_data, [1, 2]) as session:
+            stats = session.measure()
+    '''
+
+    def __init__(self, device_data, channels, n_samples=REFERENCE_VOLTAGE_SAMPLES, sample_rate_hz=REFERENCE_VOLTAGE_SAMPLE_RATE_HZ, amplitude_range=5, calibration=None):
+        '''
+        Parameters:
+            device_data (object): The device data object
+            channels (list): The scope channels to capture (1-based)
+            n_samples (int): The number of samples per channel in each acquisition
+            sample_rate_hz (float): The sample rate in Hz
+            amplitude_range (float): The scope amplitude range in volts
+            calibration (dict): {channel: calibration entry} applied to every capture, channels without one stay raw
+        '''
+        if n_samples < 1:
+            raise ValueError("n_samples must be greater than 0")
+
+        self.device_data = device_data
+        self.channels = list(channels)
+        self.n_samples = int(n_samples)
+        self.sample_rate_hz = sample_rate_hz
+        self.amplitude_range = amplitude_range
+        self.calibration = calibration or {}
+        self.is_open = False
+
+        # One reusable buffer per channel, with a zero-copy NumPy view
+        self._buffers = {channel: (c_double*self.n_samples)() for channel in self.channels}
+        self._views = {channel: np.ctypeslib.as_array(buf) for channel, buf in self._buffers.items()}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        '''
+        Configure the scope (all channels enabled, single acquisition of n_samples)
+        '''
+        WF_SDK.scope.open(self.device_data, sampling_frequency=self.sample_rate_hz, buffer_size=self.n_samples, amplitude_range=self.amplitude_range)
+        self.is_open = True
+
+    def close(self):
+        '''
+        Reset the scope
+        '''
+        if self.is_open:
+            WF_SDK.scope.close(self.device_data)
+            self.is_open = False
+
+    def capture(self):
+        '''
+        Run one acquisition and read every channel of the session
+
+        Returns:
+            samples (dict): {channel: numpy array of voltages}, views into the session buffers (calibrated)
+        '''
+        if not self.is_open:
+            raise RuntimeError("AnalogMeasurementSession is not open")
+
+        # Start a single acquisition
+        if dwf.FDwfAnalogInConfigure(self.device_data.handle, c_bool(False), c_bool(True)) == 0:
+            check_error()
+
+        # Wait for a full buffer
+        wait_for_acquisition(lambda: analog_in_done(self.device_data), self.n_samples / self.sample_rate_hz, label="reference voltage capture")
+
+        # Read all channels from the same acquisition
+        for channel in self.channels:
+            dwf.FDwfAnalogInStatusData(self.device_data.handle, c_int(channel - 1), self._buffers[channel], c_int(self.n_samples))
+            apply_calibration(self._views[channel], self.calibration.get(channel))
+
+        return self._views
+
+    def measure(self):
+        '''
+        Capture all channels and compute per-channel statistics
+
+        Returns:
+            stats (dict): {channel: {'mean', 'min', 'max', 'rms', 'noise', 'n_samples'}}
+        '''
+        return {channel: compute_voltage_statistics(samples) for channel, samples in self.capture().items()}
 
-    Parameters: 
-        device_data (object): The device data object
+
+def compute_voltage_statistics(samples):
+    '''
+    Compute summary statistics of a voltage capture
+
+    Parameters:
+        samples (numpy array): The captured voltages
 
     Returns:
-        [voltage, pass] (list): The measured voltage and the test result
+        stats (dict): mean, min, max, rms and noise (standard deviation) in volts, and the sample count
     '''
-    try:
-        # Open the scope
-        WF_SDK.scope.open(device_data)
+    return {
+        'mean': float(np.mean(samples)),
+        'min': float(np.min(samples)),
+        'max': float(np.max(samples)),
+        'rms': float(np.sqrt(np.mean(np.square(samples)))),
+        'noise': float(np.std(samples)),
+        'n_samples': len(samples),
+    }
 
-        # Read the voltage
-        voltage = WF_SDK.scope.measure(device_data, MEASUREMENT_CHANNEL_1_1V)
 
-        # Determine if the voltage is within the acceptable range
-        if voltage >= ACCEPTABLE_VOLTAGE_RANGE_1_1V[0] and voltage <= ACCEPTABLE_VOLTAGE_RANGE_1_1V[1]:
-            pass_test = True
-        else:
-            pass_test = False
+def merge_voltage_statistics(stats_a, stats_b):
+    '''
+    Combine the statistics of two captures as if they were one
 
-        # Close the scope
-        WF_SDK.scope.close(device_data)
+    Parameters:
+        stats_a (dict): Statistics from compute_voltage_statistics
+        stats_b (dict): Statistics from compute_voltage_statistics
 
-        return [voltage, pass_test]
-    
-    except Exception as e:
-        print("Error: " + str(e))
-        return None
+    Returns:
+        stats (dict): The pooled statistics
+    '''
+    n_a, n_b = stats_a['n_samples'], stats_b['n_samples']
+    n = n_a + n_b
+    mean = (n_a * stats_a['mean'] + n_b * stats_b['mean']) / n
+    variance = (n_a * (stats_a['noise']**2 + (stats_a['mean'] - mean)**2) + n_b * (stats_b['noise']**2 + (stats_b['mean'] - mean)**2)) / n
+    return {
+        'mean': mean,
+        'min': min(stats_a['min'], stats_b['min']),
+        'max': max(stats_a['max'], stats_b['max']),
+        'rms': math.sqrt((n_a * stats_a['rms']**2 + n_b * stats_b['rms']**2) / n),
+        'noise': math.sqrt(variance),
+        'n_samples': n,
+    }
+
+
+def sequential_voltage_measurement(session, acceptable_ranges, max_acquisitions=SEQUENTIAL_MAX_ACQUISITIONS, n_sigma=FREQUENCY_UNCERTAINTY_SIGMAS):
+    '''
+    Capture until the confidence interval of every channel's mean voltage is clearly
+    inside or outside its acceptable range, or max_acquisitions is reached
 
+    Parameters:
+        session (AnalogMeasurementSession): An open session over the channels in acceptable_ranges
+        acceptable_ranges (dict): {channel: [min, max] acceptable voltage}
+        max_acquisitions (int): The maximum number of acquisitions
+        n_sigma (float): The number of standard errors the decision must hold for
 
-def validate_1_8V_reference_voltage(device_data):
+    Returns:
+        stats (dict): {channel: pooled statistics, plus 'acquisitions' and 'verdict' (None if undecided)}
     '''
-    Validate the 1.8V reference voltage
+    stats = {}
+    for acquisition in range(1, max_acquisitions + 1):
+        for channel, capture_stats in session.measure().items():
+            stats[channel] = merge_voltage_statistics(stats[channel], capture_stats) if channel in stats else capture_stats
+
+        undecided = False
+        for channel, (low, high) in acceptable_ranges.items():
+            margin = n_sigma * stats[channel]['noise'] / math.sqrt(stats[channel]['n_samples'])
+            stats[channel]['verdict'] = range_verdict(stats[channel]['mean'], margin, low, high)
+            stats[channel]['acquisitions'] = acquisition
+            undecided |= stats[channel]['verdict'] is None
+
+        if not undecided:
+            break
+
+    return stats
+
+
+def chip_mux_inputs():
+    '''
+    Mux inputs wired to a SCuM output (references and clocks), the wavegen must never drive them
+
+    Returns:
+        inputs (set): The mux inputs
+    '''
+    inputs = set(REFERENCE_MUX_INPUTS.values())
+    for clock in CLOCKS_TO_TEST:
+        inputs.add(int(clock['mux-command'].split('_')[1]))
+    return inputs
+
+
+def calibrate_scope_route(device_data, pico_serial, channel, route, levels=CALIBRATION_LEVELS_V):
+    '''
+    Fit the offset and gain of a scope channel.
+    The wavegen steps through DC levels, looped back to the channel through an unused
+    mux input, or wired straight to it (the channel's mux input is then disconnected).
+    A gain outside CALIBRATION_GAIN_RANGE means the wavegen did not reach the channel.
 
     Parameters:
         device_data (object): The device data object
-    
+        pico_serial (obj): The serial object for the pico device
+        channel (int): The scope channel (1-based)
+        route (int or str): An unused Pico mux input, DIRECT_ROUTE to measure the wavegen directly on the channel
+        levels (list): The DC levels to drive in volts
+
     Returns:
-        [voltage, pass] (list): The measured voltage and the test result
+        calibration (dict): gain, offset (V) and the worst residual (V)
     '''
+    if route in chip_mux_inputs():
+        raise ValueError(f"Mux input {route} carries a SCuM output, the wavegen cannot be calibrated through it")
+
+    # Nothing but the wavegen may reach the channel
+    mux_input = MUX_DISABLE_INPUT if route == DIRECT_ROUTE else route
+    send_command_to_pico(pico_serial, f"{WAVEGEN_MUX_PREFIX}_{mux_input}")
+    send_command_to_pico(pico_serial, f"{SCOPE_MUX_PREFIX[channel]}_{mux_input}")
+
+    means = []
     try:
-        # Open the scope
-        WF_SDK.scope.open(device_data)
+        with AnalogMeasurementSession(device_data, [channel]) as session:
+            for level in levels:
+                WF_SDK.wavegen.generate(device_data, channel=1, function=WF_SDK.wavegen.function.dc, offset=level)
+                time.sleep(CALIBRATION_SETTLE_S)
+                means.append(float(np.mean(session.capture()[channel])))
+    finally:
+        WF_SDK.wavegen.close(device_data)
+        send_command_to_pico(pico_serial, f"{WAVEGEN_MUX_PREFIX}_{MUX_DISABLE_INPUT}")
+
+    calibration = fit_offset_gain(levels, means)
+    if not CALIBRATION_GAIN_RANGE[0] <= calibration['gain'] <= CALIBRATION_GAIN_RANGE[1]:
+        raise ValueError(f"Implausible gain {calibration['gain']:.3f} on scope channel {channel}, is the wavegen connected?")
+    return calibration
+
+
+def load_scope_calibration(device_data, pico_serial, channels, route=None):
+    '''
+    Get the calibration of each scope channel, measuring the ones that are missing
+    or expired in the cache. A channel is calibrated through the calibration route and
+    the correction is applied to whatever it is switched to afterwards. Nothing checks
+    how the wavegen is wired, so without a configured route the channels are not calibrated.
+    A failed calibration is cached as well and the channel stays uncalibrated until it expires.
 
-        # Read the voltage
-        voltage = WF_SDK.scope.measure(device_data, MEASUREMENT_CHANNEL_1_8V)
+    Parameters:
+        device_data (object): The device data object
+        pico_serial (obj): The serial object for the pico device
+        channels (list): The scope channels
+        route (int or str): The unused mux input used for calibrating, DIRECT_ROUTE for a direct wavegen connection,
+                            None for CALIBRATION_MUX_INPUT
 
-        # Determine if the voltage is within the acceptable range
-        if voltage >= ACCEPTABLE_VOLTAGE_RANGE_1_8V[0] and voltage <= ACCEPTABLE_VOLTAGE_RANGE_1_8V[1]:
-            pass_test = True
-        else:
-            pass_test = False
+    Returns:
+        calibration (dict): {channel: calibration entry}, empty if calibration is disabled or no route is configured
+    '''
+    if route is None:
+        route = CALIBRATION_MUX_INPUT
+    if not ANALOG_CALIBRATION_ENABLED or route is None:
+        return {}
+
+    cache = AnalogCalibrationCache()
+    serial = device_serial(device_data)
+    calibration = {}
+    updated = False
+
+    for channel in channels:
+        entry = cache.get(serial, channel, route)
+        if entry is None:
+            try:
+                print(f"Calibrating scope channel {channel} {'directly' if route == DIRECT_ROUTE else f'through mux input {route}'}...")
+                entry = cache.put(serial, channel, route, calibrate_scope_route(device_data, pico_serial, channel, route))
+            except Exception as e:
+                print("Calibration error: " + str(e))
+                entry = cache.put_failure(serial, channel, route, e)
+            updated = True
+        elif 'error' in entry:
+            print(f"Scope channel {channel} uncalibrated, its calibration failed at {entry['timestamp']} ({entry['error']})")
+
+        if 'error' not in entry:
+            calibration[channel] = entry
+
+    if updated:
+        cache.save()
+    return calibration
+
+
+def measure_reference_voltage(device_data, channel, acceptable_range, stats=None):
+    '''
+    Validate a reference voltage against its acceptable range
+
+    Parameters:
+        device_data (object): The device data object
+        channel (int): The scope channel the reference is routed to
+        acceptable_range (list): [min, max] acceptable voltage
+        stats (dict): Statistics for the channel from an AnalogMeasurementSession,
+                      if None a session is opened for this channel only
+
+    Returns:
+        [voltage, pass, stats] (list): The mean voltage, the test result and the channel statistics
+    '''
+    try:
+        if stats is None:
+            with AnalogMeasurementSession(device_data, [channel]) as session:
+                stats = session.measure()[channel]
+
+        voltage = stats['mean']
 
-        # Close the scope
-        WF_SDK.scope.close(device_data)
+        # Determine if the voltage is within the acceptable range
+        pass_test = acceptable_range[0] <= voltage <= acceptable_range[1]
 
-        return [voltage, pass_test]
+        return [voltage, pass_test, stats]
 
     except Exception as e:
         print("Error: " + str(e))
         return None
+
+
+def validate_1_1V_reference_voltage(device_data, stats=None):
+    '''
+    Validate the 1.1V reference voltage
+
+    Parameters: 
+        device_data (object): The device data object
+        stats (dict): Statistics for MEASUREMENT_CHANNEL_1_1V from an AnalogMeasurementSession (optional)
+
+    Returns:
+        [voltage, pass, stats] (list): The measured voltage, the test result and the channel statistics
+    '''
+    return measure_reference_voltage(device_data, MEASUREMENT_CHANNEL_1_1V, ACCEPTABLE_VOLTAGE_RANGE_1_1V, stats)
+
+
+def validate_1_8V_reference_voltage(device_data, stats=None):
+    '''
+    Validate the 1.8V reference voltage
+
+    Parameters:
+        device_data (object): The device data object
+        stats (dict): Statistics for MEASUREMENT_CHANNEL_1_8V from an AnalogMeasurementSession (optional)
+    
+    Returns:
+        [voltage, pass, stats] (list): The measured voltage, the test result and the channel statistics
+    '''
+    return measure_reference_voltage(device_data, MEASUREMENT_CHANNEL_1_8V, ACCEPTABLE_VOLTAGE_RANGE_1_8V, stats)
     
 
-def timed_scope_capture(device_data, channel, record_length_ms=2000, sampling_frequency_hz=100000, v_range_min=0, v_range_max=2):
+def timed_scope_capture(device_data, channel, record_length_ms=2000, sampling_frequency_hz=100000, v_range_min=0, v_range_max=2, save_csv=False, output_dir=SCOPE_CAPTURE_DIR):
     """
-    Continually record an analog signal for the given time
+    Continually record an analog signal for the given time.
+    Samples are streamed in fixed-size chunks into a memory-mapped float32 .npy file
+    as they are read from the device, with a JSON sidecar holding the capture settings.
 
     parameters: 
         - device_data (object): The device data object
@@ -132,15 +452,16 @@ def timed_scope_capture(device_data, channel, record_length_ms=2000, sampling_fr
         - sampling_frequency_hz (int): The sampling frequency in Hz
         - v_range_min (float): The minimum voltage range
         - v_range_max (float): The maximum voltage range
+        - save_csv (bool): Also export the recording as a Timestamp,Voltage CSV file
+        - output_dir (str): The directory the recording is written to
 
     returns:
-        signal_data (numpy pair array): The recorded signal data [[time, voltage],...]
-        A CSV file named 'record.csv' containing the recorded signal data
+        [samples, capture_path] (list): The recorded voltages (memory-mapped numpy array) and the path of the .npy file
+        A timestamped .npy file, its .json sidecar and optionally a .csv file in output_dir
     """
 
     '''
     TOTO:
-    - Add a unique name to the CSV file that includes the date/time
     - Catch issues with record length and sampling frequency mismatch
     '''
 
@@ -157,123 +478,182 @@ def timed_scope_capture(device_data, channel, record_length_ms=2000, sampling_fr
     sts = c_byte()
     sampling_frequency_hz = c_double(sampling_frequency_hz)
     record_length_s = c_double(record_length_ms/1000)
-    n_samples = sampling_frequency_hz.value * record_length_s.value
-    sample_buf = (c_double*int(n_samples))()
+    n_samples = int(sampling_frequency_hz.value * record_length_s.value)
+    chunk_buf = (c_double*SCOPE_CAPTURE_CHUNK_SAMPLES)()
+    chunk_np = np.ctypeslib.as_array(chunk_buf)
     samples_avail = c_int()
     lost_sample_cnt = c_int()
     corrupted_sample_cnt = c_int()
     is_sample_lost = False
     is_signal_corrupted = False
 
-    dwf.FDwfDeviceAutoConfigureSet(device_data.handle, c_bool(False)) # disable auto configure
-
-    # Set up acquisition
-    dwf.FDwfAnalogInChannelEnableSet(device_data.handle, c_int(channel - 1), c_bool(True)) # enable channel 0 (C1)
-    dwf.FDwfAnalogInChannelRangeSet(device_data.handle, c_double(v_range_min), c_double(v_range_max)) # pk2pk
-    dwf.FDwfAnalogInAcquisitionModeSet(device_data.handle, acqmodeRecord) # acquisition mode
-    dwf.FDwfAnalogInFrequencySet(device_data.handle, sampling_frequency_hz)
-    dwf.FDwfAnalogInRecordLengthSet(device_data.handle, record_length_s) # -1 infinite record length
-    dwf.FDwfAnalogInConfigure(device_data.handle, c_int(1), c_int(0))
-
-    # Wait at least 2 seconds for the offset to stabilize
-    time.sleep(2)
+    # Preallocate the memory-mapped output file with a unique timestamped name
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = datetime.datetime.now()
+    capture_name = f"record_{start_time.strftime('%Y-%m-%d_%H-%M-%S-%f')}_ch{channel}"
+    capture_path = os.path.join(output_dir, capture_name + ".npy")
+    samples = np.lib.format.open_memmap(capture_path, mode='w+', dtype=np.float32, shape=(n_samples,))
 
-    dwf.FDwfAnalogInConfigure(device_data.handle, c_bool(False), c_bool(True))
-
-    sample_count = 0
+    # Anything that stops the capture before its sidecar is written drops the partial recording
+    completed = False
+    try:
+        dwf.FDwfDeviceAutoConfigureSet(device_data.handle, c_bool(False)) # disable auto configure
 
-    print("Starting Capture...")    
-    while sample_count < n_samples:
+        # Set up acquisition
+        dwf.FDwfAnalogInChannelEnableSet(device_data.handle, c_int(channel - 1), c_bool(True)) # enable channel 0 (C1)
+        dwf.FDwfAnalogInChannelRangeSet(device_data.handle, c_double(v_range_min), c_double(v_range_max)) # pk2pk
+        dwf.FDwfAnalogInAcquisitionModeSet(device_data.handle, acqmodeRecord) # acquisition mode
+        dwf.FDwfAnalogInFrequencySet(device_data.handle, sampling_frequency_hz)
+        dwf.FDwfAnalogInRecordLengthSet(device_data.handle, record_length_s) # -1 infinite record length
+        dwf.FDwfAnalogInConfigure(device_data.handle, c_int(1), c_int(0))
 
-        # Fetch status and data from device
-        dwf.FDwfAnalogInStatus(device_data.handle, c_bool(True), byref(sts))
-        if sample_count == 0 and (sts == DwfStateConfig or sts == DwfStatePrefill or sts == DwfStateArmed) :
-            # Acquisition not yet started.
-            continue
-        
-        # Get the status of the record
-        dwf.FDwfAnalogInStatusRecord(device_data.handle, byref(samples_avail), byref(lost_sample_cnt), byref(corrupted_sample_cnt))
+        # Wait at least 2 seconds for the offset to stabilize
+        time.sleep(2)
 
-        # Update the sample count
-        sample_count += lost_sample_cnt.value
+        dwf.FDwfAnalogInConfigure(device_data.handle, c_bool(False), c_bool(True))
 
-        # Check if samples were lost or corrupted
-        if lost_sample_cnt.value :
-            is_sample_lost = True
-        if corrupted_sample_cnt.value :
-            is_signal_corrupted = True
+        sample_count = 0
 
-        # If there are no samples available, go to the next iteration
-        if samples_avail.value==0 :
-            continue
-            
-        # If the sample count + available samples is greater than the total number of samples, only take the remaining samples
-        if sample_count + samples_avail.value > n_samples :
-            samples_avail = c_int(n_samples-sample_count)
-
-        # Get the data
-        dwf.FDwfAnalogInStatusData(device_data.handle, c_int(channel - 1), byref(sample_buf, sizeof(c_double)*sample_count), samples_avail)
-        sample_count += samples_avail.value
-
-    # Stop the acquisition and reset the device
-    dwf.FDwfAnalogOutReset(device_data.handle, c_int(0))
-    dwf.FDwfDeviceCloseAll()
-
-    print("Recording done")
-    if is_sample_lost:
-        print("Samples were lost! Reduce frequency")
-    if is_signal_corrupted:
-        print("Samples could be corrupted! Reduce frequency")
-
-    # Combine the time and data arrays into a paired array  [[time, voltage],...]
-    timestamps = np.arange(len(sample_buf)) * 1e03 / (sampling_frequency_hz.value)  # Create matching timestamps
-    signal_data = np.column_stack((timestamps, sample_buf))
-
-    f = open("record.csv", "w") # TODO: Change this to a unique name that includes date/time
-    f.write("Timestamp,Voltage\n")
-    for i in range(len(sample_buf)):
-        f.write(f"{timestamps[i]},{sample_buf[i]}\n")
-    f.close()
-
-    # plt.plot(np.fromiter(sample_buf, dtype=float))
-    # plt.show()
+        def record_data_ready():
+            # Fetch status and data from device
+            dwf.FDwfAnalogInStatus(device_data.handle, c_bool(True), byref(sts))
+            if sample_count == 0 and sts.value in (DwfStateConfig.value, DwfStatePrefill.value, DwfStateArmed.value):
+                # Acquisition not yet started.
+                return False
+
+            # Get the status of the record
+            dwf.FDwfAnalogInStatusRecord(device_data.handle, byref(samples_avail), byref(lost_sample_cnt), byref(corrupted_sample_cnt))
+            return samples_avail.value > 0 or lost_sample_cnt.value > 0
+
+        # Poll once per SCOPE_CAPTURE_POLL_SAMPLES worth of samples
+        poll_fill_s = min(SCOPE_CAPTURE_POLL_SAMPLES, n_samples) / sampling_frequency_hz.value
+
+        print("Starting Capture...")    
+        while sample_count < n_samples:
+
+            # Wait for the next block of samples
+            wait_for_acquisition(record_data_ready, poll_fill_s, label="scope record")
+
+            # Update the sample count (lost samples are left as zeros)
+            sample_count = min(sample_count + lost_sample_cnt.value, n_samples)
+
+            # Check if samples were lost or corrupted
+            if lost_sample_cnt.value :
+                is_sample_lost = True
+            if corrupted_sample_cnt.value :
+                is_signal_corrupted = True
+
+            # Only take the samples that are still needed
+            available = min(samples_avail.value, n_samples - sample_count)
+
+            # Stream the available samples into the output file, one chunk at a time
+            offset = 0
+            while offset < available:
+                chunk_len = min(SCOPE_CAPTURE_CHUNK_SAMPLES, available - offset)
+                dwf.FDwfAnalogInStatusData2(device_data.handle, c_int(channel - 1), chunk_buf, c_int(offset), c_int(chunk_len))
+                samples[sample_count:sample_count + chunk_len] = chunk_np[:chunk_len]
+                sample_count += chunk_len
+                offset += chunk_len
+
+        # Stop the acquisition and reset the device
+        dwf.FDwfAnalogOutReset(device_data.handle, c_int(0))
+        dwf.FDwfDeviceCloseAll()
+
+        print("Recording done")
+        if is_sample_lost:
+            print("Samples were lost! Reduce frequency")
+        if is_signal_corrupted:
+            print("Samples could be corrupted! Reduce frequency")
+
+        samples.flush()
+
+        # Write the capture settings next to the samples
+        with open(os.path.join(output_dir, capture_name + ".json"), "w") as f:
+            json.dump({
+                'file': os.path.basename(capture_path),
+                'dtype': 'float32',
+                'n_samples': n_samples,
+                'channel': channel,
+                'sampling_frequency_hz': sampling_frequency_hz.value,
+                'record_length_ms': record_length_ms,
+                'v_range': [v_range_min, v_range_max],
+                'start_time': start_time.isoformat(),
+                'samples_lost': is_sample_lost,
+                'samples_corrupted': is_signal_corrupted,
+            }, f, indent=4)
+        completed = True
+    finally:
+        if not completed:
+            # Stop the instrument and remove the partial files
+            dwf.FDwfAnalogInReset(device_data.handle)
+            del samples
+            for path in (capture_path, os.path.join(output_dir, capture_name + ".json")):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # Optional CSV export, written in blocks instead of one line at a time
+    if save_csv:
+        with open(os.path.join(output_dir, capture_name + ".csv"), "w") as f:
+            f.write("Timestamp,Voltage\n")
+            for start in range(0, n_samples, SCOPE_CAPTURE_CHUNK_SAMPLES):
+                stop = min(start + SCOPE_CAPTURE_CHUNK_SAMPLES, n_samples)
+                timestamps = np.arange(start, stop) * 1e03 / sampling_frequency_hz.value
+                np.savetxt(f, np.column_stack((timestamps, samples[start:stop])), delimiter=",", fmt="%.9g")
 
     #plot the signal in debug mode
     if DEBUG:
-        plt.plot(timestamps, sample_buf)
+        timestamps = np.arange(n_samples) * 1e03 / sampling_frequency_hz.value
+        plt.plot(timestamps, samples)
         plt.xlabel('Time (ms)')
         plt.ylabel('Voltage (V)')
         plt.title('Recorded Signal')
         plt.show()
 
-    return signal_data
+    return [samples, capture_path]
 
 
-def determine_signal_frequency(device_data, channel=1, n_measurements=10, sample_rate_hz=100e6, v_range_min=0, v_range_max=2):
+def find_spectrum_peak(bins, skip_bins=5, centroid_half_width=4):
     '''
-    Determine the frequency of a signal. 
-    Accurate for frequencies between 60 Hz and 25 MHz (both inclusive)
-    Outside this range, the accuracy drops off
+    Find the peak bin of a magnitude spectrum and refine it with a weighted average
+    of the surrounding bins
+
+    Parameters:
+        bins (numpy array): The magnitude spectrum (DC to nyquist)
+        skip_bins (int): The number of bins to skip at the start of the spectrum (DC lobe)
+        centroid_half_width (int): The number of bins on each side of the peak used in the weighted average
+
+    Returns:
+        peak (float): The (fractional) index of the peak bin
+    '''
+    n_bins = len(bins)
+
+    # Last occurrence of the maximum, same as the original scan
+    search = bins[skip_bins:]
+    i_peak = skip_bins + len(search) - 1 - int(np.argmax(search[::-1]))
+
+    # Weighted average, only if the window fits in the spectrum
+    if i_peak < n_bins - (centroid_half_width + 1):
+        indices = np.arange(i_peak - centroid_half_width, i_peak + centroid_half_width + 1)
+        weights = bins[indices]
+        return float(np.dot(indices, weights) / np.sum(weights))
+
+    return float(i_peak)
+
+
+def configure_frequency_capture(device_data, channel=1, sample_rate_hz=100e6, v_range_min=0, v_range_max=2):
+    '''
+    Configure the scope for a frequency capture and start the acquisition
 
     Parameters:
         device_data (object): The device data object
         channel (int): The channel to measure
-        n_measurements (int): The number of measurements to average
         sample_rate_hz (float): The sample rate in Hz (max 100 MHz)
         v_range_min (float): The minimum voltage range
         v_range_max (float): The maximum voltage range
 
     Returns:
-        frequency (float): The frequency of the signal in Hz
+        n_samples (int): The number of samples per acquisition
     '''
-    # Validate input
-    if n_measurements < 1:
-        raise ValueError("n_measurements must be greater than 0")
-    elif sample_rate_hz < 1:
-        raise ValueError("sample_rate_hz must be greater than 0")
-    elif sample_rate_hz > 100e6:
-        raise ValueError("sample_rate_hz must be less than or equal to 100 MHz")
-
     # Setup to capture up to 32Ki of samples
     n_buff_max = c_int()
     dwf.FDwfAnalogInBufferSizeInfo(device_data.handle, 0, byref(n_buff_max))
@@ -290,81 +670,504 @@ def determine_signal_frequency(device_data, channel=1, n_measurements=10, sample
     if dwf.FDwfAnalogInConfigure(device_data.handle, c_bool(True), c_bool(True)) == 0 :
         check_error()
 
-    # Convert the sample rate to a c_double
-    sample_rate_hz = c_double(sample_rate_hz)
-    # print("Samples: "+str(nSamples)+"  Rate: "+str(hzRate.value/1e6)+"MHz") 
+    return n_samples
 
-    # Create buffers for samples, window, and bins
+
+def analog_in_done(device_data):
+    '''
+    Poll the scope once and report whether the acquisition is complete
+
+    Parameters:
+        device_data (object): The device data object
+
+    Returns:
+        done (bool): True if the scope is in the done state
+    '''
+    sts = c_byte()
+    # Fetch status and data from device
+    if dwf.FDwfAnalogInStatus(device_data.handle, c_bool(True), byref(sts)) == 0 :
+        check_error()
+    return sts.value == DwfStateDone.value
+
+
+def acquire_frequency_capture(device_data, channel, samples, sample_rate_hz):
+    '''
+    Wait for a full buffer and copy it into the given ctypes buffer
+
+    Parameters:
+        device_data (object): The device data object
+        channel (int): The channel to read
+        samples (c_double array): The buffer to fill, sized by configure_frequency_capture
+        sample_rate_hz (float): The sample rate in Hz, used to pace the wait
+    '''
+    # Wait for a full buffer
+    wait_for_acquisition(lambda: analog_in_done(device_data), len(samples) / sample_rate_hz, label="frequency capture")
+
+    # Get the data
+    dwf.FDwfAnalogInStatusData(device_data.handle, c_int(channel - 1), samples, len(samples))
+
+
+def average_peak_frequency(device_data, channel, n_samples, sample_rate_hz, n_measurements=10, fft_backend=None, restart=False):
+    '''
+    Average the spectrum peak frequency over several captures with the scope
+    already configured by configure_frequency_capture
+
+    Parameters:
+        device_data (object): The device data object
+        channel (int): The channel to measure
+        n_samples (int): The number of samples per acquisition
+        sample_rate_hz (float): The configured sample rate in Hz
+        n_measurements (int): The number of measurements to average
+        fft_backend (str): FFT_BACKEND_NUMPY to window/FFT with NumPy, FFT_BACKEND_DWF to use FDwfSpectrumFFT,
+                           None for the module's FFT_BACKEND at call time
+        restart (bool): Start a new acquisition (keeping the configuration) before each capture
+
+    Returns:
+        frequency (float): The average peak frequency in Hz
+    '''
+    if fft_backend is None:
+        fft_backend = FFT_BACKEND
+
+    # Create buffers for samples and bins
     samples = (c_double*n_samples)()
-    window = (c_double*n_samples)()
     n_bins = int(n_samples/2+1)
     bins = (c_double*n_bins)()
-    maxFrequency = sample_rate_hz.value/2  # nyquist limit
+    window = flat_top_window(n_samples)
+    maxFrequency = sample_rate_hz/2  # nyquist limit
 
-    # Set up the window
-    dwf.FDwfSpectrumWindow(byref(window), c_int(n_samples), DwfWindowFlatTop, c_double(1.0), None)
-    # print("Range: DC to "+str(hzTop/1e0)+" Hz  Resolution: "+str(hzTop/(nBins-1)/1e3)+" kHz") 
+    # Zero-copy NumPy views of the ctypes buffers
+    samples_np = np.ctypeslib.as_array(samples)
+    window_np = np.ctypeslib.as_array(window)
+    bins_np = np.ctypeslib.as_array(bins)
 
     weighted_freq_sum = 0
 
     # Perform measurements
     for i in range(n_measurements):
+        if restart and dwf.FDwfAnalogInConfigure(device_data.handle, c_bool(False), c_bool(True)) == 0:
+            check_error()
 
-        # Wait for a full buffer
-        while True:
-            sts = c_byte()
-            # Fetch status and data from device
-            if dwf.FDwfAnalogInStatus(device_data.handle, c_bool(True), byref(sts)) == 0 :
-                check_error()
-            if sts.value == DwfStateDone.value :
-                break
+        # Wait for a full buffer and get the data
+        acquire_frequency_capture(device_data, channel, samples, sample_rate_hz)
         
-        # Get the data
-        dwf.FDwfAnalogInStatusData(device_data.handle, c_int(channel - 1), samples, n_samples) 
-        
-        # Apply the window
-        for i in range(n_samples):
-            samples[i] = samples[i]*window[i]
+        # Apply the window (in place, on the ctypes buffer)
+        np.multiply(samples_np, window_np, out=samples_np)
 
         # Perform the FFT
-        dwf.FDwfSpectrumFFT(byref(samples), n_samples, byref(bins), None, n_bins)
-
-        # Find the peak
-        iPeak = 0
-        vPeak = float('-inf')
-        for i in range(5, n_bins): # skip DC lobe
-            if bins[i] < vPeak: continue
-            vPeak = bins[i]
-            iPeak = i
+        if fft_backend == FFT_BACKEND_DWF:
+            dwf.FDwfSpectrumFFT(byref(samples), n_samples, byref(bins), None, n_bins)
+        else:
+            bins_np[:] = np.abs(np.fft.rfft(samples_np))
 
-        # print("C"+str(channel)+" peak: "+str(hzTop*iPeak/(nBins-1)/1e0)+" Hz  ")
-        
-        # Perform a weighted average
-        if iPeak < n_bins-5: # weighted average
-            s = 0
-            m = 0
-            for i in range(-4,5):
-                t = bins[iPeak+i]
-                s += (iPeak+i)*t
-                m += t
-            iPeak = s/m
+        # Find the peak and perform a weighted average around it
+        iPeak = find_spectrum_peak(bins_np)
 
         weighted_freq_sum += maxFrequency*iPeak/(n_bins-1)/1e0
 
-    # print("C"+str(channel)+" weighted: "+str(weighted_freq)+" Hz")
+    return weighted_freq_sum / n_measurements
+
+
+def flat_top_window(n_samples):
+    '''
+    Flat top window from the WaveForms SDK, computed once per length
+
+    Parameters:
+        n_samples (int): The window length
+
+    Returns:
+        window (c_double array): The window coefficients (shared, do not modify)
+    '''
+    if n_samples not in _flat_top_windows:
+        window = (c_double*n_samples)()
+        dwf.FDwfSpectrumWindow(byref(window), c_int(n_samples), DwfWindowFlatTop, c_double(1.0), None)
+        _flat_top_windows[n_samples] = window
+    return _flat_top_windows[n_samples]
+
+
+def frequency_accuracy_table():
+    '''
+    The frequency accuracy table used to correct determine_signal_frequency, loaded on first use
+
+    Returns:
+        table (FrequencyAccuracyTable): The table (empty if none has been characterized)
+    '''
+    global _frequency_accuracy_table
+    if _frequency_accuracy_table is None:
+        _frequency_accuracy_table = FrequencyAccuracyTable.load()
+    return _frequency_accuracy_table
+
+
+def determine_signal_frequency(device_data, channel=1, n_measurements=10, sample_rate_hz=100e6, v_range_min=0, v_range_max=2, fft_backend=None, correct=FREQUENCY_ACCURACY_CORRECTION):
+    '''
+    Determine the frequency of a signal. 
+    Accurate for frequencies between 60 Hz and 25 MHz (both inclusive)
+    Outside this range, the accuracy drops off
+
+    Parameters:
+        device_data (object): The device data object
+        channel (int): The channel to measure
+        n_measurements (int): The number of measurements to average
+        sample_rate_hz (float): The sample rate in Hz (max 100 MHz)
+        v_range_min (float): The minimum voltage range
+        v_range_max (float): The maximum voltage range
+        fft_backend (str): FFT_BACKEND_NUMPY to window/FFT with NumPy, FFT_BACKEND_DWF to use FDwfSpectrumFFT,
+                           None for the module's FFT_BACKEND at call time
+        correct (bool): Remove the error characterized for the final sample rate band (see test_frequency_measurement_accuracy)
 
-    weighted_freq_avg = weighted_freq_sum / n_measurements
+    Returns:
+        frequency (float): The frequency of the signal in Hz
+    '''
+    if fft_backend is None:
+        fft_backend = FFT_BACKEND
 
-    # If the frequency is too low and the sample rate is too high, try again with a lower sample rate
-    if (weighted_freq_avg >= 800e0 and weighted_freq_avg <= 60e3) and sample_rate_hz.value > 1e6:
-        return determine_signal_frequency(device_data, channel, n_measurements, 1e6, v_range_min, v_range_max)
-    elif weighted_freq_avg <= 800e0 and sample_rate_hz.value > 100e3:
-        return determine_signal_frequency(device_data, channel, n_measurements, 100e3, v_range_min, v_range_max)
+    # Validate input
+    if n_measurements < 1:
+        raise ValueError("n_measurements must be greater than 0")
+    elif sample_rate_hz < 1:
+        raise ValueError("sample_rate_hz must be greater than 0")
+    elif sample_rate_hz > 100e6:
+        raise ValueError("sample_rate_hz must be less than or equal to 100 MHz")
+    elif fft_backend not in (FFT_BACKEND_NUMPY, FFT_BACKEND_DWF):
+        raise ValueError(f"fft_backend must be '{FFT_BACKEND_NUMPY}' or '{FFT_BACKEND_DWF}'")
+
+    # Configure the scope and begin acquisition
+    n_samples = configure_frequency_capture(device_data, channel, sample_rate_hz, v_range_min, v_range_max)
+    # print("Samples: "+str(nSamples)+"  Rate: "+str(hzRate.value/1e6)+"MHz") 
+
+    weighted_freq_avg = average_peak_frequency(device_data, channel, n_samples, sample_rate_hz, n_measurements, fft_backend)
+
+    # If the frequency is too low and the sample rate is too high, try again at the sample rate of its band
+    band_sample_rate_hz = frequency_band(weighted_freq_avg)
+    if band_sample_rate_hz < sample_rate_hz:
+        return determine_signal_frequency(device_data, channel, n_measurements, band_sample_rate_hz, v_range_min, v_range_max, fft_backend, correct)
     
     # Else return the frequency as is
+    elif correct:
+        return frequency_accuracy_table().correct(weighted_freq_avg, sample_rate_hz)
     else:
         return weighted_freq_avg
 
+
+def refine_signal_frequency(samples, sample_rate_hz, zoom_points=ZOOM_POINTS):
+    '''
+    Estimate the frequency of the dominant tone in a capture.
+    A coarse FFT locates the peak bin, a zoom DFT over +/-1 bin around it refines
+    the estimate and a parabolic fit on the zoomed magnitudes gives the final value.
+    The uncertainty covers noise and interpolation, which average down over captures
+    at the same sample rate; the harmonic alias bias of a square clock does not and is
+    returned separately (the total 1-sigma uncertainty is the root sum of squares of both).
+
+    Parameters:
+        samples (numpy array): The captured samples
+        sample_rate_hz (float): The sample rate in Hz
+        zoom_points (int): The number of DFT points evaluated across the +/-1 bin zoom span
+
+    Returns:
+        [frequency, uncertainty, cycles, alias_bias] (list): The frequency in Hz, its 1-sigma noise and interpolation
+            uncertainty in Hz, the number of signal periods in the capture and the harmonic alias bias in Hz
+    '''
+    n_samples = len(samples)
+    resolution_hz = sample_rate_hz / n_samples
+
+    # Remove DC and apply a Hann window (a flat-top window is too flat at the peak to refine it)
+    window = np.hanning(n_samples)
+    windowed = (samples - np.mean(samples)) * window
+
+    # Coarse FFT peak (skip the DC lobe)
+    spectrum = np.abs(np.fft.rfft(windowed))
+    k_peak = 2 + int(np.argmax(spectrum[2:]))
+
+    # Zoom DFT over +/-1 bin around the coarse peak
+    zoom_bins = k_peak + np.linspace(-1, 1, zoom_points)
+    phasors = np.exp(-2j * np.pi * np.outer(zoom_bins / n_samples, np.arange(n_samples)))
+    zoom = np.abs(phasors @ windowed)
+    j_peak = int(np.argmax(zoom))
+    zoom_step = zoom_bins[1] - zoom_bins[0]
+
+    # Parabolic interpolation between the zoom points
+    peak_bin = zoom_bins[j_peak]
+    if 0 < j_peak < zoom_points - 1:
+        left, centre, right = zoom[j_peak - 1], zoom[j_peak], zoom[j_peak + 1]
+        denominator = left - 2*centre + right
+        if denominator != 0:
+            peak_bin += 0.5 * (left - right) / denominator * zoom_step
+
+    frequency = peak_bin * resolution_hz
+
+    # Noise floor from the median bin power (exponentially distributed for noise-only bins)
+    window_power = np.sum(window**2)
+    noise_variance = np.median(spectrum**2) / np.log(2) / window_power
+    amplitude = 2 * zoom[j_peak] / np.sum(window)
+    snr = amplitude**2 / (2 * noise_variance) if noise_variance > 0 else np.inf
+
+    # Cramer-Rao bound on a single tone frequency, widened for the Hann window, combined with
+    # the worst bias of the parabolic interpolation (measured on noiseless tones, it falls with zoom_step**3)
+    crlb_hz = sample_rate_hz / (2*np.pi) * math.sqrt(12 / (snr * n_samples * (n_samples**2 - 1))) if snr > 0 else np.inf
+    interpolation_hz = PARABOLIC_BIAS_BINS * zoom_step**3 * resolution_hz
+    uncertainty = math.sqrt((HANN_CRLB_FACTOR * crlb_hz)**2 + interpolation_hz**2)
+
+    cycles = frequency * n_samples / sample_rate_hz
+    alias_bias = harmonic_alias_bias(frequency, sample_rate_hz, n_samples)
+
+    return [frequency, uncertainty, cycles, alias_bias]
+
+
+def harmonic_alias_bias(frequency_hz, sample_rate_hz, n_samples):
+    '''
+    Worst bias of refine_signal_frequency on a square clock from its odd harmonics.
+    Each harmonic (1/h of the fundamental, rolled off at first order above
+    SCOPE_BANDWIDTH_HZ) folds below nyquist and pulls the estimate by up to the
+    HARMONIC_BIAS_* bound at its distance from the fundamental. Clocks in step with
+    the scope clock fold harmonics right next to the fundamental, where the bias
+    can be far above the noise (at 100 MS/s the 99th and 101st harmonics of a
+    1 MHz clock land within a bin of it once it is a few ppm off).
+    Even harmonics are left out, the clocks are assumed close to 50% duty.
+
+    Parameters:
+        frequency_hz (float): The clock frequency in Hz
+        sample_rate_hz (float): The sample rate in Hz
+        n_samples (int): The number of samples in the capture
+
+    Returns:
+        alias_bias (float): The bias bound in Hz
+    '''
+    if frequency_hz <= 0:
+        return 0.0
+    resolution_hz = sample_rate_hz / n_samples
+    harmonics = np.arange(3, MAX_ALIAS_CHECK_HARMONIC + 1, 2)
+    amplitudes = math.sqrt(1 + (frequency_hz / SCOPE_BANDWIDTH_HZ)**2) / (harmonics * np.sqrt(1 + (harmonics * frequency_hz / SCOPE_BANDWIDTH_HZ)**2))
+    aliases_hz = np.abs(harmonics * frequency_hz - np.round(harmonics * frequency_hz / sample_rate_hz) * sample_rate_hz)
+    distance_bins = np.abs(aliases_hz - frequency_hz) / resolution_hz
+    bias_bins = np.minimum(np.minimum(HARMONIC_BIAS_SLOPE * distance_bins, HARMONIC_BIAS_PEAK_BINS),
+                           HARMONIC_BIAS_TAIL_BINS / np.maximum(distance_bins, 1e-12)**3)
+    return float(np.sum(amplitudes * bias_bins) * resolution_hz)
+
+
+def retune_sample_rate(frequency_hz, sample_rate_hz, n_samples):
+    '''
+    Sample rate for the next capture of a signal with too few periods in the last one,
+    or with harmonics of a square clock aliased onto it.
+    About SAMPLES_PER_PERIOD_TARGET samples per period (at least MIN_SAMPLES_PER_PERIOD),
+    at a rate the scope clock divider makes exactly, and chosen (within RETUNE_RATE_SPAN)
+    for the lowest harmonic_alias_bias
+
+    Parameters:
+        frequency_hz (float): The coarse frequency estimate in Hz
+        sample_rate_hz (float): The sample rate of the last capture in Hz
+        n_samples (int): The number of samples per capture
+
+    Returns:
+        sample_rate_hz (float): The new sample rate in Hz (the last one if no rate in the span fits)
+    '''
+    target_hz = max(MIN_FREQUENCY_SAMPLE_RATE_HZ, min(sample_rate_hz / 2, frequency_hz * SAMPLES_PER_PERIOD_TARGET))
+    lowest_hz = max(MIN_FREQUENCY_SAMPLE_RATE_HZ, target_hz * (1 - RETUNE_RATE_SPAN), frequency_hz * MIN_SAMPLES_PER_PERIOD)
+    dividers = np.arange(max(1, math.ceil(ANALOG_IN_CLOCK_HZ / (target_hz * (1 + RETUNE_RATE_SPAN)))),
+                         math.floor(ANALOG_IN_CLOCK_HZ / lowest_hz) + 1)
+    if len(dividers) == 0:
+        return sample_rate_hz
+    rates = ANALOG_IN_CLOCK_HZ / dividers
+    if frequency_hz <= 0:
+        return float(rates[np.argmin(np.abs(rates - target_hz))])
+
+    biases = [harmonic_alias_bias(frequency_hz, rate, n_samples) for rate in rates]
+    return float(rates[int(np.argmin(biases))])
+
+
+def next_sample_rate(frequency_hz, uncertainty, cycles, alias_bias, sample_rate_hz, n_samples, min_cycles):
+    '''
+    Whether a capture analysed by refine_signal_frequency needs another one at a retuned sample rate:
+    when it holds too few periods of the signal (unless already at the lowest sample rate), or when
+    the harmonic alias bias is above the noise and a retuned rate lowers it
+
+    Parameters:
+        frequency_hz (float): The frequency estimate in Hz
+        uncertainty (float): The noise and interpolation uncertainty in Hz
+        cycles (float): The number of signal periods in the capture
+        alias_bias (float): The harmonic alias bias in Hz
+        sample_rate_hz (float): The sample rate of the capture in Hz
+        n_samples (int): The number of samples per capture
+        min_cycles (float): The minimum number of signal periods a capture must hold
+
+    Returns:
+        sample_rate_hz (float): The sample rate for the next capture in Hz, None if the capture is good enough
+    '''
+    if cycles < min_cycles:
+        if sample_rate_hz <= MIN_FREQUENCY_SAMPLE_RATE_HZ:
+            return None
+        return retune_sample_rate(frequency_hz, sample_rate_hz, n_samples)
+
+    if alias_bias > uncertainty:
+        retuned_hz = retune_sample_rate(frequency_hz, sample_rate_hz, n_samples)
+        if harmonic_alias_bias(frequency_hz, retuned_hz, n_samples) < alias_bias:
+            return retuned_hz
+    return None
+
+
+def estimate_signal_frequency(device_data, channel=1, sample_rate_hz=100e6, v_range_min=0, v_range_max=2, min_cycles=MIN_CYCLES_PER_CAPTURE):
+    '''
+    Estimate the frequency of a signal from a single acquisition.
+    If the capture holds too few periods of the signal, or harmonics of the
+    clock alias onto it, the sample rate is retuned directly from the coarse
+    estimate (instead of stepping through fixed sample rates with a full set of
+    measurements at each). One retune is normally enough, up to
+    MAX_SAMPLE_RATE_RETUNES are allowed.
+
+    Parameters:
+        device_data (object): The device data object
+        channel (int): The channel to measure
+        sample_rate_hz (float): The starting sample rate in Hz (max 100 MHz)
+        v_range_min (float): The minimum voltage range
+        v_range_max (float): The maximum voltage range
+        min_cycles (float): The minimum number of signal periods a capture must hold
+
+    Returns:
+        [frequency, uncertainty] (list): The frequency in Hz and its 1-sigma uncertainty in Hz
+    '''
+    # Validate input
+    if sample_rate_hz < 1:
+        raise ValueError("sample_rate_hz must be greater than 0")
+    elif sample_rate_hz > 100e6:
+        raise ValueError("sample_rate_hz must be less than or equal to 100 MHz")
+
+    for attempt in range(MAX_SAMPLE_RATE_RETUNES + 1):
+        # Single acquisition
+        n_samples = configure_frequency_capture(device_data, channel, sample_rate_hz, v_range_min, v_range_max)
+        samples = (c_double*n_samples)()
+        acquire_frequency_capture(device_data, channel, samples, sample_rate_hz)
+
+        frequency, uncertainty, cycles, alias_bias = refine_signal_frequency(np.ctypeslib.as_array(samples), sample_rate_hz)
+
+        # Retune so the signal sits well below nyquist with many periods per capture and no harmonics on it
+        retuned_hz = next_sample_rate(frequency, uncertainty, cycles, alias_bias, sample_rate_hz, n_samples, min_cycles)
+        if retuned_hz is None:
+            break
+        sample_rate_hz = retuned_hz
+
+    return [frequency, math.sqrt(uncertainty**2 + alias_bias**2)]
+
+
+def frequency_ppm_verdict(ppm, uncertainty_ppm, tolerance_ppm, n_sigma=FREQUENCY_UNCERTAINTY_SIGMAS):
+    '''
+    Decide whether a ppm error is clearly inside or clearly outside its tolerance
+
+    Parameters:
+        ppm (float): The measured frequency error in ppm
+        uncertainty_ppm (float): The 1-sigma uncertainty of the error in ppm
+        tolerance_ppm (float): The allowed absolute error in ppm
+        n_sigma (float): The number of standard deviations the decision must hold for
+
+    Returns:
+        verdict (bool or None): True if clearly met, False if clearly missed, None if undecided
+    '''
+    return range_verdict(ppm, n_sigma * uncertainty_ppm, -tolerance_ppm, tolerance_ppm)
+
+
+def range_verdict(value, margin, low, high):
+    '''
+    Decide whether a confidence interval lies entirely inside or entirely outside a range
+
+    Parameters:
+        value (float): The measured value
+        margin (float): The half-width of the confidence interval
+        low (float): The lowest acceptable value
+        high (float): The highest acceptable value
+
+    Returns:
+        verdict (bool or None): True if entirely inside, False if entirely outside, None if the interval straddles a limit
+    '''
+    if low <= value - margin and value + margin <= high:
+        return True
+    elif value + margin < low or value - margin > high:
+        return False
+    return None
+
+
+def sequential_signal_frequency(device_data, exp_freq_hz, tolerance_ppm, channel=1, sample_rate_hz=100e6, v_range_min=0, v_range_max=2, min_cycles=MIN_CYCLES_PER_CAPTURE, max_acquisitions=SEQUENTIAL_MAX_ACQUISITIONS, min_acquisitions=SEQUENTIAL_MIN_ACQUISITIONS):
+    '''
+    Measure a clock frequency with as few acquisitions as the decision needs.
+    Single-pass estimates are combined (weighted by their uncertainty) until the
+    confidence interval of the ppm error is clearly inside or outside the tolerance,
+    or max_acquisitions is reached. Captures that only retune the sample rate
+    (at most MAX_SAMPLE_RATE_RETUNES) do not count towards max_acquisitions.
+    The harmonic alias bias is the same for every capture at a sample rate, so
+    it is added to the combined uncertainty rather than averaged down.
+    No decision is taken before min_acquisitions estimates, and only while each
+    new estimate agrees with the mean of the earlier ones within their uncertainty.
+
+    Parameters:
+        device_data (object): The device data object
+        exp_freq_hz (float): The expected frequency in Hz
+        tolerance_ppm (float): The allowed absolute error in ppm
+        channel (int): The channel to measure
+        sample_rate_hz (float): The starting sample rate in Hz (max 100 MHz)
+        v_range_min (float): The minimum voltage range
+        v_range_max (float): The maximum voltage range
+        min_cycles (float): The minimum number of signal periods a capture must hold
+        max_acquisitions (int): The maximum number of acquisitions
+        min_acquisitions (int): The minimum number of agreeing acquisitions before an early decision
+
+    Returns:
+        [frequency, uncertainty, acquisitions, verdict] (list): The frequency and its 1-sigma uncertainty in Hz,
+            the number of acquisitions taken (retunes included) and the verdict (None if still undecided
+            at the cap, False with NaN frequency and uncertainty if nothing could be estimated)
+    '''
+    n_samples = configure_frequency_capture(device_data, channel, sample_rate_hz, v_range_min, v_range_max)
+    samples = (c_double*n_samples)()
+    samples_np = np.ctypeslib.as_array(samples)
+    started = True
+    retunes = 0
+    estimates = 0
+    combined = 0
+    weight_sum = 0
+    weighted_freq_sum = 0
+    frequency, uncertainty, verdict = None, None, None
+
+    while estimates < max_acquisitions:
+        # Start a new acquisition with the same configuration
+        if not started and dwf.FDwfAnalogInConfigure(device_data.handle, c_bool(False), c_bool(True)) == 0:
+            check_error()
+        started = False
+
+        acquire_frequency_capture(device_data, channel, samples, sample_rate_hz)
+        capture_freq, capture_uncertainty, cycles, alias_bias = refine_signal_frequency(samples_np, sample_rate_hz)
+
+        # Too few periods in the capture or harmonics aliased onto it, retune (as estimate_signal_frequency) and start over
+        retuned_hz = next_sample_rate(capture_freq, capture_uncertainty, cycles, alias_bias, sample_rate_hz, n_samples, min_cycles)
+        if retuned_hz is not None and retunes < MAX_SAMPLE_RATE_RETUNES:
+            sample_rate_hz = retuned_hz
+            n_samples = configure_frequency_capture(device_data, channel, sample_rate_hz, v_range_min, v_range_max)
+            samples = (c_double*n_samples)()
+            samples_np = np.ctypeslib.as_array(samples)
+            started = True
+            retunes += 1
+            weight_sum = weighted_freq_sum = 0
+            combined = 0
+            continue
+        estimates += 1
+        combined += 1
+
+        # The new estimate must agree with the earlier ones (the alias bias moves with the clock phase, so it counts for both)
+        if weight_sum > 0:
+            agreed = abs(capture_freq - weighted_freq_sum / weight_sum) <= FREQUENCY_UNCERTAINTY_SIGMAS * math.sqrt(capture_uncertainty**2 + 1 / weight_sum + 2 * alias_bias**2)
+        else:
+            agreed = True
+
+        # Inverse-variance weighted mean of the captures so far
+        weight = 1 / max(capture_uncertainty, 1e-12)**2
+        weight_sum += weight
+        weighted_freq_sum += weight * capture_freq
+        frequency = float(weighted_freq_sum / weight_sum)
+        uncertainty = math.sqrt(1 / weight_sum + alias_bias**2)
+
+        ppm = (frequency - exp_freq_hz) / exp_freq_hz * 1e6
+        verdict = frequency_ppm_verdict(ppm, uncertainty / exp_freq_hz * 1e6, tolerance_ppm)
+        if verdict is not None and agreed and combined >= min(min_acquisitions, max_acquisitions):
+            break
+
+    if frequency is None:
+        return [math.nan, math.nan, retunes + estimates, False]
+    return [frequency, uncertainty, retunes + estimates, verdict]
+
 def convert_frequency_to_unit(freq):
     """
     Convert frequency to appropriate unit (Hz, kHz, MHz, GHz) with 4 significant figures.
@@ -384,6 +1187,144 @@ def convert_frequency_to_unit(freq):
     else:
         return ["Hz", round(freq, 4)]
 
+def clock_test_result(clock, freq, uncertainty_ppm=None, acquisitions=None):
+    '''
+    Build (and print) the test result of a clock measurement
+
+    Parameters:
+        clock (dict): The clock entry from CLOCKS_TO_TEST
+        freq (float): The measured frequency in Hz
+        uncertainty_ppm (float): The 1-sigma uncertainty in ppm, None if unknown
+        acquisitions (int): The number of acquisitions taken, None if not counted
+
+    Returns:
+        test_result (dict): The sub-test result
+    '''
+    # Determine PPM
+    ppm = ((freq - clock['exp_freq_hz']) / clock['exp_freq_hz']) * 1e6
+
+    unit, freq = convert_frequency_to_unit(freq)
+
+    # Validate PPM and store the result
+    pass_test = abs(ppm) <= clock['tolerance_ppm']
+    print(f"{clock['name']} clock signal test: {'PASS' if pass_test else 'FAIL'} at {freq} {unit} ({ppm:.3f} ppm)")
+
+    values = [
+        {'name': f'measured_frequency ({unit})', 'value': freq},
+        {'name': 'ppm', 'value': round(ppm, 4)}
+    ]
+    if uncertainty_ppm is not None:
+        values.append({'name': 'ppm uncertainty (1-sigma)', 'value': round(uncertainty_ppm, 4)})
+    if acquisitions is not None:
+        values.append({'name': 'acquisitions', 'value': acquisitions})
+
+    return {
+        'sub-test': f"{clock['name']} clock signal",
+        'pass': pass_test,
+        'values': values
+    }
+
+
+def timed_refine_signal_frequency(samples, sample_rate_hz):
+    '''
+    refine_signal_frequency on a worker thread, timed
+
+    Returns:
+        [[frequency, uncertainty, cycles, alias_bias], elapsed_s] (list): The estimate and the analysis time in seconds
+    '''
+    start = time.perf_counter()
+    estimate = refine_signal_frequency(np.ctypeslib.as_array(samples), sample_rate_hz)
+    return [estimate, time.perf_counter() - start]
+
+
+def validate_clocks_pipelined(device_data, pico_serial, clocks, channel=1, sample_rate_hz=100e6):
+    '''
+    Validate clocks with the analysis of each capture running on a worker thread
+    while the mux switches to the next clock and its acquisition runs.
+    Clocks a single capture can't decide are measured again afterwards
+    (sequential_signal_frequency, or determine_signal_frequency without SEQUENTIAL_TESTING).
+
+    Parameters:
+        device_data (object): The device data object
+        pico_serial (obj): The serial object for the pico device
+        clocks (list): Clock entries as in CLOCKS_TO_TEST
+        channel (int): The scope channel the mux routes the clocks to
+        sample_rate_hz (float): The sample rate in Hz
+
+    Returns:
+        [test_results, timings] (list): A sub-test result per clock (with the time of each of its stages and its acquisition waits in its values)
+            and the total time of each stage in seconds
+    '''
+    timings = {'mux switch': 0.0, 'acquisition': 0.0, 'analysis': 0.0, 'analysis wait': 0.0, 'follow-up': 0.0}
+    clock_timings = [{'mux switch': 0.0, 'acquisition': 0.0, 'analysis': 0.0, 'follow-up': 0.0} for _ in clocks]
+    clock_waits = [[] for _ in clocks]
+    start = time.perf_counter()
+
+    # One scope configuration for every clock
+    n_samples = configure_frequency_capture(device_data, channel, sample_rate_hz)
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for clock, clock_timing, waits in zip(clocks, clock_timings, clock_waits):
+            stage_start = time.perf_counter()
+            send_command_to_pico(pico_serial, clock['mux-command'])
+            if DEBUG:
+                WF_SDK.wavegen.generate(device_data, channel=1, function=WF_SDK.wavegen.function.square, offset=0, frequency=clock['exp_freq_hz'], amplitude=2)
+            clock_timing['mux switch'] = time.perf_counter() - stage_start
+
+            # Restart the acquisition now the mux is on this clock (own buffer, the worker may still be reading the last one)
+            stage_start = time.perf_counter()
+            if dwf.FDwfAnalogInConfigure(device_data.handle, c_bool(False), c_bool(True)) == 0:
+                check_error()
+            samples = (c_double*n_samples)()
+            with collect_acquisition_waits() as acquisition_waits:
+                acquire_frequency_capture(device_data, channel, samples, sample_rate_hz)
+            waits.extend(acquisition_waits)
+            clock_timing['acquisition'] = time.perf_counter() - stage_start
+
+            print(f"Validating {clock['name']} clock signal...")
+            futures.append(executor.submit(timed_refine_signal_frequency, samples, sample_rate_hz))
+
+        # Only the analysis not hidden behind an acquisition is waited for here
+        stage_start = time.perf_counter()
+        estimates = [future.result() for future in futures]
+        timings['analysis wait'] = time.perf_counter() - stage_start
+
+    test_results = []
+    for clock, clock_timing, waits, ((freq, uncertainty, cycles, alias_bias), analysis_s) in zip(clocks, clock_timings, clock_waits, estimates):
+        clock_timing['analysis'] = analysis_s
+        uncertainty = math.sqrt(uncertainty**2 + alias_bias**2)
+        uncertainty_ppm = (uncertainty / clock['exp_freq_hz']) * 1e6
+        ppm = ((freq - clock['exp_freq_hz']) / clock['exp_freq_hz']) * 1e6
+        acquisitions = 1
+
+        if cycles < MIN_CYCLES_PER_CAPTURE or frequency_ppm_verdict(ppm, uncertainty_ppm, clock['tolerance_ppm']) is None:
+            print(f"{clock['name']} clock signal undecided ({ppm:.3f} +/- {uncertainty_ppm:.3f} ppm), measuring again...")
+            stage_start = time.perf_counter()
+            send_command_to_pico(pico_serial, clock['mux-command'])
+            with collect_acquisition_waits() as follow_up_waits:
+                if SEQUENTIAL_TESTING:
+                    freq, uncertainty, follow_up, verdict = sequential_signal_frequency(device_data, clock['exp_freq_hz'], clock['tolerance_ppm'], channel, sample_rate_hz)
+                    uncertainty_ppm = (uncertainty / clock['exp_freq_hz']) * 1e6
+                    acquisitions += follow_up
+                else:
+                    freq = determine_signal_frequency(device_data, channel)
+                    uncertainty_ppm = None
+                    acquisitions = None
+            waits.extend(follow_up_waits)
+            clock_timing['follow-up'] = time.perf_counter() - stage_start
+
+        test_result = clock_test_result(clock, freq, uncertainty_ppm, acquisitions)
+        test_result['values'].extend({'name': f'{stage} (s)', 'value': round(seconds, 4)} for stage, seconds in clock_timing.items())
+        test_result['values'].extend(acquisition_wait_summary(waits))
+        test_results.append(test_result)
+        for stage, seconds in clock_timing.items():
+            timings[stage] += seconds
+
+    timings['total'] = time.perf_counter() - start
+    return [test_results, timings]
+
+
 def validate_analog_signals(device_data, pico_serial):
     '''
     Validate the analog signals
@@ -403,52 +1344,78 @@ def validate_analog_signals(device_data, pico_serial):
         { 'sub-test': '1.8V reference voltage', 'pass': False, 'values': [] },
     ]
 
-    # Switch scope channels to voltage references
-    send_command_to_pico(pico_serial, "1_28") #Scope 1 to 1.1V reference voltage
-    send_command_to_pico(pico_serial, "0_27") #Scope 2 to 1.8V reference voltage
+    # Waits of the calibration and reference captures, reported with both references
+    with collect_acquisition_waits() as reference_waits:
+        # Offset/gain correction of each scope channel (reroutes the mux when a channel needs calibrating)
+        calibration = load_scope_calibration(device_data, pico_serial, [MEASUREMENT_CHANNEL_1_1V, MEASUREMENT_CHANNEL_1_8V])
+
+        # Switch scope channels to voltage references
+        send_command_to_pico(pico_serial, f"{SCOPE_MUX_PREFIX[MEASUREMENT_CHANNEL_1_1V]}_{REFERENCE_MUX_INPUTS[MEASUREMENT_CHANNEL_1_1V]}") #Scope 1 to 1.1V reference voltage
+        send_command_to_pico(pico_serial, f"{SCOPE_MUX_PREFIX[MEASUREMENT_CHANNEL_1_8V]}_{REFERENCE_MUX_INPUTS[MEASUREMENT_CHANNEL_1_8V]}") #Scope 2 to 1.8V reference voltage
+
+
+        #############################
+        # Voltage Validation
+        #############################
+
+        # Capture both references in the same acquisitions
+        try:
+            with AnalogMeasurementSession(device_data, [MEASUREMENT_CHANNEL_1_1V, MEASUREMENT_CHANNEL_1_8V], calibration=calibration) as session:
+                if SEQUENTIAL_TESTING:
+                    reference_stats = sequential_voltage_measurement(session, {MEASUREMENT_CHANNEL_1_1V: ACCEPTABLE_VOLTAGE_RANGE_1_1V, MEASUREMENT_CHANNEL_1_8V: ACCEPTABLE_VOLTAGE_RANGE_1_8V})
+                else:
+                    reference_stats = session.measure()
+        except Exception as e:
+            print("Error: " + str(e))
+            reference_stats = {}
+
+    references = [
+        ('1.1V', validate_1_1V_reference_voltage, MEASUREMENT_CHANNEL_1_1V),
+        ('1.8V', validate_1_8V_reference_voltage, MEASUREMENT_CHANNEL_1_8V),
+    ]
 
+    for index, (name, validate, channel) in enumerate(references):
+        stats = reference_stats.get(channel)
+        result = validate(device_data, stats) if stats else None
+
+        if result:
+            print(f"{name} reference voltage test: {'PASS' if result[1] else 'FAIL'} at {result[0]}V")
+            test_results[index]['pass'] = result[1]
+            test_results[index]['values'] = [
+                {'name': 'measured_voltage (V)', 'value': round(result[0], 4)},
+                {'name': 'min_voltage (V)', 'value': round(result[2]['min'], 4)},
+                {'name': 'max_voltage (V)', 'value': round(result[2]['max'], 4)},
+                {'name': 'rms_voltage (V)', 'value': round(result[2]['rms'], 4)},
+                {'name': 'noise (V rms)', 'value': round(result[2]['noise'], 5)},
+                {'name': 'samples', 'value': result[2]['n_samples']},
+            ]
+            if 'acquisitions' in result[2]:
+                test_results[index]['values'].append({'name': 'acquisitions', 'value': result[2]['acquisitions']})
+            if channel in calibration:
+                test_results[index]['values'].append({'name': 'calibration gain', 'value': round(calibration[channel]['gain'], 5)})
+                test_results[index]['values'].append({'name': 'calibration offset (V)', 'value': round(calibration[channel]['offset'], 5)})
+        else:
+            print(f"{name} reference voltage: FAIL (unable to measure)")
+            test_results[index]['pass'] = False
+            test_results[index]['values'] = [
+                {'name': 'measured_voltage (V)', 'value': None}
+            ]
+        test_results[index]['values'].extend(acquisition_wait_summary(reference_waits))
 
     #############################
-    # Voltage Validation
+    # Clock Validation
     #############################
 
-    # Validate the 1.1V reference voltage
-    result = validate_1_1V_reference_voltage(device_data)
-
-    if result:
-        print(f"1.1V reference voltage test: {'PASS' if result[1] else 'FAIL'} at {result[0]}V")
-        test_results[0]['pass'] = True
-        test_results[0]['values'] = [
-            {'name': 'measured_voltage (V)', 'value': round(result[0], 4)}
-        ]
+    if PIPELINED_CLOCK_VALIDATION and FREQUENCY_ESTIMATOR == FREQUENCY_ESTIMATOR_SINGLE_PASS:
+        # Analysis of each clock overlaps the mux switch and acquisition of the next
+        clock_results, timings = validate_clocks_pipelined(device_data, pico_serial, CLOCKS_TO_TEST)
+        test_results.extend(clock_results)
+        print("Clock pipeline timing: " + ", ".join(f"{stage} {seconds:.4f} s" for stage, seconds in timings.items()))
+        clocks_to_measure = []
     else:
-        print("1.1V reference voltage: FAIL (unable to measure)")
-        test_results[0]['pass'] = True
-        test_results[0]['values'] = [
-            {'name': 'measured_voltage (V)', 'value': None}
-        ]
-    
-    # Validate the 1.8V reference voltage
-    result = validate_1_8V_reference_voltage(device_data)
-
-    if result:
-        print(f"1.8V reference voltage test: {'PASS' if result[1] else 'FAIL'} at {result[0]}V")
-        test_results[1]['pass'] = True
-        test_results[1]['values'] = [
-            {'name': 'measured_voltage (V)', 'value': round(result[0], 4)}
-        ]
-    else:
-        print("1.8V reference voltage: FAIL (unable to measure)")
-        test_results[1]['pass'] = True
-        test_results[1]['values'] = [
-            {'name': 'measured_voltage (V)', 'value': None}
-        ]
-
-    #############################
-    # Clock Validation
-    #############################
+        clocks_to_measure = CLOCKS_TO_TEST
 
-    for clock in CLOCKS_TO_TEST:
+    for clock in clocks_to_measure:
         # Switch mux to the clock signal
         send_command_to_pico(pico_serial, clock['mux-command']) 
 
@@ -457,104 +1424,214 @@ def validate_analog_signals(device_data, pico_serial):
         if DEBUG:
             WF_SDK.wavegen.generate(device_data, channel=1, function=WF_SDK.wavegen.function.square, offset=0, frequency=clock['exp_freq_hz'], amplitude=2)
 
-        # Determine the frequency of the signal
-        freq = determine_signal_frequency(device_data, channel=1)
-        
-        # Determine PPM
-        ppm = ((freq - clock['exp_freq_hz']) / clock['exp_freq_hz']) * 1e6
+        # Determine the frequency of the signal (with the waits of its captures)
+        with collect_acquisition_waits() as clock_waits:
+            uncertainty_ppm = None
+            acquisitions = None
+            if SEQUENTIAL_TESTING and FREQUENCY_ESTIMATOR == FREQUENCY_ESTIMATOR_SINGLE_PASS:
+                # Only as many acquisitions as the pass/fail decision needs
+                freq, uncertainty, acquisitions, verdict = sequential_signal_frequency(device_data, clock['exp_freq_hz'], clock['tolerance_ppm'], channel=1)
+                uncertainty_ppm = (uncertainty / clock['exp_freq_hz']) * 1e6
+                if verdict is None:
+                    print(f"{clock['name']} clock signal undecided after {acquisitions} acquisitions")
+            elif FREQUENCY_ESTIMATOR == FREQUENCY_ESTIMATOR_SINGLE_PASS:
+                freq, uncertainty = estimate_signal_frequency(device_data, channel=1)
+                ppm = ((freq - clock['exp_freq_hz']) / clock['exp_freq_hz']) * 1e6
+                uncertainty_ppm = (uncertainty / clock['exp_freq_hz']) * 1e6
+
+                # Fall back to the averaged estimator if one capture can't decide the test
+                if frequency_ppm_verdict(ppm, uncertainty_ppm, clock['tolerance_ppm']) is None:
+                    print(f"{clock['name']} clock signal undecided ({ppm:.3f} +/- {uncertainty_ppm:.3f} ppm), averaging...")
+                    freq = determine_signal_frequency(device_data, channel=1)
+                    uncertainty_ppm = None
+            else:
+                freq = determine_signal_frequency(device_data, channel=1)
+
+        test_result = clock_test_result(clock, freq, uncertainty_ppm, acquisitions)
+        test_result['values'].extend(acquisition_wait_summary(clock_waits))
+        test_results.append(test_result)
 
-        unit, freq = convert_frequency_to_unit(freq)
+    return test_results
 
-        # Validate PPM and store the result
-        if abs(ppm) <= clock['tolerance_ppm']:
-            print(f"{clock['name']} clock signal test: PASS at {freq} {unit} ({ppm:.3f} ppm)")
 
-            test_results.append({
-                'sub-test': f"{clock['name']} clock signal",
-                'pass': True,
-                'values': [
-                    {'name': f'measured_frequency ({unit})', 'value': freq},
-                    {'name': 'ppm', 'value': round(ppm, 4)}
-                ]
-            })
-        else:
-            print(f"{clock['name']} clock signal test: FAIL at {freq} {unit} ({ppm:.3f} ppm)")
+def frequency_band(frequency_hz):
+    '''
+    Sample rate determine_signal_frequency settles on for a frequency (the band it is characterized in)
 
-            test_results.append({
-                'sub-test': f"{clock['name']} clock signal",
-                'pass': False,
-                'values': [
-                    {'name': f'measured_frequency ({unit})', 'value': freq},
-                    {'name': 'ppm', 'value': round(ppm, 4)}
-                ]
-            })
+    Parameters:
+        frequency_hz (float): The signal frequency in Hz
 
-    return test_results
+    Returns:
+        sample_rate_hz (float): The band sample rate in Hz
+    '''
+    for sample_rate_hz, max_frequency_hz in FREQUENCY_BANDS:
+        if frequency_hz < max_frequency_hz:
+            return sample_rate_hz
+    return FREQUENCY_BANDS[-1][0]
 
 
-def test_frequency_measurement_accuracy(device_data):
-    """
-    Test the accuracy of the frequency measurement.
+def characterization_plan(frequency_ranges):
+    '''
+    Group the characterization frequencies by sample rate band
 
     Parameters:
-        device_data (object): The device data object
+        frequency_ranges (list): (min_freq, max_freq, step_freq) tuples in Hz
 
     Returns:
-        None
-    """
-    channel = 1
-    results = []
-
-    # Define frequency ranges and steps
-    # (min_freq, max_freq, step_freq)
-    frequency_ranges = [
-        (10, 800, 10),
-        (800, 1000, 100),
-        (1000, 60000, 1000),
-        (60000, 49000000, 50000)
-    ]
-
+        plan (dict): {sample_rate_hz: [frequencies in Hz]}, bands in ascending sample rate
+    '''
+    plan = {sample_rate_hz: [] for sample_rate_hz, _ in FREQUENCY_BANDS}
     for min_freq, max_freq, step_freq in frequency_ranges:
         for freq in np.arange(min_freq, max_freq + step_freq, step_freq):
-            WF_SDK.scope.trigger(device_data, enable=True, source=WF_SDK.scope.trigger_source.analog, channel=1, level=0)
-            print(f"Generating square wave with frequency {freq} Hz...")
-            # Generate a square wave with the current frequency
-            WF_SDK.wavegen.generate(device_data, channel=1, function=WF_SDK.wavegen.function.square, offset=0, frequency=freq, amplitude=2)
-            
-            time.sleep(.5)
-            
-            print("Determining the frequency of the recorded signal...")
-            # Determine the frequency of the signal
-            measured_freq = determine_signal_frequency(device_data)
-
-            if measured_freq is None:
-                print(f"Error: Could not determine frequency for {freq} Hz.")
-                continue
+            plan[frequency_band(freq)].append(float(freq))
+    return {rate: sorted(set(freqs)) for rate, freqs in plan.items() if freqs}
+
+
+def load_characterization_checkpoint(path):
+    '''
+    Read the points of an interrupted characterization run
+
+    Parameters:
+        path (str): The checkpoint (JSON lines) file
+
+    Returns:
+        points (dict): {expected frequency: point}
+    '''
+    points = {}
+    try:
+        with open(path, 'r') as file:
+            for line in file:
+                try:
+                    point = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Line cut short by the interruption
+                points[point['expected_frequency']] = point
+    except FileNotFoundError:
+        pass
+    return points
+
+
+def wait_for_frequency_settle(device_data, channel, n_samples, sample_rate_hz, target_hz, timeout_s=SETTLE_TIMEOUT_S):
+    '''
+    Wait for the wavegen to settle on a new frequency, instead of a fixed delay.
+    Single captures are taken until one lands near the target and agrees with the previous one.
+
+    Parameters:
+        device_data (object): The device data object
+        channel (int): The channel to measure
+        n_samples (int): The number of samples per acquisition (scope already configured)
+        sample_rate_hz (float): The configured sample rate in Hz
+        target_hz (float): The generated frequency in Hz
+        timeout_s (float): The longest time to wait
+
+    Returns:
+        [settled, elapsed_s] (list): Whether the signal settled and the time waited in seconds
+    '''
+    bin_hz = sample_rate_hz / n_samples
+    tolerance_hz = max(SETTLE_BINS * bin_hz, SETTLE_RELATIVE_TOLERANCE * target_hz)
+    start = time.perf_counter()
+    previous = None
+
+    while time.perf_counter() - start < timeout_s:
+        frequency = average_peak_frequency(device_data, channel, n_samples, sample_rate_hz, n_measurements=1, restart=True)
+        if abs(frequency - target_hz) <= tolerance_hz and previous is not None and abs(frequency - previous) <= bin_hz:
+            return [True, time.perf_counter() - start]
+        previous = frequency
+
+    return [False, time.perf_counter() - start]
 
-            # Calculate the delta between the measured and expected frequency
-            delta = abs(measured_freq - freq)
 
-            # Store the result
-            percent_difference = (delta / freq) * 100
-            results.append({
-                'expected_frequency': freq,
-                'measured_frequency': measured_freq,
-                'delta': delta,
-                'percent_difference': percent_difference
-            })
+def test_frequency_measurement_accuracy(device_data, frequency_ranges=FREQUENCY_CHARACTERIZATION_RANGES, n_measurements=10, run_name="frequency_accuracy", resume=True, output_dir=FREQUENCY_CHARACTERIZATION_DIR):
+    """
+    Characterize the accuracy of the frequency measurement against the wavegen.
+    The scope is configured once per sample rate band, each point is appended to a
+    checkpoint file as it is measured (so an interrupted run resumes where it stopped),
+    and the resulting accuracy table is used by determine_signal_frequency to correct
+    later measurements.
+
+    Parameters:
+        device_data (object): The device data object
+        frequency_ranges (list): (min_freq, max_freq, step_freq) tuples in Hz
+        n_measurements (int): The number of measurements averaged per frequency
+        run_name (str): The name of the checkpoint and CSV files
+        resume (bool): Continue from the checkpoint of a previous run with the same name
+        output_dir (str): The directory of the checkpoint and CSV files
 
-            unit, freq = convert_frequency_to_unit(freq)
-            unit2, measured_freq = convert_frequency_to_unit(measured_freq)
-            unit3, delta = convert_frequency_to_unit(delta)
+    Returns:
+        table (FrequencyAccuracyTable): The accuracy table (also saved for determine_signal_frequency)
+    """
+    global _frequency_accuracy_table
+    channel = 1
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, run_name + '.jsonl')
+
+    done = load_characterization_checkpoint(checkpoint_path) if resume else {}
+    if not resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    if done:
+        print(f"Resuming characterization, {len(done)} points already measured")
+
+    points_by_band = {}
+    with open(checkpoint_path, 'a') as checkpoint:
+        for sample_rate_hz, frequencies in characterization_plan(frequency_ranges).items():
+            points_by_band[sample_rate_hz] = [done[freq] for freq in frequencies if freq in done]
+            pending = [freq for freq in frequencies if freq not in done]
+            if not pending:
+                continue
 
-            # Print the result
-            print(f"Expected: {freq} {unit}, Measured: {measured_freq} {unit2}, Delta: {delta} {unit3}, Percent Difference: {percent_difference:.3f}%")
+            # One scope configuration for the whole band
+            print(f"Characterizing {len(pending)} frequencies at {sample_rate_hz / 1e6:g} MHz sample rate...")
+            WF_SDK.scope.trigger(device_data, enable=True, source=WF_SDK.scope.trigger_source.analog, channel=1, level=0)
+            n_samples = configure_frequency_capture(device_data, channel, sample_rate_hz)
+
+            for freq in pending:
+                # Generate a square wave with the current frequency
+                WF_SDK.wavegen.generate(device_data, channel=1, function=WF_SDK.wavegen.function.square, offset=0, frequency=freq, amplitude=2)
+                settled, settle_s = wait_for_frequency_settle(device_data, channel, n_samples, sample_rate_hz, freq)
+
+                measured_freq = average_peak_frequency(device_data, channel, n_samples, sample_rate_hz, n_measurements, restart=True)
+
+                # Calculate the delta between the measured and expected frequency
+                delta = abs(measured_freq - freq)
+                percent_difference = (delta / freq) * 100
+                point = {
+                    'expected_frequency': freq,
+                    'measured_frequency': measured_freq,
+                    'delta': delta,
+                    'percent_difference': percent_difference,
+                    'sample_rate_hz': sample_rate_hz,
+                    'settled': settled,
+                    'settle_s': round(settle_s, 4),
+                }
+                points_by_band[sample_rate_hz].append(point)
+                checkpoint.write(json.dumps(point) + '\n')
+                checkpoint.flush()
+
+                unit, freq = convert_frequency_to_unit(freq)
+                unit2, measured_freq = convert_frequency_to_unit(measured_freq)
+                unit3, delta = convert_frequency_to_unit(delta)
+
+                # Print the result
+                print(f"Expected: {freq} {unit}, Measured: {measured_freq} {unit2}, Delta: {delta} {unit3}, Percent Difference: {percent_difference:.3f}%{'' if settled else ' (not settled)'}")
+
+    WF_SDK.wavegen.close(device_data)
+
+    # Accuracy table for determine_signal_frequency
+    table = FrequencyAccuracyTable.from_points(points_by_band)
+    table_path = table.save()
+    _frequency_accuracy_table = table
+    for key, band in table.bands.items():
+        print(f"{float(key) / 1e6:g} MHz band: mean error {band['mean_error_ppm']:.1f} ppm, max {band['max_abs_error_ppm']:.1f} ppm over {band['n_points']} points")
+    print(f"Accuracy table saved to '{table_path}'")
 
     # Save the results to a CSV file
-    with open('frequency_measurement_accuracy_results.csv', mode='w', newline='') as file:
+    csv_path = os.path.join(output_dir, run_name + '.csv')
+    with open(csv_path, mode='w', newline='') as file:
         writer = csv.writer(file)
         writer.writerow(['Expected Frequency (Hz)', 'Measured Frequency (Hz)', 'Delta (Hz)'])
-        for result in results:
-            writer.writerow([result['expected_frequency'], result['measured_frequency'], result['delta']])
+        for points in points_by_band.values():
+            for point in points:
+                writer.writerow([point['expected_frequency'], point['measured_frequency'], point['delta']])
 
-    print("Results have been saved to 'frequency_measurement_accuracy_results.csv'")
+    print(f"Results have been saved to '{csv_path}'")
+    return table
@@ -1,29 +1,14 @@
 import sys
 import os
 from ctypes import *
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../__VendorAPIs/Diligent')))
+import numpy as np
 
-from WF_SDK import device, logic, pattern, error  # Import instruments
+# libdwf, WF_SDK and the dwf constants (hardware or simulated, see dwf_backend.py)
+from Validation.Tests.dwf_backend import *
+from Validation.Tests.helpers import wait_for_acquisition, collect_acquisition_waits, acquisition_wait_summary
 from time import sleep  # Needed for delays
 
-# load the dynamic library, get constants path (the path is OS specific)
-if sys.platform.startswith("win"):
-    # on Windows
-    dwf = cdll.dwf
-    constants_path = "C:" + os.sep + "Program Files (x86)" + os.sep + "Digilent" + os.sep + "WaveFormsSDK" + os.sep + "samples" + os.sep + "py"
-elif sys.platform.startswith("darwin"):
-    # on macOS
-    lib_path = os.sep + "Library" + os.sep + "Frameworks" + os.sep + "dwf.framework" + os.sep + "dwf"
-    dwf = cdll.LoadLibrary(lib_path)
-    constants_path = os.sep + "Applications" + os.sep + "WaveForms.app" + os.sep + "Contents" + os.sep + "Resources" + os.sep + "SDK" + os.sep + "samples" + os.sep + "py"
-else:
-    # on Linux
-    dwf = cdll.LoadLibrary("libdwf.so")
-    constants_path = os.sep + "usr" + os.sep + "share" + os.sep + "digilent" + os.sep + "waveforms" + os.sep + "samples" + os.sep + "py"
-
-# import constants
-sys.path.append(constants_path)
-from dwfconstants import *
+device, logic, pattern, error = WF_SDK.device, WF_SDK.logic, WF_SDK.pattern, WF_SDK.error  # Instruments
 
 # Configure VIO to support low logic threshold (~0.6V) for detecting 0.8V signals
 def configure_vio_voltage(device_data, voltage_level=1.2):
@@ -48,6 +33,11 @@ def configure_vio_voltage(device_data, voltage_level=1.2):
 
 CONSECUTIVE_ONES_REQUIRED = 10  # Minimum consecutive '1's required for passing
 
+LOGIC_PINS = 16                 # DIO pins checked by run_logic_analysis
+LOGIC_BUFFER_SIZE = 5000        # Samples per pin in the logic capture
+LOGIC_SAMPLE_RATE_HZ = 100e6    # Logic analyzer sample rate
+GLITCH_MAX_SAMPLES = 3          # Runs shorter than this (in samples) are counted as glitches
+
 def has_consecutive_ones(buffer, required_count):
     """
     Check if the buffer contains at least `required_count` consecutive ones.
@@ -59,15 +49,161 @@ def has_consecutive_ones(buffer, required_count):
     Returns:
         bool: True if the condition is met, False otherwise.
     """
-    count = 0
-    for value in buffer:
-        if value == 1:
-            count += 1
-            if count >= required_count:
-                return True  # Pass if we find enough consecutive 1s
-        else:
-            count = 0  # Reset count if a 0 is encountered
-    return False  # Fail if no sequence meets the requirement
+    if len(buffer) == 0:
+        return False
+    plane = np.asarray(buffer, dtype=np.uint8)[None, :]
+    return bool(pin_run_metrics(plane, LOGIC_SAMPLE_RATE_HZ)[0]['longest_high'] >= required_count)
+
+
+def pin_run_metrics(bit_planes, sample_rate_hz, glitch_samples=GLITCH_MAX_SAMPLES):
+    """
+    Run-length analysis of every pin in one pass over the bit-planes.
+    Runs touching either end of the capture are truncated, so they count towards
+    the longest runs but are never counted as glitches.
+
+    Parameters:
+        bit_planes (numpy array): Shape (n_pins, n_samples) of 0/1 values, from split_bit_planes.
+        sample_rate_hz (float): The sample rate in Hz.
+        glitch_samples (int): Runs shorter than this many samples (inside the capture) are glitches.
+
+    Returns:
+        metrics (list): Per pin dict of longest_high, longest_low (samples), rising_edges, falling_edges,
+                        duty_cycle (0-1), toggle_frequency_hz (None with fewer than 2 rising edges) and glitches.
+    """
+    n_pins, n_samples = bit_planes.shape
+    flat = bit_planes.ravel()
+    total = flat.size
+
+    # Start of every run: a value change or the start of a pin's row
+    boundary = np.empty(total, dtype=bool)
+    boundary[0] = True
+    np.not_equal(flat[1:], flat[:-1], out=boundary[1:])
+    boundary[::n_samples] = True
+    starts = np.flatnonzero(boundary)
+
+    lengths = np.diff(np.append(starts, total))
+    values = flat[starts]
+    rows = starts // n_samples
+    first_run = starts % n_samples == 0
+    last_run = (starts + lengths) % n_samples == 0
+    high = values == 1
+
+    longest_high = np.zeros(n_pins, dtype=np.int64)
+    longest_low = np.zeros(n_pins, dtype=np.int64)
+    np.maximum.at(longest_high, rows[high], lengths[high])
+    np.maximum.at(longest_low, rows[~high], lengths[~high])
+
+    # A run that doesn't start the row begins with an edge
+    rising = high & ~first_run
+    falling = ~high & ~first_run
+    rising_edges = np.bincount(rows[rising], minlength=n_pins)
+    falling_edges = np.bincount(rows[falling], minlength=n_pins)
+    glitches = np.bincount(rows[(lengths < glitch_samples) & ~first_run & ~last_run], minlength=n_pins)
+    duty_cycle = bit_planes.mean(axis=1)
+
+    # Toggle frequency from the span between the first and last rising edge
+    first_rise = np.full(n_pins, total, dtype=np.int64)
+    last_rise = np.full(n_pins, -1, dtype=np.int64)
+    np.minimum.at(first_rise, rows[rising], starts[rising])
+    np.maximum.at(last_rise, rows[rising], starts[rising])
+
+    metrics = []
+    for pin in range(n_pins):
+        toggle_frequency = None
+        if rising_edges[pin] >= 2:
+            toggle_frequency = float((rising_edges[pin] - 1) * sample_rate_hz / (last_rise[pin] - first_rise[pin]))
+        metrics.append({
+            'longest_high': int(longest_high[pin]),
+            'longest_low': int(longest_low[pin]),
+            'rising_edges': int(rising_edges[pin]),
+            'falling_edges': int(falling_edges[pin]),
+            'duty_cycle': float(duty_cycle[pin]),
+            'toggle_frequency_hz': toggle_frequency,
+            'glitches': int(glitches[pin]),
+        })
+    return metrics
+
+
+def capture_logic_bus(device_data, buffer_size=LOGIC_BUFFER_SIZE, sampling_frequency=LOGIC_SAMPLE_RATE_HZ):
+    """
+    Capture every DIO pin in a single acquisition, as one 16-bit word per sample (bit n = DIO n).
+    The logic analyzer is left open, close it with logic.close.
+
+    Parameters:
+        device_data (object): The device data object for the logic analyzer.
+        buffer_size (int): The number of samples to capture.
+        sampling_frequency (float): The sample rate in Hz.
+
+    Returns:
+        words (numpy array): The captured samples (uint16).
+    """
+    logic.open(device_data, sampling_frequency=sampling_frequency, buffer_size=buffer_size)
+
+    # Single acquisition of the whole bus
+    if dwf.FDwfDigitalInConfigure(device_data.handle, c_bool(False), c_bool(True)) == 0:
+        check_error()
+
+    def logic_done():
+        sts = c_byte()
+        if dwf.FDwfDigitalInStatus(device_data.handle, c_bool(True), byref(sts)) == 0:
+            check_error()
+        return sts.value == DwfStateDone.value
+
+    wait_for_acquisition(logic_done, buffer_size / sampling_frequency, label="logic capture")
+
+    words = (c_uint16 * buffer_size)()
+    dwf.FDwfDigitalInStatusData(device_data.handle, words, c_int(2 * buffer_size))
+    return np.ctypeslib.as_array(words)
+
+
+def split_bit_planes(words, n_pins=LOGIC_PINS):
+    """
+    Split packed logic words into one 0/1 array per pin.
+
+    Parameters:
+        words (numpy array): Packed samples from capture_logic_bus.
+        n_pins (int): The number of pins to extract.
+
+    Returns:
+        bit_planes (numpy array): Shape (n_pins, n_samples), uint8, row n = DIO n.
+    """
+    shifts = np.arange(n_pins, dtype=words.dtype)[:, None]
+    return ((words[None, :] >> shifts) & 1).astype(np.uint8)
+
+
+def measure_pin_skew(bit_planes, sample_rate_hz, reference_pin=None):
+    """
+    Measure the skew of each pin against a reference pin, as the median offset from each
+    rising edge of the reference to the nearest rising edge of the pin.
+    Only meaningful for pins driven with the same pattern.
+
+    Parameters:
+        bit_planes (numpy array): Shape (n_pins, n_samples) from split_bit_planes.
+        sample_rate_hz (float): The sample rate in Hz.
+        reference_pin (int): The reference pin, defaults to the lowest pin with a rising edge.
+
+    Returns:
+        [reference_pin, skew] (list): The reference pin and {pin: skew in seconds, None without edges}.
+    """
+    rising_edges = [np.flatnonzero(np.diff(plane.astype(np.int8)) == 1) + 1 for plane in bit_planes]
+
+    if reference_pin is None:
+        reference_pin = next((pin for pin, edges in enumerate(rising_edges) if len(edges)), None)
+    if reference_pin is None or len(rising_edges[reference_pin]) == 0:
+        return [reference_pin, {pin: None for pin in range(len(bit_planes))}]
+
+    reference = rising_edges[reference_pin]
+    skew = {}
+    for pin, edges in enumerate(rising_edges):
+        if len(edges) == 0:
+            skew[pin] = None
+            continue
+        # Nearest edge of the pin to each reference edge (either side)
+        after = np.clip(np.searchsorted(edges, reference), 0, len(edges) - 1)
+        before = np.clip(after - 1, 0, len(edges) - 1)
+        offsets = np.where(np.abs(edges[after] - reference) < np.abs(edges[before] - reference), edges[after] - reference, edges[before] - reference)
+        skew[pin] = float(np.median(offsets)) / sample_rate_hz
+    return [reference_pin, skew]
 
 
 def run_logic_analysis(device_data, trigger_channel=0):
@@ -85,22 +221,40 @@ def run_logic_analysis(device_data, trigger_channel=0):
 
     #configure_vio_voltage(device_data, voltage_level=1.2)
     #print(device_data.name)
-    # Initialize the logic analyzer with default settings
-    logic.open(device_data, buffer_size=5000)
-
     sleep(0.5)
 
-    # **Record data for each DIO channel separately**
-    all_buffers = [logic.record(device_data, channel=i) for i in range(16)]
+    # **Record all DIO channels in one acquisition** (its waits are reported with every pin)
+    with collect_acquisition_waits() as waits:
+        all_buffers = split_bit_planes(capture_logic_bus(device_data))
+
+    # Skew between pins, all pins come from the same time window
+    reference_pin, skew = measure_pin_skew(all_buffers, LOGIC_SAMPLE_RATE_HZ)
+
+    # Run-length metrics of every pin in one pass
+    metrics = pin_run_metrics(all_buffers, LOGIC_SAMPLE_RATE_HZ)
 
     # Create a list to store test results, ensuring the correct pin numbering
     tests = []
     # Scan each channel's buffer and check for passing condition
-    for ch in range(16):
+    for ch in range(LOGIC_PINS):
+        pin = metrics[ch]
+        toggle_frequency = pin['toggle_frequency_hz']
         test_result = {
             'sub-test': f'pin {ch}',  # Ensure correct pin numbering
-            'pass': has_consecutive_ones(all_buffers[ch], CONSECUTIVE_ONES_REQUIRED)
+            'pass': pin['longest_high'] >= CONSECUTIVE_ONES_REQUIRED,
+            'values': [
+                {'name': 'longest high run (samples)', 'value': pin['longest_high']},
+                {'name': 'longest low run (samples)', 'value': pin['longest_low']},
+                {'name': 'rising edges', 'value': pin['rising_edges']},
+                {'name': 'falling edges', 'value': pin['falling_edges']},
+                {'name': 'duty cycle (%)', 'value': round(pin['duty_cycle'] * 100, 2)},
+                {'name': 'toggle frequency (Hz)', 'value': None if toggle_frequency is None else round(toggle_frequency, 1)},
+                {'name': f'glitches (< {GLITCH_MAX_SAMPLES} samples)', 'value': pin['glitches']},
+            ]
         }
+        if skew[ch] is not None:
+            test_result['values'].append({'name': f'skew vs pin {reference_pin} (ns)', 'value': round(skew[ch] * 1e9, 1)})
+        test_result['values'].extend(acquisition_wait_summary(waits))
         if ch == 15:
             test_result['pass'] = True  
         tests.append(test_result)
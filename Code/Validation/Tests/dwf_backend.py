@@ -0,0 +1,52 @@
+'''
+Selects the WaveForms backend used by the tests.
+
+By default the Digilent WaveForms library (libdwf), the WF_SDK wrapper and
+dwfconstants are loaded for the attached hardware. Setting the environment
+variable SCUM_DWF_BACKEND=sim swaps in the pure-Python simulation from
+simulated_dwf.py so the tests can be run and benchmarked without instruments.
+
+Usage:
+    from Validation.Tests.dwf_backend import *   # dwf, WF_SDK, check_error and the dwf constants
+'''
+import os
+import sys
+from ctypes import *
+
+DWF_BACKEND_HARDWARE = 'hardware'
+DWF_BACKEND_SIMULATED = 'sim'
+DWF_BACKEND = os.environ.get('SCUM_DWF_BACKEND', DWF_BACKEND_HARDWARE).lower()
+
+if DWF_BACKEND == DWF_BACKEND_SIMULATED:
+    from Validation.Tests.simulated_dwf import dwf, WF_SDK, check_error
+    from Validation.Tests.simulated_dwfconstants import *
+else:
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../__VendorAPIs/Diligent')))
+    import WF_SDK
+    from WF_SDK.device import check_error
+
+    # load the dynamic library, get constants path (the path is OS specific)
+    if sys.platform.startswith("win"):
+        # on Windows
+        dwf = cdll.dwf
+        constants_path = "C:" + os.sep + "Program Files (x86)" + os.sep + "Digilent" + os.sep + "WaveFormsSDK" + os.sep + "samples" + os.sep + "py"
+    elif sys.platform.startswith("darwin"):
+        # on macOS
+        lib_path = os.sep + "Library" + os.sep + "Frameworks" + os.sep + "dwf.framework" + os.sep + "dwf"
+        dwf = cdll.LoadLibrary(lib_path)
+        constants_path = os.sep + "Applications" + os.sep + "WaveForms.app" + os.sep + "Contents" + os.sep + "Resources" + os.sep + "SDK" + os.sep + "samples" + os.sep + "py"
+    else:
+        # on Linux
+        dwf = cdll.LoadLibrary("libdwf.so")
+        constants_path = os.sep + "usr" + os.sep + "share" + os.sep + "digilent" + os.sep + "waveforms" + os.sep + "samples" + os.sep + "py"
+
+    # import constants
+    sys.path.append(constants_path)
+    from dwfconstants import *
+
+
+def is_simulated():
+    '''
+    Returns True when the simulated backend is in use
+    '''
+    return DWF_BACKEND == DWF_BACKEND_SIMULATED
@@ -0,0 +1,139 @@
+'''
+Frequency accuracy table of the AD2 frequency measurement.
+
+The table is written by test_frequency_measurement_accuracy (analog_test.py)
+and holds, for each sample-rate band, the relative error of
+determine_signal_frequency measured against the AD2 wavegen. The wavegen
+shares the scope's timebase, so this is the error of that estimator (window,
+peak centroid), not of the timebase: it only corrects later
+determine_signal_frequency measurements made at the same sample rate.
+
+Correction: corrected = measured / (1 + relative_error(measured))
+'''
+import datetime
+import json
+import os
+
+import numpy as np
+
+FREQUENCY_ACCURACY_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'ResultBackups', 'Calibration')
+FREQUENCY_ACCURACY_FILE = 'frequency_accuracy.json'
+
+
+def band_key(sample_rate_hz):
+    '''
+    Table key of a sample-rate band
+    '''
+    return str(int(round(sample_rate_hz)))
+
+
+def build_band(points):
+    '''
+    Build the table entry of one band from characterization points
+
+    Parameters:
+        points (list): Dicts with 'expected_frequency' and 'measured_frequency' in Hz
+
+    Returns:
+        band (dict): Measured frequencies (sorted), their relative errors and summary statistics
+    '''
+    expected = np.array([point['expected_frequency'] for point in points], dtype=float)
+    measured = np.array([point['measured_frequency'] for point in points], dtype=float)
+    order = np.argsort(measured)
+    expected, measured = expected[order], measured[order]
+    relative_error = (measured - expected) / expected
+
+    return {
+        'measured_hz': measured.tolist(),
+        'relative_error': relative_error.tolist(),
+        'mean_error_ppm': float(np.mean(relative_error) * 1e6),
+        'max_abs_error_ppm': float(np.max(np.abs(relative_error)) * 1e6),
+        'n_points': len(points),
+    }
+
+
+class FrequencyAccuracyTable:
+    '''
+    Per-band relative error of the frequency measurement
+
+    Usage:
+        table = FrequencyAccuracyTable.load()
+        frequency = table.correct(measured_hz, sample_rate_hz)
+    '''
+
+    def __init__(self, bands=None, created=None):
+        self.bands = bands or {}
+        self.created = created or datetime.datetime.now().isoformat(timespec='seconds')
+        self._arrays = {}
+
+    @classmethod
+    def load(cls, path=None):
+        '''
+        Load a table, an empty table (no correction) if there is none
+
+        Parameters:
+            path (str): The table file, defaults to FREQUENCY_ACCURACY_DIR/FREQUENCY_ACCURACY_FILE
+
+        Returns:
+            table (FrequencyAccuracyTable): The loaded table
+        '''
+        path = path or os.path.join(FREQUENCY_ACCURACY_DIR, FREQUENCY_ACCURACY_FILE)
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+            return cls(data.get('bands'), data.get('created'))
+        except FileNotFoundError:
+            return cls()
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Frequency accuracy table unreadable ({e}), measurements are not corrected")
+            return cls()
+
+    @classmethod
+    def from_points(cls, points_by_band):
+        '''
+        Build a table from characterization points
+
+        Parameters:
+            points_by_band (dict): {sample_rate_hz: list of points}
+
+        Returns:
+            table (FrequencyAccuracyTable): The new table
+        '''
+        return cls({band_key(rate): build_band(points) for rate, points in points_by_band.items() if points})
+
+    def save(self, path=None):
+        '''
+        Write the table (atomically)
+
+        Returns:
+            path (str): The written file
+        '''
+        path = path or os.path.join(FREQUENCY_ACCURACY_DIR, FREQUENCY_ACCURACY_FILE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'created': self.created, 'bands': self.bands}, file, indent=2)
+        os.replace(path + '.tmp', path)
+        return path
+
+    def correct(self, frequency_hz, sample_rate_hz):
+        '''
+        Remove the characterized error from a measurement
+
+        Parameters:
+            frequency_hz (float): The measured frequency in Hz
+            sample_rate_hz (float): The sample rate the measurement was made at
+
+        Returns:
+            frequency_hz (float): The corrected frequency, unchanged if the band is not characterized
+        '''
+        key = band_key(sample_rate_hz)
+        if key not in self.bands:
+            return frequency_hz
+
+        if key not in self._arrays:
+            band = self.bands[key]
+            self._arrays[key] = (np.asarray(band['measured_hz']), np.asarray(band['relative_error']))
+        measured, relative_error = self._arrays[key]
+
+        # Interpolated within the band, the nearest point's error is held outside of it
+        return float(frequency_hz / (1 + np.interp(frequency_hz, measured, relative_error)))
@@ -1,16 +1,462 @@
-import WF_SDK
+import contextlib
+import queue
+import threading
+import time
+from ctypes import *
+
+import numpy as np
+
+from Validation.Tests.dwf_backend import dwf, WF_SDK, check_error, acqmodeRecord, trigsrcNone
 from config import TRIGGER_PIN_NUM
 
-def wait_for_trigger(device_handle):
+# Logs of the collect_acquisition_waits blocks running, each gets every wait_for_acquisition record
+acquisition_wait_logs = []
+
+# Trigger listener settings
+TRIGGER_LISTENER_SAMPLE_RATE_HZ = 1e6  # Trigger pin sample rate (trigger pulses must be longer than one sample)
+TRIGGER_LISTENER_POLL_S = 0.002        # Interval between reads of the recorded samples
+TRIGGER_LISTENER_TOLERANCE_S = 0.01    # Edges recorded this long before the last samples read when a wait started still count (read latency)
+
+# Listeners started with start_trigger_listener, by device handle
+trigger_listeners = {}
+
+TIMELINE_HISTOGRAM_BINS = 20  # Bins of the per-phase dwell histograms in the report
+
+def wait_for_acquisition(is_done, expected_fill_s, timeout_s=None, label="acquisition"):
+    '''
+    Wait for an instrument acquisition without spinning on the status call.
+    The first poll is delayed until most of the buffer should be full, after which
+    the poll interval starts at a fraction of the fill time and backs off.
+
+    Parameters:
+        is_done (callable): Returns True once the acquisition is complete (one device status poll)
+        expected_fill_s (float): The expected time to fill the buffer (n_samples / sample_rate)
+        timeout_s (float): The maximum time to wait in seconds, defaults to 10x the fill time plus 1 second
+        label (str): The name the wait is recorded under
+
+    Returns:
+        elapsed_s (float): The time spent waiting in seconds
+
+    Raises:
+        TimeoutError: If the acquisition did not complete within timeout_s
+    '''
+    if timeout_s is None:
+        timeout_s = 10 * expected_fill_s + 1
+
+    start = time.perf_counter()
+    deadline = start + timeout_s
+    polls = 0
+
+    # Sleep through most of the expected fill time before the first poll
+    time.sleep(max(0.0, 0.9 * expected_fill_s))
+
+    # Then poll, backing off from a fraction of the fill time
+    interval = min(max(expected_fill_s / 20, 50e-6), 5e-3)
+    while True:
+        polls += 1
+        if is_done():
+            break
+        if time.perf_counter() >= deadline:
+            record_acquisition_wait({'label': label, 'polls': polls, 'wait_s': time.perf_counter() - start, 'timed_out': True})
+            raise TimeoutError(f"{label} did not complete within {timeout_s:.3f} s")
+        time.sleep(interval)
+        interval = min(interval * 1.5, 20e-3)
+
+    elapsed_s = time.perf_counter() - start
+    record_acquisition_wait({'label': label, 'polls': polls, 'wait_s': elapsed_s, 'timed_out': False})
+    return elapsed_s
+
+def record_acquisition_wait(entry):
+    '''
+    Add a wait record to every collect_acquisition_waits block running (dropped outside of one)
+    '''
+    for log in acquisition_wait_logs:
+        log.append(entry)
+
+@contextlib.contextmanager
+def collect_acquisition_waits():
+    '''
+    Collect the waits of wait_for_acquisition made inside the block
+
+    Usage:
+        with collect_acquisition_waits() as waits:
+            ...
+        values = acquisition_wait_summary(waits)
+    '''
+    log = []
+    acquisition_wait_logs.append(log)
+    try:
+        yield log
+    finally:
+        acquisition_wait_logs.remove(log)
+
+def acquisition_wait_summary(waits):
+    '''
+    Summarize wait records, grouped by label
+
+    Parameters:
+        waits (list): The records of a collect_acquisition_waits block
+
+    Returns:
+        values (list): Report values [{'name': ..., 'value': ...}, ...]
+    '''
+    values = []
+    for label in sorted({entry['label'] for entry in waits}):
+        entries = [entry for entry in waits if entry['label'] == label]
+        values.extend([
+            {'name': f'{label} waits', 'value': len(entries)},
+            {'name': f'{label} polls', 'value': sum(entry['polls'] for entry in entries)},
+            {'name': f'{label} wait time (s)', 'value': round(sum(entry['wait_s'] for entry in entries), 4)},
+            {'name': f'{label} timeouts', 'value': sum(entry['timed_out'] for entry in entries)},
+        ])
+    return values
+
+
+class TriggerListener:
+    '''
+    Keeps the logic analyzer recording the trigger pin and timestamps every rising edge,
+    so waiting for a trigger costs only the edge detection latency instead of an
+    instrument setup per wait. Uses the DigitalIn instrument of the device while running,
+    from its own thread, so it must not run on a device other threads use (e.g. an AD2
+    shared with the analog tests when AD2_FOR_DIGITAL is set).
+
+    Usage:
+        with TriggerListener(device_handle) as listener:
+            timestamp = listener.wait(timeout_s=5)
+    '''
+
+    def __init__(self, device_handle, pin=TRIGGER_PIN_NUM, sample_rate_hz=TRIGGER_LISTENER_SAMPLE_RATE_HZ, poll_s=TRIGGER_LISTENER_POLL_S, timeline=None):
+        '''
+        Parameters:
+            device_handle (object): The device data object of the logic analyzer
+            pin (int): The DIO pin carrying the trigger
+            sample_rate_hz (float): The sample rate of the trigger pin in Hz
+            poll_s (float): The interval between reads of the recorded samples in seconds
+            timeline (TriggerTimeline): Records every edge seen, if given
+        '''
+        self.device_handle = device_handle
+        self.timeline = timeline
+        self.pin = pin
+        self.sample_rate_hz = sample_rate_hz
+        self.poll_s = poll_s
+        self.edges = queue.Queue()
+        self.samples_lost = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        '''
+        Start recording the trigger pin (untriggered, unlimited record)
+        '''
+        if self.running:
+            return
+        handle = self.device_handle.handle
+
+        clock = c_double()
+        dwf.FDwfDigitalInInternalClockInfo(handle, byref(clock))
+        dwf.FDwfDigitalInReset(handle)
+        dwf.FDwfDigitalInAcquisitionModeSet(handle, acqmodeRecord)
+        dwf.FDwfDigitalInDividerSet(handle, c_int(max(1, int(clock.value / self.sample_rate_hz))))
+        dwf.FDwfDigitalInSampleFormatSet(handle, c_int(8 if self.pin < 8 else 16))
+        dwf.FDwfDigitalInTriggerSourceSet(handle, trigsrcNone)
+        dwf.FDwfDigitalInTriggerPositionSet(handle, c_int(0))  # 0 records until stopped
+        self.sample_rate_hz = clock.value / max(1, int(clock.value / self.sample_rate_hz))
+
+        self._level = None
+        self._samples = 0
+        self._stop.clear()
+        self.error = None
+        self._start_time = time.perf_counter()
+        if dwf.FDwfDigitalInConfigure(handle, c_bool(False), c_bool(True)) == 0:
+            check_error()
+
+        self._thread = threading.Thread(target=self._run, name="TriggerListener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop recording and release the DigitalIn instrument
+        '''
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            dwf.FDwfDigitalInReset(self.device_handle.handle)
+
+    def _run(self):
+        handle = self.device_handle.handle
+        sample_type = c_ubyte if self.pin < 8 else c_uint16
+        sts = c_byte()
+        available, lost, corrupted = c_int(), c_int(), c_int()
+        try:
+            while not self._stop.is_set():
+                if dwf.FDwfDigitalInStatus(handle, c_bool(True), byref(sts)) == 0:
+                    check_error()
+                dwf.FDwfDigitalInStatusRecord(handle, byref(available), byref(lost), byref(corrupted))
+
+                # Lost samples came before the available ones
+                self._samples += lost.value
+                self.samples_lost += lost.value
+                if available.value:
+                    samples = (sample_type * available.value)()
+                    dwf.FDwfDigitalInStatusData(handle, samples, c_int(sizeof(samples)))
+                    self._find_edges(np.ctypeslib.as_array(samples))
+
+                self._stop.wait(self.poll_s)
+        except Exception as e:
+            self.error = e
+
+    def _find_edges(self, samples):
+        levels = ((samples >> self.pin) & 1).astype(np.int8)
+        previous = np.empty_like(levels)
+        previous[0] = levels[0] if self._level is None else self._level
+        previous[1:] = levels[:-1]
+
+        for index in np.flatnonzero(levels > previous):
+            timestamp = self._start_time + (self._samples + index) / self.sample_rate_hz
+            self.edges.put((timestamp, self._samples + int(index)))
+            if self.timeline is not None:
+                self.timeline.record_edge(timestamp, self._samples + int(index))
+
+        self._level = levels[-1]
+        self._samples += len(levels)
+
+    def clear(self):
+        '''
+        Drop every edge received so far
+        '''
+        while True:
+            try:
+                self.edges.get_nowait()
+            except queue.Empty:
+                return
+
+    def wait(self, timeout_s=None, since_sample=None):
+        '''
+        Wait for a rising edge on the trigger pin.
+        Edges are told apart by their index in the recorded samples, not by their timestamp
+        (that comes from the device clock and drifts from time.perf_counter() over a long run)
+
+        Parameters:
+            timeout_s (float): The maximum time to wait in seconds, None waits forever
+            since_sample (int): Ignore edges recorded before this sample index, defaults to the
+                                samples read when the wait starts (less TRIGGER_LISTENER_TOLERANCE_S)
+
+        Returns:
+            timestamp (float): The estimated time of the edge on the time.perf_counter() clock
+
+        Raises:
+            TimeoutError: If no edge arrived within timeout_s
+        '''
+        start = time.perf_counter()
+        if since_sample is None:
+            since_sample = self._samples - int(TRIGGER_LISTENER_TOLERANCE_S * self.sample_rate_hz)
+        deadline = None if timeout_s is None else start + timeout_s
+
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f"Trigger listener stopped: {self.error}")
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"No trigger edge on DIO {self.pin} within {timeout_s} s")
+            try:
+                # Wake up periodically to notice a failed listener
+                timestamp, sample_index = self.edges.get(timeout=0.1 if remaining is None else min(remaining, 0.1))
+            except queue.Empty:
+                continue
+            if sample_index >= since_sample:
+                return timestamp
+
+
+class TriggerTimeline:
+    '''
+    Log of the trigger edges of a run, with the test phase active at each edge and
+    the fixed delays taken between them, to see where the run time goes
+
+    Usage:
+        timeline = TriggerTimeline()
+        start_trigger_listener(device_handle, timeline=timeline)
+        timeline.set_phase("Analog validation")
+        timeline.sleep(1, "start delay")
+        results = timeline.report()
+    '''
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.edges = []   # {'timestamp', 'sample_index', 'phase'}
+        self.phases = []  # {'name', 'start', 'end'}
+        self.sleeps = []  # {'name', 'phase', 'start', 'end'}
+        self.phase = None
+        self._lock = threading.Lock()
+
+    def set_phase(self, name):
+        '''
+        Start a new phase (ends the current one)
+        '''
+        now = time.perf_counter()
+        with self._lock:
+            if self.phases and self.phases[-1]['end'] is None:
+                self.phases[-1]['end'] = now
+            self.phases.append({'name': name, 'start': now, 'end': None})
+            self.phase = name
+
+    def end(self):
+        '''
+        End the current phase
+        '''
+        with self._lock:
+            if self.phases and self.phases[-1]['end'] is None:
+                self.phases[-1]['end'] = time.perf_counter()
+            self.phase = None
+
+    def record_edge(self, timestamp, sample_index):
+        '''
+        Log a trigger edge (called by TriggerListener)
+
+        Parameters:
+            timestamp (float): The time of the edge on the time.perf_counter() clock
+            sample_index (int): The index of the edge in the listener's sample stream
+        '''
+        with self._lock:
+            self.edges.append({'timestamp': timestamp, 'sample_index': sample_index, 'phase': self.phase})
+
+    def sleep(self, seconds, name):
+        '''
+        A fixed delay, logged so its cost and the trigger activity around it show up in the report
+
+        Parameters:
+            seconds (float): The delay in seconds
+            name (str): The name of the delay in the report
+        '''
+        start = time.perf_counter()
+        time.sleep(seconds)
+        with self._lock:
+            self.sleeps.append({'name': name, 'phase': self.phase, 'start': start, 'end': time.perf_counter()})
+
+    def dwell_times(self):
+        '''
+        Time between consecutive trigger edges, attributed to the phase of the later edge
+
+        Returns:
+            dwell (dict): {phase: numpy array of intervals in seconds}
+        '''
+        with self._lock:
+            edges = sorted(self.edges, key=lambda edge: edge['timestamp'])
+        if len(edges) < 2:
+            return {}
+
+        intervals = np.diff([edge['timestamp'] for edge in edges])
+        phases = np.array([str(edge['phase']) for edge in edges[1:]])
+        return {phase: intervals[phases == phase] for phase in dict.fromkeys(phases)}
+
+    def report(self, bins=TIMELINE_HISTOGRAM_BINS):
+        '''
+        Sub-test results for the HTML report: per-phase edge counts, dwell statistics
+        and histograms, and the time spent in (and trigger activity after) each fixed delay
+
+        Returns:
+            test_results (list): The sub-test results
+        '''
+        test_results = []
+        for phase, intervals in self.dwell_times().items():
+            counts, bin_edges = np.histogram(intervals, bins=bins)
+            centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+            test_results.append({
+                'sub-test': f'Trigger dwell: {phase}',
+                'pass': True,
+                'values': [
+                    {'name': 'edges', 'value': len(intervals) + 1},
+                    {'name': 'min dwell (s)', 'value': round(float(np.min(intervals)), 6)},
+                    {'name': 'median dwell (s)', 'value': round(float(np.median(intervals)), 6)},
+                    {'name': 'max dwell (s)', 'value': round(float(np.max(intervals)), 6)},
+                    {'name': 'dwell histogram', 'value': [[round(float(center), 6), int(count)] for center, count in zip(centers, counts)]},
+                    {'name': 'axis_labels', 'value': {'x-label': 'Time between trigger edges (s)', 'y-label': 'Edges'}},
+                ]
+            })
+
+        edge_times = np.sort([edge['timestamp'] for edge in self.edges])
+        values = [{'name': 'total fixed delay (s)', 'value': round(sum(entry['end'] - entry['start'] for entry in self.sleeps), 3)}]
+        for entry in self.sleeps:
+            # The first trigger after a delay shows how much of the delay the firmware actually needed
+            next_edge = np.searchsorted(edge_times, entry['end'])
+            slack = edge_times[next_edge] - entry['end'] if next_edge < len(edge_times) else None
+            values.append({'name': f"{entry['name']}: delay (s)", 'value': round(entry['end'] - entry['start'], 3)})
+            values.append({'name': f"{entry['name']}: next trigger after delay (s)", 'value': None if slack is None else round(float(slack), 4)})
+        test_results.append({'sub-test': 'Fixed delays', 'pass': True, 'values': values})
+        return test_results
+
+
+def start_trigger_listener(device_handle, pin=TRIGGER_PIN_NUM, timeline=None):
+    '''
+    Start a trigger listener that wait_for_trigger uses for this device
+
+    Parameters:
+        device_handle (object): The device data object of the logic analyzer
+        pin (int): The DIO pin carrying the trigger
+        timeline (TriggerTimeline): Records every edge seen, if given
+
+    Returns:
+        listener (TriggerListener): The running listener
+    '''
+    key = device_handle.handle.value
+    if key not in trigger_listeners:
+        trigger_listeners[key] = TriggerListener(device_handle, pin, timeline=timeline)
+    trigger_listeners[key].start()
+    return trigger_listeners[key]
+
+
+def stop_trigger_listener(device_handle):
+    '''
+    Stop the trigger listener of a device (frees the logic analyzer for other tests)
     '''
-    Wait for a trigger pulse on the specified pin
+    listener = trigger_listeners.pop(device_handle.handle.value, None)
+    if listener is not None:
+        listener.stop()
+
+
+def wait_for_trigger(device_handle, timeout_s=None):
+    '''
+    Wait for a trigger pulse on the specified pin.
+    Uses the device's trigger listener when one is running (see start_trigger_listener),
+    otherwise the logic analyzer is set up for this one wait.
+
+    Parameters:
+        device_handle (object): The device data object of the logic analyzer
+        timeout_s (float): The maximum time to wait in seconds, None waits forever
+
+    Returns:
+        timestamp (float): The time of the edge on the time.perf_counter() clock (time of return without a listener)
+
+    Raises:
+        TimeoutError: If no trigger pulse arrived within timeout_s
     '''
     print("Waiting for trigger pulse...")
+    listener = trigger_listeners.get(device_handle.handle.value)
+    if listener is not None and listener.running:
+        return listener.wait(timeout_s)
+
     WF_SDK.logic.open(device_handle, buffer_size=10000)
 
-    # Wait for trigger pulse
-    WF_SDK.logic.trigger(device_handle, enable=True, channel=TRIGGER_PIN_NUM, rising_edge=True)
+    # Wait for trigger pulse (the auto trigger fires after the timeout)
+    WF_SDK.logic.trigger(device_handle, enable=True, channel=TRIGGER_PIN_NUM, rising_edge=True, timeout=timeout_s or 0)
+    start = time.perf_counter()
     WF_SDK.logic.record(device_handle, channel=TRIGGER_PIN_NUM, )
 
     # Close logic analyzer
-    WF_SDK.logic.close(device_handle)
\ No newline at end of file
+    WF_SDK.logic.close(device_handle)
+
+    if timeout_s and time.perf_counter() - start >= timeout_s:
+        raise TimeoutError(f"No trigger pulse on DIO {TRIGGER_PIN_NUM} within {timeout_s} s")
+    return time.perf_counter()
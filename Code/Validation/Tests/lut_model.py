@@ -0,0 +1,164 @@
+'''
+Model based sparse sweep of the full resolution SCuM LUT.
+
+The SCuM frequency is smooth in the fine code, and the fine DAC has the same
+shape for every mid setting of a coarse band. SparseLutPlanner captures the first
+(coarse, mid) row of each coarse band densely to learn that fine curve g(fine),
+then only captures a sparse grid of each later row (every fine_stride fine codes
+and the last one). A row is modelled as a + b * g(fine), fitted to its captured
+steps, plus the residuals of the fit interpolated linearly between them, so the
+model goes through every measured step.
+
+Each grid capture is first compared with the prediction of the row model of the
+steps before it. Past tolerance_hz, the rest of the row is captured densely (SCuM
+transmits the settings in a fixed order, so the steps already passed stay predicted).
+
+Usage:
+    planner = SparseLutPlanner(steps, fine_stride=8, tolerance_hz=10e3)
+    for each step index:
+        if planner.capture(index): planner.record(index, measured_frequency_hz)
+        predicted = planner.finish_row(index)    # steps predicted once a row is over
+    planner.frequencies, planner.measured        # the LUT and which entries were measured
+'''
+import numpy as np
+
+
+class SparseLutPlanner:
+    '''
+    Capture plan and model of a sparse full LUT sweep
+    '''
+
+    def __init__(self, steps, fine_stride, tolerance_hz):
+        '''
+        Parameters:
+            steps (list): [coarse, mid, fine, lo] of each step, in sweep order (fine changing fastest)
+            fine_stride (int): The fine code spacing of the sparse grid
+            tolerance_hz (float): The largest difference between a grid capture and its prediction
+                before the rest of its row is captured densely
+        '''
+        self.steps = steps
+        self.fine_stride = fine_stride
+        self.tolerance_hz = tolerance_hz
+        self.frequencies = np.full(len(steps), np.nan)
+        self.measured = np.zeros(len(steps), dtype=bool)
+        self.refined_rows = []      # (coarse, mid, fine, residual_hz) of each row captured densely after a grid miss
+
+        self._rows = {}
+        for index, (coarse, mid, fine, _) in enumerate(steps):
+            self._rows.setdefault((coarse, mid), []).append(index)
+        self._fine_curves = {}      # coarse -> g(fine) of the band, indexed by fine code
+        self._dense_rows = set()
+
+    def _row(self, index):
+        coarse, mid = self.steps[index][:2]
+        return (coarse, mid), self._rows[(coarse, mid)]
+
+    def capture(self, index):
+        '''
+        Whether a step has to be captured
+
+        Parameters:
+            index (int): The step index
+
+        Returns:
+            capture (bool): True to capture the step
+        '''
+        key, row = self._row(index)
+        if key[0] not in self._fine_curves or key in self._dense_rows:
+            return True
+        fine = self.steps[index][2]
+        return fine % self.fine_stride == 0 or index == row[-1]
+
+    def predict(self, index, fines):
+        '''
+        Row model of a step's row from the steps measured so far
+
+        Parameters:
+            index (int): Any step of the row
+            fines (numpy array): The fine codes to predict
+
+        Returns:
+            frequencies (numpy array): The predicted frequencies in Hz (NaN if nothing is measured yet)
+        '''
+        key, row = self._row(index)
+        fines = np.asarray(fines)
+        known = [i for i in row if self.measured[i] and np.isfinite(self.frequencies[i])]
+        if not known:
+            return np.full(len(fines), np.nan)
+        known_fines = np.array([self.steps[i][2] for i in known])
+        values = self.frequencies[known]
+
+        curve = self._fine_curves.get(key[0])
+        if curve is None:
+            return np.interp(fines, known_fines, values)
+        if len(known) == 1:
+            return values[0] + curve[fines] - curve[known_fines[0]]
+        basis = np.column_stack([np.ones(len(known)), curve[known_fines]])
+        (a, b), *_ = np.linalg.lstsq(basis, values, rcond=None)
+        residuals = values - (a + b * curve[known_fines])
+        return a + b * curve[fines] + np.interp(fines, known_fines, residuals)
+
+    def record(self, index, frequency_hz):
+        '''
+        Record a captured step, a grid step that misses its prediction makes the rest of its row dense
+
+        Parameters:
+            index (int): The step index
+            frequency_hz (float): The measured frequency in Hz, None or NaN if it could not be measured
+        '''
+        key, row = self._row(index)
+        fine = self.steps[index][2]
+        if frequency_hz is None or not np.isfinite(frequency_hz):
+            # Nothing to check the model against, capture the rest of the row
+            self._dense_rows.add(key)
+            self.measured[index] = True
+            return
+
+        if key[0] in self._fine_curves and key not in self._dense_rows:
+            residual = frequency_hz - self.predict(index, [fine])[0]
+            if abs(residual) > self.tolerance_hz:
+                self._dense_rows.add(key)
+                self.refined_rows.append((int(key[0]), int(key[1]), int(fine), float(residual)))
+        self.frequencies[index] = frequency_hz
+        self.measured[index] = True
+
+    def finish_row(self, index):
+        '''
+        Predict the steps of a row that were not captured, once its last step is done
+        (and learn the fine curve of the band from its first complete row)
+
+        Parameters:
+            index (int): The step just done
+
+        Returns:
+            predicted (list): The indices of the steps predicted (empty if the row is not over)
+        '''
+        key, row = self._row(index)
+        if index != row[-1]:
+            return []
+
+        if key[0] not in self._fine_curves:
+            fines = np.array([self.steps[i][2] for i in row])
+            values = self.frequencies[row]
+            valid = np.isfinite(values)
+            if valid.sum() >= 2:
+                curve = np.zeros(fines.max() + 1)
+                curve[fines] = np.interp(fines, fines[valid], values[valid])
+                self._fine_curves[key[0]] = curve - curve[fines[0]]
+
+        predicted = [i for i in row if not self.measured[i]]
+        if predicted:
+            self.frequencies[predicted] = self.predict(index, [self.steps[i][2] for i in predicted])
+        return predicted
+
+    def summary(self):
+        '''
+        Returns:
+            summary (dict): steps, captured, predicted and the rows refined after a grid miss
+        '''
+        return {
+            'steps': len(self.steps),
+            'captured': int(self.measured.sum()),
+            'predicted': int((~self.measured & np.isfinite(self.frequencies)).sum()),
+            'refined_rows': [{'coarse': coarse, 'mid': mid, 'fine': fine, 'residual_hz': residual} for coarse, mid, fine, residual in self.refined_rows],
+        }
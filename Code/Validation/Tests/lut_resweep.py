@@ -0,0 +1,152 @@
+'''
+Incremental SCuM LUT resweep against the last saved LUT of the chip.
+
+SCuM transmits the sweep settings in a fixed order, one per trigger, so the
+receiver chooses which steps it captures, not which settings are sent. The sweep
+is split into regions of region_mids consecutive mid settings of one coarse
+setting. The first step of each region is always captured (the probe) and
+compared with the saved LUT:
+- within threshold_hz: the rest of the region is not captured and keeps its saved frequencies
+- drifted past threshold_hz (or not measurable): the rest of the region is captured densely
+Steps missing from the saved LUT, or never measured (predicted), are always captured.
+Steps that are not captured keep their saved frequency and the run it was measured in,
+so the next resweep still has them as its baseline.
+
+Usage:
+    resweep = IncrementalResweep(LutStore.load(path), steps, threshold_hz=25e3, region_mids=6)
+    for each step index:   capture = resweep.capture(index)     # blocks until the probe of the region is analyzed
+    after each capture:    resweep.record(index, frequency_hz)
+    frequencies = resweep.merge(measured)                         # saved values for the skipped steps
+    runs = resweep.measured_runs(run)                             # run each frequency was measured in
+    report = resweep.report()
+'''
+import threading
+
+import numpy as np
+
+
+class IncrementalResweep:
+    '''
+    Capture plan of an incremental sweep, shared by the receiving and analyzing threads
+    '''
+
+    def __init__(self, previous, steps, threshold_hz, region_mids):
+        '''
+        Parameters:
+            previous (LutStore): The last saved LUT of the chip
+            steps (list): [coarse, mid, fine, lo] of each step, in sweep order
+            threshold_hz (float): The probe drift above which a region is captured again
+            region_mids (int): The number of mid settings per region
+        '''
+        self.steps = steps
+        self.threshold_hz = threshold_hz
+        self.baseline = np.full(len(steps), np.nan)
+        self.baseline_runs = [''] * len(steps)
+        for index, step in enumerate(steps):
+            frequency = previous.frequency_of(*step[:3], measured_only=True)
+            if frequency is not None:
+                self.baseline[index] = frequency
+                self.baseline_runs[index] = previous.measured_run_of(*step[:3])
+
+        # Region of every step and the first step (probe) of every region
+        self.regions = []
+        self.probes = []
+        keys = {}
+        for index, (coarse, mid, fine, _) in enumerate(steps):
+            key = (coarse, mid // region_mids)
+            if key not in keys:
+                keys[key] = len(self.probes)
+                self.probes.append(index)
+            self.regions.append(keys[key])
+        self.region_keys = list(keys)
+
+        self.drift = [None] * len(self.probes)
+        self.dense = [False] * len(self.probes)
+        self.captured = np.zeros(len(steps), dtype=bool)   # Steps measured in this run (the others are carried over)
+        self._probed = [threading.Event() for _ in self.probes]
+
+    def capture(self, index):
+        '''
+        Whether a step has to be captured, waits for the probe of its region to be recorded
+
+        Parameters:
+            index (int): The step index
+
+        Returns:
+            capture (bool): True to capture the step
+        '''
+        region = self.regions[index]
+        if index == self.probes[region] or np.isnan(self.baseline[index]):
+            self.captured[index] = True
+            return True
+        self._probed[region].wait()
+        self.captured[index] = self.dense[region]
+        return self.dense[region]
+
+    def record(self, index, frequency_hz):
+        '''
+        Record the measured frequency of a captured step (decides its region after a probe)
+
+        Parameters:
+            index (int): The step index
+            frequency_hz (float): The measured frequency in Hz, None if the step could not be measured
+        '''
+        region = self.regions[index]
+        if index != self.probes[region]:
+            return
+        drift = np.nan if frequency_hz is None else frequency_hz - self.baseline[index]
+        self.drift[region] = None if np.isnan(drift) else float(drift)
+        self.dense[region] = not abs(drift) <= self.threshold_hz
+        self._probed[region].set()
+
+    def merge(self, measured):
+        '''
+        The updated LUT: measured frequencies of the captured steps, saved ones elsewhere
+
+        Parameters:
+            measured (list): The measured frequency of each step (None if not captured)
+
+        Returns:
+            frequencies (numpy array): The frequency of each step in Hz
+        '''
+        measured = np.array([np.nan if f is None else f for f in measured], dtype=np.float64)
+        return np.where(self.captured, measured, self.baseline)
+
+    def measured_runs(self, run):
+        '''
+        The run each frequency of the updated LUT was measured in
+
+        Parameters:
+            run (str): The name of this run
+
+        Returns:
+            runs (list): This run for the captured steps, the run of the saved frequency for the others
+                ('' if it was never measured)
+        '''
+        return [run if captured else baseline_run for captured, baseline_run in zip(self.captured, self.baseline_runs)]
+
+    def report(self):
+        '''
+        The regions and whether they were re-measured
+
+        Returns:
+            report (dict): captures, steps and one entry per region (coarse, mids, probe drift, re-measured)
+        '''
+        regions = []
+        for region, (coarse, _) in enumerate(self.region_keys):
+            indices = [index for index, r in enumerate(self.regions) if r == region]
+            mids = [self.steps[index][1] for index in indices]
+            regions.append({
+                'coarse': int(coarse),
+                'mids': [int(min(mids)), int(max(mids))],
+                'probe_drift_hz': self.drift[region],
+                're_measured': bool(self.dense[region]),
+                'captures': int(self.captured[indices].sum()),
+            })
+        return {
+            'threshold_hz': self.threshold_hz,
+            'steps': len(self.steps),
+            'captures': int(self.captured.sum()),
+            're_measured': sum(region['re_measured'] for region in regions),
+            'regions': regions,
+        }
@@ -0,0 +1,209 @@
+'''
+Indexed store of the SCuM radio LUT measured by the RF sweeps.
+
+The LUT is kept as one structured array sorted by frequency, with a dense
+(coarse, mid, fine) -> row index next to it, so both directions are cheap:
+the frequency of a setting is one array lookup, and the setting closest to a
+frequency (or every setting in a frequency range) is found by bisection.
+
+Each run is persisted as a binary .npy file of the sorted array, under
+<library>/<chip id>/<run>.npy, so later runs and tools can load the last LUT of a chip.
+Entries carried over from an earlier LUT keep the run they were last measured in.
+
+Usage:
+    lut = LutStore.from_settings(settings, frequencies)   # settings: [coarse, mid, fine] per entry
+    lut.save(lut_path(library_dir, "chip-01", "2024-05-01_10-00-00"))
+    lut = LutStore.load(latest_lut_path(library_dir, "chip-01"))
+    best = lut.nearest(2.405e9, tolerance_hz=50e3)        # None if nothing is within 50 kHz
+    channel = lut.in_range(2.4049e9, 2.4051e9)             # entries sorted by frequency
+'''
+import glob
+import os
+
+import numpy as np
+
+# Codes per LUT dimension (5 bit coarse, mid and fine DACs)
+LUT_CODES = 32
+
+LUT_DTYPE = np.dtype([
+    ('coarse', np.uint8),
+    ('mid', np.uint8),
+    ('fine', np.uint8),
+    ('frequency_hz', np.float64),
+    ('measured', np.bool_),     # False for entries predicted by the sparse sweep model (never measured)
+    ('measured_run', 'U32'),    # The run the frequency was last measured in ('' if never, or unknown in older files)
+])
+
+LUT_EXTENSION = '.npy'
+
+
+class LutStore:
+    '''
+    SCuM LUT sorted by frequency and indexed by (coarse, mid, fine)
+    '''
+
+    def __init__(self, entries):
+        '''
+        Parameters:
+            entries (numpy array): The entries (LUT_DTYPE fields), in any order. Entries
+                without a frequency (NaN) are dropped, and a setting listed twice keeps its last entry.
+        '''
+        entries = np.asarray(entries)
+        entries = entries[np.isfinite(entries['frequency_hz'])]
+
+        # Last entry of each setting wins
+        keys = (entries['coarse'].astype(np.int64) * LUT_CODES + entries['mid']) * LUT_CODES + entries['fine']
+        _, last = np.unique(keys[::-1], return_index=True)
+        entries = entries[len(entries) - 1 - last]
+
+        self.entries = entries[np.argsort(entries['frequency_hz'], kind='stable')]
+        self.frequencies = np.ascontiguousarray(self.entries['frequency_hz'])
+        self._index = np.full((LUT_CODES, LUT_CODES, LUT_CODES), -1, dtype=np.int32)
+        self._index[self.entries['coarse'], self.entries['mid'], self.entries['fine']] = np.arange(len(self.entries), dtype=np.int32)
+
+    @classmethod
+    def from_settings(cls, settings, frequencies, measured=None, measured_runs=None):
+        '''
+        Build the store from parallel lists of settings and frequencies
+
+        Parameters:
+            settings (list): [coarse, mid, fine] of each entry
+            frequencies (list): The frequency of each entry in Hz (NaN if not known)
+            measured (list): Whether each entry was measured (False if predicted), None if all were
+            measured_runs (list): The run each entry was last measured in ('' if never), None if not known
+
+        Returns:
+            lut (LutStore): The store
+        '''
+        settings = np.asarray(settings, dtype=np.int64).reshape(-1, 3)
+        entries = np.zeros(len(settings), dtype=LUT_DTYPE)
+        entries['coarse'], entries['mid'], entries['fine'] = settings.T
+        entries['frequency_hz'] = frequencies
+        entries['measured'] = True if measured is None else measured
+        if measured_runs is not None:
+            entries['measured_run'] = measured_runs
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, setting):
+        coarse, mid, fine = setting
+        return self._index[coarse, mid, fine] >= 0
+
+    def frequency_of(self, coarse, mid, fine, measured_only=False):
+        '''
+        The frequency of a setting
+
+        Parameters:
+            measured_only (bool): Ignore entries that were never measured (predicted)
+
+        Returns:
+            frequency_hz (float): The frequency in Hz, None if the setting is not in the LUT
+        '''
+        row = self._index[coarse, mid, fine]
+        if row < 0 or (measured_only and not self.entries['measured'][row]):
+            return None
+        return float(self.frequencies[row])
+
+    def measured_run_of(self, coarse, mid, fine):
+        '''
+        The run the frequency of a setting was last measured in
+
+        Returns:
+            run (str): The run name ('' if not known), None if the setting was never measured or is not in the LUT
+        '''
+        row = self._index[coarse, mid, fine]
+        if row < 0 or not self.entries['measured'][row]:
+            return None
+        return str(self.entries['measured_run'][row])
+
+    def nearest(self, frequency_hz, tolerance_hz=None):
+        '''
+        The setting closest to a frequency
+
+        Parameters:
+            frequency_hz (float): The target frequency in Hz
+            tolerance_hz (float): The largest error accepted, None for any
+
+        Returns:
+            entry (dict): coarse, mid, fine, frequency_hz, error_hz (frequency - target) and measured,
+                None if the LUT is empty or nothing is within the tolerance
+        '''
+        if len(self.entries) == 0:
+            return None
+        right = int(np.searchsorted(self.frequencies, frequency_hz))
+        candidates = [row for row in (right - 1, right) if 0 <= row < len(self.frequencies)]
+        row = min(candidates, key=lambda row: abs(self.frequencies[row] - frequency_hz))
+        error = float(self.frequencies[row] - frequency_hz)
+        if tolerance_hz is not None and abs(error) > tolerance_hz:
+            return None
+        entry = self.entries[row]
+        return {'coarse': int(entry['coarse']), 'mid': int(entry['mid']), 'fine': int(entry['fine']),
+                'frequency_hz': float(entry['frequency_hz']), 'error_hz': error, 'measured': bool(entry['measured'])}
+
+    def in_range(self, low_hz, high_hz):
+        '''
+        Every setting with a frequency in [low_hz, high_hz]
+
+        Returns:
+            entries (numpy array): The entries (LUT_DTYPE), sorted by frequency (a view, do not modify)
+        '''
+        start = np.searchsorted(self.frequencies, low_hz, side='left')
+        stop = np.searchsorted(self.frequencies, high_hz, side='right')
+        return self.entries[start:stop]
+
+    def save(self, path):
+        '''
+        Write the store to a binary .npy file (written next to it first, then moved into place)
+
+        Parameters:
+            path (str): The file path
+        '''
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.save(f, self.entries, allow_pickle=False)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Read a store written by save() (files from before the measured flag count as measured)
+
+        Parameters:
+            path (str): The file path
+
+        Returns:
+            lut (LutStore): The store
+        '''
+        entries = np.load(path, allow_pickle=False)
+        converted = np.zeros(len(entries), dtype=LUT_DTYPE)
+        converted['measured'] = True
+        for name in LUT_DTYPE.names:
+            if name in entries.dtype.names:
+                converted[name] = entries[name]
+        return cls(converted)
+
+
+def lut_path(library_dir, chip_id, run):
+    '''
+    The file of the LUT of one run of a chip
+
+    Parameters:
+        library_dir (str): The directory holding the LUTs of every chip
+        chip_id (str): The chip name
+        run (str): The run name (a timestamp, so runs sort by time)
+    '''
+    return os.path.join(library_dir, chip_id, run + LUT_EXTENSION)
+
+
+def latest_lut_path(library_dir, chip_id):
+    '''
+    The file of the last LUT saved for a chip
+
+    Returns:
+        path (str): The file path, None if the chip has no LUT yet
+    '''
+    paths = sorted(glob.glob(os.path.join(library_dir, chip_id, '*' + LUT_EXTENSION)))
+    return paths[-1] if paths else None
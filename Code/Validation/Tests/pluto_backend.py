@@ -0,0 +1,28 @@
+'''
+Selects the Pluto SDR backend used by the RF tests.
+
+By default pyadi-iio (adi.Pluto) talks to the attached radios. Setting the
+environment variable SCUM_SDR_BACKEND=replay swaps in the simulated Plutos from
+simulated_pluto.py, which serve recorded or synthetic IQ, so the RF tests can be
+run and benchmarked without radios.
+
+Usage:
+    from Validation.Tests.pluto_backend import Pluto
+'''
+import os
+
+SDR_BACKEND_HARDWARE = 'hardware'
+SDR_BACKEND_REPLAY = 'replay'
+SDR_BACKEND = os.environ.get('SCUM_SDR_BACKEND', SDR_BACKEND_HARDWARE).lower()
+
+if SDR_BACKEND == SDR_BACKEND_REPLAY:
+    from Validation.Tests.simulated_pluto import Pluto
+else:
+    from adi import Pluto
+
+
+def is_replay():
+    '''
+    Returns True when the replay backend is in use
+    '''
+    return SDR_BACKEND == SDR_BACKEND_REPLAY
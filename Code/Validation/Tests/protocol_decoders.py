@@ -0,0 +1,441 @@
+'''
+Streaming UART, SPI and I2C decoders for logic analyzer captures.
+
+Each decoder is fed the bit-planes of a capture (see split_bit_planes in
+digital_test.py) one chunk at a time, keeps whatever it needs of a chunk to
+finish a frame in the next one, and returns the frames completed so far.
+Frames carry the sample index of their first and last bit, counted from the
+first sample fed to the decoder, and the matching time in seconds.
+
+Edges and bit values are found with numpy over the whole chunk, Python only
+loops once per frame (UART) or once per transaction (SPI/I2C).
+
+Usage:
+    decoder = UartDecoder(pin=2, sample_rate_hz=10e6)   # baud rate detected from the data
+    for chunk in chunks:
+        for frame in decoder.feed(chunk):
+            print(frame['time_s'], frame['data'])
+'''
+import numpy as np
+
+STANDARD_BAUD_RATES = [300, 1200, 2400, 4800, 9600, 14400, 19200, 38400, 57600, 115200, 230400, 460800, 921600]
+BAUD_SNAP_TOLERANCE = 0.03      # Detected rates within 3% of a standard rate are snapped to it
+BAUD_MIN_RUNS = 20              # Runs needed before the baud rate is estimated
+BAUD_MIN_RUN_SAMPLES = 3        # Shorter runs are glitches and ignored by the baud rate detection
+MAX_BITS_PER_RUN = 10           # Longest run (in bits) used to refine the bit width
+
+
+def level_runs(line):
+    '''
+    Lengths of the runs of equal values inside a line, without the first and last run
+    (they are cut by the capture and don't have their real length)
+
+    Parameters:
+        line (numpy array): 0/1 values of one pin
+
+    Returns:
+        runs (numpy array): The run lengths in samples
+    '''
+    edges = np.flatnonzero(line[1:] != line[:-1]) + 1
+    return np.diff(edges)
+
+
+def detect_baud_rate(line, sample_rate_hz, standard_rates=STANDARD_BAUD_RATES, min_runs=BAUD_MIN_RUNS):
+    '''
+    Estimate a UART baud rate from the shortest bit width seen on the line.
+    The shortest run gives a first bit width, which is refined with every run of up to
+    MAX_BITS_PER_RUN bits (each counted as a whole number of bits).
+
+    Parameters:
+        line (numpy array): 0/1 values of the UART pin
+        sample_rate_hz (float): The sample rate in Hz
+        standard_rates (list): Rates the estimate is snapped to when within BAUD_SNAP_TOLERANCE, None to not snap
+        min_runs (int): The number of runs needed for an estimate
+
+    Returns:
+        baud_rate (float): The baud rate in bits/s, None if there is not enough traffic
+    '''
+    runs = level_runs(line)
+    runs = runs[runs >= BAUD_MIN_RUN_SAMPLES]
+    if len(runs) < min_runs:
+        return None
+
+    bits = np.round(runs / runs.min())
+    usable = bits <= MAX_BITS_PER_RUN
+    baud_rate = sample_rate_hz * bits[usable].sum() / runs[usable].sum()
+
+    if standard_rates:
+        nearest = min(standard_rates, key=lambda rate: abs(rate - baud_rate))
+        if abs(nearest - baud_rate) <= BAUD_SNAP_TOLERANCE * nearest:
+            return float(nearest)
+    return float(baud_rate)
+
+
+def rising_edges(line, previous):
+    '''
+    Indices of the low to high transitions of a line
+
+    Parameters:
+        line (numpy array): 0/1 values
+        previous (int): The value before line[0] (the last value of the previous chunk)
+    '''
+    return np.flatnonzero(np.diff(line, prepend=previous).astype(np.int8) == 1)
+
+
+def falling_edges(line, previous):
+    '''
+    Indices of the high to low transitions of a line
+
+    Parameters:
+        line (numpy array): 0/1 values
+        previous (int): The value before line[0] (the last value of the previous chunk)
+    '''
+    return np.flatnonzero(np.diff(line, prepend=previous).astype(np.int8) == -1)
+
+
+class UartDecoder:
+    '''
+    8N1 style UART decoder (LSB first, idle high) with optional baud rate detection.
+
+    Frames: {'start', 'end' (sample indices), 'time_s', 'data' (int), 'framing_error' (bool)}
+    '''
+
+    def __init__(self, pin, sample_rate_hz, baud_rate=None, data_bits=8, stop_bits=1):
+        '''
+        Parameters:
+            pin (int): The DIO pin of the UART line (row of the bit-planes)
+            sample_rate_hz (float): The sample rate in Hz
+            baud_rate (float): The baud rate, None to detect it from the data
+            data_bits (int): The data bits per frame
+            stop_bits (int): The stop bits per frame
+        '''
+        self.pin = pin
+        self.sample_rate_hz = sample_rate_hz
+        self.baud_rate = baud_rate
+        self.data_bits = data_bits
+        self.stop_bits = stop_bits
+        self.frames = 0
+
+        # Samples kept from the previous chunks, starting one sample before any unfinished frame
+        self._carry = np.ones(1, dtype=np.uint8)
+        self._carry_start = -1
+        self._samples = 0
+
+    def feed(self, bit_planes):
+        '''
+        Decode the next chunk of the capture
+
+        Parameters:
+            bit_planes (numpy array): Shape (n_pins, n_samples), the chunk following the previous one
+
+        Returns:
+            frames (list): The frames completed in this chunk
+        '''
+        line = np.concatenate((self._carry, bit_planes[self.pin]))
+        line_start = self._carry_start
+        self._samples += bit_planes.shape[1]
+
+        if self.baud_rate is None:
+            self.baud_rate = detect_baud_rate(line, self.sample_rate_hz)
+            if self.baud_rate is None:
+                # Not enough traffic yet, keep it (from just before the first edge) for the next chunk
+                self._keep(line, line_start, self._first_edge(line))
+                return []
+
+        bit = self.sample_rate_hz / self.baud_rate
+        starts = falling_edges(line[1:], line[0]) + 1
+        stop_center = (self.data_bits + 1.5) * bit
+        half_bit = int(0.5 * bit)
+
+        # Falling edges that are start bits of complete frames (low at the middle of the bit),
+        # and for each the first edge after its stop bit, where the next frame can start
+        complete = starts[starts + stop_center < len(line)]
+        candidates = complete[line[complete + half_bit] == 0]
+        following = np.searchsorted(candidates, candidates + stop_center).tolist()
+
+        frame_starts = []
+        index = 0
+        while index < len(candidates):
+            frame_starts.append(index)
+            index = following[index]
+        frame_starts = candidates[frame_starts]
+
+        # The first edge that is neither decoded nor rejected (a frame not finished in this chunk) and
+        # everything after it is carried to the next chunk
+        resume = len(complete)
+        if len(frame_starts):
+            resume = max(resume, np.searchsorted(starts, frame_starts[-1] + stop_center))
+        self._keep(line, line_start, starts[resume] if resume < len(starts) else len(line))
+
+        if len(frame_starts) == 0:
+            return []
+
+        # Sample every data and stop bit in its center
+        offsets = ((np.arange(1, self.data_bits + 1 + self.stop_bits) + 0.5) * bit).astype(np.int64)
+        bits = line[frame_starts[:, None] + offsets]
+        data = bits[:, :self.data_bits].astype(np.int64) @ (1 << np.arange(self.data_bits))
+        framing_errors = (bits[:, self.data_bits:] == 0).any(axis=1)
+
+        frame_length = int(round((1 + self.data_bits + self.stop_bits) * bit))
+        self.frames += len(frame_starts)
+        return [{
+            'start': int(line_start + start),
+            'end': int(line_start + start + frame_length - 1),
+            'time_s': (line_start + start) / self.sample_rate_hz,
+            'data': int(value),
+            'framing_error': bool(framing_error),
+        } for start, value, framing_error in zip(frame_starts, data, framing_errors)]
+
+    def _first_edge(self, line):
+        edges = np.flatnonzero(line[1:] != line[:-1]) + 1
+        return edges[0] if len(edges) else len(line)
+
+    def _keep(self, line, line_start, position):
+        '''
+        Carry the line from one sample before position to the next chunk
+        '''
+        position = max(min(position, len(line)) - 1, 0)
+        self._carry = line[position:]
+        self._carry_start = line_start + position
+
+
+class _WordAssembler:
+    '''
+    Groups sampled bits into words per transaction, keeping the bits of an unfinished
+    word until the next chunk (dropped if its transaction ends first)
+    '''
+
+    def __init__(self, word_bits, msb_first=True):
+        self.word_bits = word_bits
+        self.weights = 1 << (np.arange(word_bits)[::-1] if msb_first else np.arange(word_bits))
+        self._indices = np.empty(0, dtype=np.int64)
+        self._bits = None
+        self._transactions = np.empty(0, dtype=np.int64)
+        self._transaction = None
+        self._words_in_transaction = 0
+
+    def add(self, indices, bits, transactions):
+        '''
+        Parameters:
+            indices (numpy array): The sample index of each bit
+            bits (numpy array): Shape (n_lines, n_bits), the value of each sampled line
+            transactions (numpy array): The transaction number of each bit (non-decreasing)
+
+        Returns:
+            [first, last, position, values] (list): Per word the sample index of its first and last bit,
+                                                    its position in its transaction (lists) and the word
+                                                    values, shape (n_lines, n_words)
+        '''
+        if self._bits is not None:
+            indices = np.concatenate((self._indices, indices))
+            bits = np.concatenate((self._bits, bits), axis=1)
+            transactions = np.concatenate((self._transactions, transactions))
+        if len(indices) == 0:
+            self._bits = bits
+            return [[], [], [], bits[:, :0]]
+
+        # Position of every bit in its transaction (as seen in this call)
+        segment_starts = np.flatnonzero(np.diff(transactions, prepend=transactions[0] - 1))
+        segment_lengths = np.diff(np.append(segment_starts, len(indices)))
+        segment = np.repeat(np.arange(len(segment_starts)), segment_lengths)
+        position = np.arange(len(indices)) - segment_starts[segment]
+
+        # Only whole words are decoded, the bits left over in the last transaction are kept
+        complete = position < (segment_lengths // self.word_bits * self.word_bits)[segment]
+        kept = np.arange(segment_starts[-1], len(indices))
+        kept = kept[~complete[kept]]
+
+        word_indices = indices[complete].reshape(-1, self.word_bits)
+        values = bits[:, complete].reshape(len(bits), -1, self.word_bits) @ self.weights
+        word_position = position[complete][::self.word_bits] // self.word_bits
+
+        # Words of a transaction that continues from the previous call keep counting from there
+        word_segment = segment[complete][::self.word_bits]
+        offset = self._words_in_transaction if transactions[0] == self._transaction else 0
+        word_position[word_segment == 0] += offset
+        if (word_segment == len(segment_starts) - 1).any():
+            self._words_in_transaction = int(word_position[-1]) + 1
+        else:
+            self._words_in_transaction = offset if len(segment_starts) == 1 else 0
+        self._transaction = transactions[-1]
+
+        self._indices = indices[kept]
+        self._bits = bits[:, kept]
+        self._transactions = transactions[kept]
+        return [word_indices[:, 0].tolist(), word_indices[:, -1].tolist(), word_position.tolist(), values]
+
+
+class SpiDecoder:
+    '''
+    SPI decoder, bits are sampled on the clock edge set by the mode and grouped into
+    words while chip select is active (active low).
+
+    Frames: {'start', 'end' (sample indices), 'time_s', 'mosi', 'miso' (int, None without a pin)}
+    '''
+
+    def __init__(self, sclk_pin, mosi_pin, sample_rate_hz, miso_pin=None, cs_pin=None, mode=0, word_bits=8, msb_first=True):
+        '''
+        Parameters:
+            sclk_pin (int): The DIO pin of the clock
+            mosi_pin (int): The DIO pin of MOSI
+            sample_rate_hz (float): The sample rate in Hz
+            miso_pin (int): The DIO pin of MISO, None if not captured
+            cs_pin (int): The DIO pin of chip select, None to decode every clock edge as one transaction
+            mode (int): The SPI mode (0-3), sets the clock polarity and the sampling edge
+            word_bits (int): The bits per word
+            msb_first (bool): The bit order
+        '''
+        self.sclk_pin = sclk_pin
+        self.data_pins = [mosi_pin] if miso_pin is None else [mosi_pin, miso_pin]
+        self.cs_pin = cs_pin
+        self.sample_rate_hz = sample_rate_hz
+        cpol, cpha = mode >> 1, mode & 1
+        self.sample_on_rising = cpol == cpha
+        self.has_miso = miso_pin is not None
+        self.frames = 0
+
+        self._words = _WordAssembler(word_bits, msb_first)
+        self._last_sclk = cpol
+        self._last_cs = 1
+        self._transaction = 0
+        self._samples = 0
+
+    def feed(self, bit_planes):
+        '''
+        Decode the next chunk of the capture
+
+        Parameters:
+            bit_planes (numpy array): Shape (n_pins, n_samples), the chunk following the previous one
+
+        Returns:
+            frames (list): The frames completed in this chunk
+        '''
+        chunk_start = self._samples
+        self._samples += bit_planes.shape[1]
+
+        sclk = bit_planes[self.sclk_pin]
+        edges = (rising_edges if self.sample_on_rising else falling_edges)(sclk, self._last_sclk)
+        self._last_sclk = sclk[-1]
+
+        transactions = np.full(len(edges), self._transaction, dtype=np.int64)
+        if self.cs_pin is not None:
+            cs = bit_planes[self.cs_pin]
+            # Every assertion of chip select starts a new transaction, bits outside of one are ignored
+            selects = falling_edges(cs, self._last_cs)
+            self._last_cs = cs[-1]
+            transactions += np.searchsorted(selects, edges, side='right')
+            self._transaction += len(selects)
+            active = cs[edges] == 0
+            edges, transactions = edges[active], transactions[active]
+
+        bits = bit_planes[self.data_pins][:, edges].astype(np.int64)
+        first, last, _, values = self._words.add(chunk_start + edges, bits, transactions)
+        self.frames += len(first)
+        miso = values[1].tolist() if self.has_miso else [None] * len(first)
+        return [{
+            'start': start,
+            'end': end,
+            'time_s': start / self.sample_rate_hz,
+            'mosi': mosi,
+            'miso': miso_value,
+        } for start, end, mosi, miso_value in zip(first, last, values[0].tolist(), miso)]
+
+
+class I2cDecoder:
+    '''
+    I2C decoder, data is sampled on the rising edges of SCL between a START
+    (SDA falling while SCL is high) and a STOP (SDA rising while SCL is high).
+
+    Frames: {'start', 'end' (sample indices), 'time_s', 'data' (int), 'ack' (bool), 'address' (bool)}
+    The first byte of a transaction has 'address' set, data holds the 7-bit address and R/W bit.
+    '''
+
+    def __init__(self, scl_pin, sda_pin, sample_rate_hz):
+        '''
+        Parameters:
+            scl_pin (int): The DIO pin of SCL
+            sda_pin (int): The DIO pin of SDA
+            sample_rate_hz (float): The sample rate in Hz
+        '''
+        self.scl_pin = scl_pin
+        self.sda_pin = sda_pin
+        self.sample_rate_hz = sample_rate_hz
+        self.frames = 0
+
+        # 8 data bits and the acknowledge bit
+        self._words = _WordAssembler(9)
+        self._last_scl = 1
+        self._last_sda = 1
+        self._transaction = 0
+        self._in_transaction = False
+        self._samples = 0
+
+    def feed(self, bit_planes):
+        '''
+        Decode the next chunk of the capture
+
+        Parameters:
+            bit_planes (numpy array): Shape (n_pins, n_samples), the chunk following the previous one
+
+        Returns:
+            frames (list): The frames completed in this chunk
+        '''
+        chunk_start = self._samples
+        self._samples += bit_planes.shape[1]
+
+        scl = bit_planes[self.scl_pin]
+        sda = bit_planes[self.sda_pin]
+        clock_edges = rising_edges(scl, self._last_scl)
+
+        sda_falls = falling_edges(sda, self._last_sda)
+        sda_rises = rising_edges(sda, self._last_sda)
+        starts = sda_falls[scl[sda_falls] == 1]
+        stops = sda_rises[scl[sda_rises] == 1]
+        self._last_scl, self._last_sda = scl[-1], sda[-1]
+
+        # State at each clock edge: the last START/STOP before it (or the state carried from the previous chunk)
+        conditions = np.concatenate((starts, stops))
+        is_start = np.concatenate((np.ones(len(starts), dtype=bool), np.zeros(len(stops), dtype=bool)))
+        order = np.argsort(conditions, kind='stable')
+        conditions, is_start = conditions[order], is_start[order]
+
+        active = np.full(len(clock_edges), self._in_transaction)
+        if len(conditions):
+            last_condition = np.searchsorted(conditions, clock_edges, side='right') - 1
+            active[last_condition >= 0] = is_start[last_condition[last_condition >= 0]]
+            self._in_transaction = bool(is_start[-1])
+        transactions = self._transaction + np.searchsorted(starts, clock_edges, side='right')
+        self._transaction += len(starts)
+
+        edges, transactions = clock_edges[active], transactions[active]
+        bits = sda[edges][None, :].astype(np.int64)
+        first, last, position, values = self._words.add(chunk_start + edges, bits, transactions)
+        self.frames += len(first)
+        return [{
+            'start': start,
+            'end': end,
+            'time_s': start / self.sample_rate_hz,
+            'data': value >> 1,
+            'ack': (value & 1) == 0,
+            'address': word == 0,
+        } for start, end, word, value in zip(first, last, position, values[0].tolist())]
+
+
+def decode_bit_planes(decoders, bit_planes, chunk_samples=1 << 20):
+    '''
+    Run decoders over a whole capture, chunk by chunk
+
+    Parameters:
+        decoders (list): The decoders to run
+        bit_planes (numpy array): Shape (n_pins, n_samples)
+        chunk_samples (int): The samples fed per chunk
+
+    Returns:
+        frames (list): The frames of each decoder
+    '''
+    frames = [[] for _ in decoders]
+    for start in range(0, bit_planes.shape[1], chunk_samples):
+        chunk = bit_planes[:, start:start + chunk_samples]
+        for decoder, decoded in zip(decoders, frames):
+            decoded.extend(decoder.feed(chunk))
+    return frames
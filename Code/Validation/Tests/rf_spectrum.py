@@ -0,0 +1,243 @@
+'''
+Spectral peak detection for the SCuM RF sweep.
+
+SpectralPeakFinder replaces the full-length FFT of every Rx buffer with an FFT of
+a fast length (power of two by default), optionally averaged over several 50%
+overlapping segments (Welch), and refines the peak between bins by fitting a
+parabola to the log power of the peak bin and its neighbours.
+Frequency axes and windows are computed once per (FFT length, sample rate).
+
+Usage:
+    finder = SpectralPeakFinder(sample_rate_hz=5e6, fft_size=131072)
+    peak = finder.find_peak(rx_samples)      # peak['frequency_hz'] is relative to the LO
+    print(finder.summary(len(rx_samples))['resolution_hz'])
+'''
+import numpy as np
+
+WINDOW_HANN = 'hann'
+WINDOW_NONE = 'rectangular'
+
+# Equivalent noise bandwidth (in bins) and main lobe half width (in bins) of each window
+WINDOW_ENBW_BINS = {WINDOW_HANN: 1.5, WINDOW_NONE: 1.0}
+WINDOW_MAIN_LOBE_BINS = {WINDOW_HANN: 2, WINDOW_NONE: 1}
+
+_frequency_axes = {}
+_windows = {}
+
+
+def fast_fft_length(n_samples, power_of_two=True):
+    '''
+    Longest FFT length that fits in n_samples and is fast to compute
+
+    Parameters:
+        n_samples (int): The samples available
+        power_of_two (bool): Only use powers of two, otherwise any 2^a * 3^b * 5^c length
+
+    Returns:
+        length (int): The FFT length
+    '''
+    best = 1 << (int(n_samples).bit_length() - 1)
+    if power_of_two:
+        return best
+
+    power_of_five = 1
+    while power_of_five <= n_samples:
+        power_of_three = power_of_five
+        while power_of_three <= n_samples:
+            # Largest power of two that keeps the product within n_samples
+            length = power_of_three << ((n_samples // power_of_three).bit_length() - 1)
+            best = max(best, length)
+            power_of_three *= 3
+        power_of_five *= 5
+    return best
+
+
+def frequency_axis(fft_size, sample_rate_hz):
+    '''
+    The FFT bin frequencies (np.fft.fftfreq order), computed once per (fft_size, sample_rate_hz)
+
+    Returns:
+        freqs (numpy array): The frequency of each bin in Hz (shared, do not modify)
+    '''
+    key = (fft_size, float(sample_rate_hz))
+    if key not in _frequency_axes:
+        _frequency_axes[key] = np.fft.fftfreq(fft_size, 1 / sample_rate_hz)
+    return _frequency_axes[key]
+
+
+def spectrum_window(fft_size, window=WINDOW_HANN):
+    '''
+    Window coefficients, computed once per (fft_size, window)
+
+    Returns:
+        window (numpy array): The window (float32, shared, do not modify)
+    '''
+    key = (fft_size, window)
+    if key not in _windows:
+        if window == WINDOW_HANN:
+            _windows[key] = np.hanning(fft_size).astype(np.float32)
+        elif window == WINDOW_NONE:
+            _windows[key] = np.ones(fft_size, dtype=np.float32)
+        else:
+            raise ValueError(f"Unknown window: {window}")
+    return _windows[key]
+
+
+def interpolate_peak(power, peak):
+    '''
+    Fractional offset of the true peak from the peak bin, from a parabola through
+    the log power of the peak bin and its two neighbours (wrapping around the spectrum)
+
+    Parameters:
+        power (numpy array): The power spectrum
+        peak (int): The index of the peak bin
+
+    Returns:
+        offset (float): The offset in bins (-0.5 to 0.5)
+    '''
+    n = len(power)
+    left, center, right = np.log(power[[(peak - 1) % n, peak, (peak + 1) % n]] + np.finfo(np.float64).tiny)
+    curvature = left - 2 * center + right
+    if curvature >= 0:
+        return 0.0
+    return float(np.clip(0.5 * (left - right) / curvature, -0.5, 0.5))
+
+
+class SpectralPeakFinder:
+    '''
+    Strongest tone of complex baseband buffers, with a fixed FFT length, window and segment count
+    '''
+
+    def __init__(self, sample_rate_hz, fft_size=None, segments=1, window=WINDOW_HANN, interpolate=True, power_of_two=True):
+        '''
+        Parameters:
+            sample_rate_hz (float): The sample rate of the buffers in Hz
+            fft_size (int): The FFT length per segment, None for the fastest length that fits each buffer
+            segments (int): The number of 50% overlapping segments averaged (Welch), 1 for a single FFT
+            window (str): WINDOW_HANN or WINDOW_NONE
+            interpolate (bool): Refine the peak between bins
+            power_of_two (bool): With fft_size None, only use power of two lengths
+        '''
+        if segments < 1:
+            raise ValueError("segments must be at least 1")
+        self.sample_rate_hz = sample_rate_hz
+        self.fft_size = fft_size
+        self.segments = segments
+        self.window = window
+        self.interpolate = interpolate
+        self.power_of_two = power_of_two
+
+    def samples_needed(self, fft_size):
+        '''
+        Samples covered by the segments of fft_size
+        '''
+        return fft_size + (self.segments - 1) * (fft_size // 2)
+
+    def fft_size_for(self, n_samples):
+        '''
+        The FFT length used for a buffer of n_samples
+        '''
+        if self.fft_size is not None:
+            return min(self.fft_size, fast_fft_length(n_samples, self.power_of_two))
+        # Longest segment for which all segments fit in the buffer
+        segment = int(2 * n_samples / (self.segments + 1))
+        return fast_fft_length(segment, self.power_of_two)
+
+    def separates(self, spacing_hz, n_samples):
+        '''
+        Whether two tones spacing_hz apart fall outside each other's main lobe
+
+        Parameters:
+            spacing_hz (float): The tone spacing in Hz
+            n_samples (int): The samples per buffer
+        '''
+        return spacing_hz > 2 * WINDOW_MAIN_LOBE_BINS[self.window] * self.sample_rate_hz / self.fft_size_for(n_samples)
+
+    def summary(self, n_samples):
+        '''
+        Settings and resolution of the finder for buffers of n_samples
+
+        Returns:
+            summary (dict): fft_size, segments, window, interpolate, samples_used, bin_width_hz and resolution_hz
+        '''
+        fft_size = self.fft_size_for(n_samples)
+        bin_width = self.sample_rate_hz / fft_size
+        return {
+            'fft_size': fft_size,
+            'segments': self.segments,
+            'window': self.window,
+            'interpolate': self.interpolate,
+            'samples_used': min(self.samples_needed(fft_size), n_samples),
+            'bin_width_hz': bin_width,
+            'resolution_hz': WINDOW_ENBW_BINS[self.window] * bin_width,
+        }
+
+    def power_spectrum(self, samples):
+        '''
+        Power spectrum of a buffer, averaged over the segments that fit in it
+
+        Parameters:
+            samples (numpy array): The complex samples
+
+        Returns:
+            power (numpy array): The power of each bin (np.fft.fftfreq order)
+        '''
+        samples = np.ascontiguousarray(samples)
+        fft_size = self.fft_size_for(len(samples))
+        hop = fft_size // 2
+        segments = max(1, min(self.segments, (len(samples) - fft_size) // hop + 1))
+        frames = np.lib.stride_tricks.as_strided(samples, shape=(segments, fft_size), strides=(hop * samples.strides[0], samples.strides[0]))
+
+        spectrum = np.fft.fft(frames * spectrum_window(fft_size, self.window), axis=1)
+        power = spectrum.real ** 2
+        power += spectrum.imag ** 2
+        return power.mean(axis=0) if segments > 1 else power[0]
+
+    def find_peak(self, samples):
+        '''
+        Find the strongest tone of a buffer
+
+        Parameters:
+            samples (numpy array): The complex samples
+
+        Returns:
+            peak (dict): frequency_hz (relative to the LO), power, snr_db and bin_width_hz
+        '''
+        return self.peak_of(self.power_spectrum(samples))
+
+    def peak_of(self, power):
+        '''
+        Find the strongest tone of a power spectrum from power_spectrum (or an average of several)
+
+        Parameters:
+            power (numpy array): The power of each bin (np.fft.fftfreq order)
+
+        Returns:
+            peak (dict): frequency_hz (relative to the LO), power, snr_db (peak over the median bin) and bin_width_hz
+        '''
+        fft_size = len(power)
+        peak = int(np.argmax(power))
+        freqs = frequency_axis(fft_size, self.sample_rate_hz)
+        bin_width = self.sample_rate_hz / fft_size
+
+        frequency = freqs[peak]
+        if self.interpolate:
+            frequency += interpolate_peak(power, peak) * bin_width
+        snr_db = 10 * np.log10(power[peak] / max(np.median(power), np.finfo(np.float64).tiny))
+        return {'frequency_hz': float(frequency), 'power': float(power[peak]), 'snr_db': float(snr_db), 'bin_width_hz': bin_width}
+
+
+def buffer_size_for_resolution(resolution_hz, sample_rate_hz, window=WINDOW_HANN):
+    '''
+    Shortest power of two buffer whose FFT reaches the given resolution
+
+    Parameters:
+        resolution_hz (float): The resolution needed in Hz (equivalent noise bandwidth of a bin)
+        sample_rate_hz (float): The sample rate in Hz
+        window (str): The window used by the peak finder
+
+    Returns:
+        n_samples (int): The buffer size
+    '''
+    needed = int(np.ceil(WINDOW_ENBW_BINS[window] * sample_rate_hz / resolution_hz))
+    return 1 << max(needed - 1, 1).bit_length()
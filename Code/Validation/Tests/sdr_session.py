@@ -0,0 +1,113 @@
+'''
+Pluto SDR sessions shared by the RF tests.
+
+Each Pluto is opened once per process and handed out again to every later test
+(and self test retry), so the libiio context setup is paid once. Attribute writes
+go through the session and are only sent to the device when the value changed,
+and the Rx warm-up buffers are only discarded in full after the Rx settings changed.
+
+Usage:
+    sdr_rx = open_pluto("ip:192.168.2.2")
+    sdr_rx.rx_lo = int(2.405e9)     # skipped if already set to this value
+    sdr_rx.flush_rx(10)             # full flush only if something changed since the last one
+    samples = sdr_rx.rx()
+'''
+import threading
+
+from config import RF_SDR_SESSION_REUSE, RF_SDR_REUSE_FLUSH_BUFFERS
+from Validation.Tests.pluto_backend import Pluto
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_UNSET = object()
+
+
+class PlutoSession:
+    '''
+    Wraps a Pluto (adi.Pluto or the replay backend), forwarding every call and attribute to it, and remembers
+    the values written so a repeated write of the same value is skipped (reads are not cached).
+    '''
+
+    def __init__(self, uri):
+        '''
+        Parameters:
+            uri (str): The libiio URI of the Pluto (e.g. "ip:192.168.2.2")
+        '''
+        object.__setattr__(self, 'uri', uri)
+        object.__setattr__(self, '_sdr', Pluto(uri))
+        object.__setattr__(self, '_applied', {})
+        object.__setattr__(self, '_rx_changed', True)
+        object.__setattr__(self, 'writes_skipped', 0)
+
+    def __getattr__(self, name):
+        # Reads always come from the device, which may round a requested value (e.g. the sample rate)
+        return getattr(object.__getattribute__(self, '_sdr'), name)
+
+    def __setattr__(self, name, value):
+        if self._applied.get(name, _UNSET) == value:
+            object.__setattr__(self, 'writes_skipped', self.writes_skipped + 1)
+            return
+        if name == 'rx_buffer_size':
+            # The Rx buffer is created with its size on the first rx(), recreate it for the new size
+            self._sdr.rx_destroy_buffer()
+        setattr(self._sdr, name, value)
+        self._applied[name] = value
+        if not name.startswith('tx'):
+            object.__setattr__(self, '_rx_changed', True)
+
+    def flush_rx(self, buffers):
+        '''
+        Discard stale Rx buffers: all of them after the Rx settings changed (or on first use),
+        otherwise only RF_SDR_REUSE_FLUSH_BUFFERS (the samples queued since the last test)
+
+        Parameters:
+            buffers (int): The number of buffers discarded after a change
+
+        Returns:
+            flushed (int): The number of buffers discarded
+        '''
+        flushed = buffers if self._rx_changed else min(buffers, RF_SDR_REUSE_FLUSH_BUFFERS)
+        for _ in range(flushed):
+            self._sdr.rx()
+        object.__setattr__(self, '_rx_changed', False)
+        return flushed
+
+
+def open_pluto(uri):
+    '''
+    The session of a Pluto, connecting to it on first use (or every time without RF_SDR_SESSION_REUSE)
+
+    Parameters:
+        uri (str): The libiio URI of the Pluto
+
+    Returns:
+        session (PlutoSession): The session, used like an adi.Pluto
+
+    Raises:
+        OSError: The Pluto could not be reached
+    '''
+    if not RF_SDR_SESSION_REUSE:
+        return PlutoSession(uri)
+    with _sessions_lock:
+        if uri not in _sessions:
+            _sessions[uri] = PlutoSession(uri)
+        return _sessions[uri]
+
+
+def close_pluto(uri):
+    '''
+    Forget the session of a Pluto (after an error), the next open_pluto reconnects
+
+    Parameters:
+        uri (str): The libiio URI of the Pluto
+    '''
+    with _sessions_lock:
+        _sessions.pop(uri, None)
+
+
+def close_all_plutos():
+    '''
+    Forget every session
+    '''
+    with _sessions_lock:
+        _sessions.clear()
@@ -1,7 +1,8 @@
 import serial
 import serial.tools.list_ports
 import time
-from config import SCUM_SERIAL_COM_PORT
+from config import SCUM_SERIAL_COM_PORT, SCUM_UART_TX_PIN, UART_LOGIC_SAMPLE_RATE_HZ, UART_LOGIC_CAPTURE_SAMPLES
+from Validation.Tests.protocol_decoders import UartDecoder, decode_bit_planes
 
 # List of common baud rates to test
 COMMON_BAUD_RATES = [
@@ -89,5 +90,39 @@ def find_best_baud_rate(port=SCUM_SERIAL_COM_PORT):
 
     return test_results
 
+def find_baud_rate_from_logic(device_data, pin=SCUM_UART_TX_PIN):
+    """
+    Capture SCuM's UART TX line with the logic analyzer and detect the baud rate from the decoded traffic.
+
+    Parameters:
+        device_data (object): The device data object for the logic analyzer.
+        pin (int): The logic analyzer pin wired to SCuM's UART TX.
+
+    Returns:
+        test_results (list): A single sub-test result with the detected baud rate, decoded frames and capture waits.
+    """
+    # Only loads libdwf when the logic analyzer is used
+    from Validation.Tests.digital_test import capture_logic_bus, split_bit_planes, logic
+    from Validation.Tests.helpers import collect_acquisition_waits, acquisition_wait_summary
+
+    with collect_acquisition_waits() as waits:
+        words = capture_logic_bus(device_data, buffer_size=UART_LOGIC_CAPTURE_SAMPLES, sampling_frequency=UART_LOGIC_SAMPLE_RATE_HZ)
+    logic.close(device_data)
+
+    decoder = UartDecoder(pin, UART_LOGIC_SAMPLE_RATE_HZ)
+    frames = decode_bit_planes([decoder], split_bit_planes(words, n_pins=pin + 1))[0]
+    framing_errors = sum(frame['framing_error'] for frame in frames)
+    baud_found = decoder.baud_rate is not None and len(frames) > 0 and framing_errors == 0
+
+    print(f"Detected baud rate: {decoder.baud_rate}, {len(frames)} frames, {framing_errors} framing errors\n")
+
+    values = [
+        {'name': "Detected Baud Rate (bps)", 'value': decoder.baud_rate},
+        {'name': "Decoded Frames", 'value': len(frames)},
+        {'name': "Framing Errors", 'value': framing_errors},
+        {'name': "Decoded Data", 'value': bytes(frame['data'] for frame in frames[:32]).decode('ascii', errors='replace')},
+    ] + acquisition_wait_summary(waits)
+    return [{ 'sub-test': 'Find Baud rate from logic capture', 'pass': baud_found, 'values': values }]
+
 if __name__ == "__main__":
     result = find_best_baud_rate(port=PORT)
@@ -0,0 +1,1063 @@
+'''
+Simulated WaveForms backend (libdwf + WF_SDK) for running and benchmarking
+the tests on a machine without Digilent hardware.
+
+The simulation is driven by a SimulatedScene describing what the instruments see:
+- analog sources behind each Pico mux input (DC levels, clocks with ppm error and noise)
+- logic signals on each DIO pin (clocks, bitstreams, trigger pulses)
+- the AD2 wavegen, looped back to the scope through the mux (or to the scope channels that have no mux route)
+
+In real-time mode an acquisition takes n_samples / sample_rate of wall time and a
+triggered logic capture completes only after the trigger edge, so acquisition
+waits and the trigger handshake behave as they do on the bench.
+
+Select it with SCUM_DWF_BACKEND=sim (see dwf_backend.py).
+'''
+import re
+import threading
+import time
+from ctypes import *
+
+import numpy as np
+
+from Validation.Tests.simulated_dwfconstants import *
+
+# Pico mux prefixes of the scope channels and the wavegen ("<prefix>_<input>" commands)
+SCOPE_MUX_PREFIX = {1: 1, 2: 0}
+WAVEGEN_MUX_PREFIX = 2
+MUX_DISABLE_INPUT = 32
+MUX_ENABLE_INPUT = 33
+
+# Simulated device models
+DEVICE_MODELS = {
+    'analogdiscovery2': {'name': 'Analog Discovery 2', 'devid': 3, 'digital_clock_hz': 100e6, 'analog_buffer_max': 16384, 'digital_buffer_max': 16384, 'serial': 'SIMAD2000001'},
+    'digitaldiscovery': {'name': 'Digital Discovery', 'devid': 4, 'digital_clock_hz': 800e6, 'analog_buffer_max': 0, 'digital_buffer_max': 262144, 'serial': 'SIMDD0000001'},
+}
+
+
+##################
+# Signal models
+##################
+
+class DCLevel:
+    '''
+    Constant voltage with optional gaussian noise
+    '''
+    def __init__(self, level, noise_v=0.0):
+        self.level = level
+        self.noise_v = noise_v
+
+    def sample(self, t, rng):
+        values = np.full(len(t), float(self.level))
+        if self.noise_v:
+            values += rng.normal(0, self.noise_v, len(t))
+        return values
+
+
+class ClockSignal:
+    '''
+    Square or sine clock with a frequency error in ppm, gaussian noise and
+    a first-order analog bandwidth limit (square clocks reach the scope with RC edges,
+    their harmonics rolled off as on the scope input instead of cut at its bandwidth)
+    '''
+    def __init__(self, frequency_hz, ppm_error=0.0, low=0.0, high=1.8, duty=0.5, shape='square', noise_v=0.0, phase=0.0, bandwidth_hz=30e6):
+        self.frequency_hz = frequency_hz
+        self.ppm_error = ppm_error
+        self.low = low
+        self.high = high
+        self.duty = duty
+        self.shape = shape
+        self.noise_v = noise_v
+        self.phase = phase
+        self.bandwidth_hz = bandwidth_hz
+
+    @property
+    def actual_frequency_hz(self):
+        return self.frequency_hz * (1 + self.ppm_error * 1e-6)
+
+    def sample(self, t, rng):
+        cycles = self.actual_frequency_hz * t + self.phase
+        swing = self.high - self.low
+
+        if self.shape == 'sine':
+            level = 0.5 * (1 + np.sin(2 * np.pi * cycles))
+        else:
+            # Periodic steady state of the pulse train through an RC low-pass at the analog bandwidth
+            tau_periods = self.actual_frequency_hz / (2 * np.pi * self.bandwidth_hz)
+            high_decay = np.exp(-self.duty / tau_periods)
+            low_decay = np.exp(-(1 - self.duty) / tau_periods)
+            rise_start = low_decay * (1 - high_decay) / (1 - high_decay * low_decay)
+            fall_start = 1 - (1 - rise_start) * high_decay
+            phase = np.mod(cycles, 1.0)
+            level = np.where(phase < self.duty,
+                             1 - (1 - rise_start) * np.exp(-phase / tau_periods),
+                             fall_start * np.exp(-np.maximum(phase - self.duty, 0) / tau_periods))
+
+        values = self.low + swing * level
+        if self.noise_v:
+            values += rng.normal(0, self.noise_v, len(t))
+        return values
+
+
+class LogicLevel:
+    '''
+    Constant logic level
+    '''
+    def __init__(self, level=0):
+        self.level = level
+
+    def sample(self, t):
+        return np.full(len(t), self.level, dtype=np.uint8)
+
+    def next_rising_edge(self, t):
+        return None
+
+
+class LogicClock:
+    '''
+    Logic clock with a duty cycle
+    '''
+    def __init__(self, frequency_hz, duty=0.5, phase=0.0):
+        self.frequency_hz = frequency_hz
+        self.duty = duty
+        self.phase = phase
+
+    def sample(self, t):
+        return (np.mod(self.frequency_hz * t + self.phase, 1.0) < self.duty).astype(np.uint8)
+
+    def next_rising_edge(self, t):
+        return (np.floor(self.frequency_hz * t + self.phase) + 1 - self.phase) / self.frequency_hz
+
+
+class LogicBitstream:
+    '''
+    Bitstream clocked out at a fixed bit rate, idle outside of the stream unless repeated
+    '''
+    def __init__(self, bits, bit_rate_hz, idle=1, start_s=0.0, repeat=True):
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.bit_rate_hz = bit_rate_hz
+        self.idle = idle
+        self.start_s = start_s
+        self.repeat = repeat
+
+        # Bit indices where the stream goes from low to high (including the wrap around when repeating)
+        previous = np.roll(self.bits, 1)
+        previous[0] = self.bits[-1] if repeat else idle
+        self._rising = np.flatnonzero((previous == 0) & (self.bits == 1))
+
+    def sample(self, t):
+        index = np.floor((t - self.start_s) * self.bit_rate_hz).astype(np.int64)
+        if self.repeat:
+            return self.bits[np.mod(index, len(self.bits))]
+        inside = (index >= 0) & (index < len(self.bits))
+        values = np.full(len(t), self.idle, dtype=np.uint8)
+        values[inside] = self.bits[index[inside]]
+        return values
+
+    def next_rising_edge(self, t):
+        if len(self._rising) == 0:
+            return None
+        position = (t - self.start_s) * self.bit_rate_hz
+        period = len(self.bits)
+        block = np.floor(position / period) if self.repeat else 0
+        for offset in (0, 1):
+            candidates = (block + offset) * period + self._rising
+            candidates = candidates[candidates > position]
+            if len(candidates):
+                return self.start_s + candidates[0] / self.bit_rate_hz
+            if not self.repeat:
+                return None
+        return None
+
+
+class TriggerPulses:
+    '''
+    Periodic trigger pulses, as raised by the SCuM firmware between test phases
+    '''
+    def __init__(self, period_s, width_s=1e-3, start_s=0.0):
+        self.period_s = period_s
+        self.width_s = width_s
+        self.start_s = start_s
+
+    def sample(self, t):
+        return (np.mod(t - self.start_s, self.period_s) < self.width_s).astype(np.uint8)
+
+    def next_rising_edge(self, t):
+        return self.start_s + (np.floor((t - self.start_s) / self.period_s) + 1) * self.period_s
+
+
+def uart_bits(payload, idle_bits=10):
+    '''
+    Build the 8N1 UART line levels for a payload
+
+    Parameters:
+        payload (bytes): The bytes to send
+        idle_bits (int): Idle (high) bits between frames
+
+    Returns:
+        bits (numpy array): The line level per bit period
+    '''
+    frames = []
+    for byte in payload:
+        frames.append([0] + [(byte >> i) & 1 for i in range(8)] + [1] + [1] * idle_bits)
+    return np.concatenate(frames).astype(np.uint8)
+
+
+##################
+# Scene
+##################
+
+class SimulatedScene:
+    '''
+    Signals seen by the simulated instruments
+    '''
+    def __init__(self, realtime=True, seed=0):
+        self.mux_sources = {}    # Pico mux input -> analog signal
+        self.scope_inputs = {}   # scope channel -> analog signal (bypasses the mux)
+        self.logic_pins = {}     # DIO pin -> logic signal
+        self.mux_routes = {}     # mux prefix -> selected input
+        self.wavegen = {}        # wavegen channel -> analog signal
+        self.scope_gain = {}     # scope channel -> front-end gain error (measured = gain * true + offset)
+        self.scope_offset = {}   # scope channel -> front-end offset error in volts
+        self.realtime = realtime
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._virtual_time = 0.0
+
+    def now(self):
+        '''
+        Current scene time in seconds
+        '''
+        if self.realtime:
+            return time.perf_counter() - self._t0
+        return self._virtual_time
+
+    def advance_to(self, t):
+        '''
+        Move the virtual clock forward (no effect in real-time mode)
+        '''
+        if not self.realtime:
+            self._virtual_time = max(self._virtual_time, t)
+
+    def route(self, prefix, mux_input):
+        '''
+        Apply a Pico mux command
+        '''
+        if prefix == WAVEGEN_MUX_PREFIX and mux_input in self.mux_sources:
+            raise RuntimeError(f"Wavegen routed onto mux input {mux_input}, which is driven by the chip")
+        if mux_input == MUX_DISABLE_INPUT:
+            self.mux_routes.pop(prefix, None)
+        elif mux_input != MUX_ENABLE_INPUT:
+            self.mux_routes[prefix] = mux_input
+
+    def analog_source(self, channel):
+        '''
+        Resolve the signal seen by a scope channel
+        '''
+        if channel in self.scope_inputs:
+            return self.scope_inputs[channel]
+
+        mux_input = self.mux_routes.get(SCOPE_MUX_PREFIX.get(channel))
+        if mux_input is not None:
+            # Wavegen looped back through the same mux input
+            if self.mux_routes.get(WAVEGEN_MUX_PREFIX) == mux_input and 1 in self.wavegen:
+                return self.wavegen[1]
+            if mux_input in self.mux_sources:
+                return self.mux_sources[mux_input]
+        elif 1 in self.wavegen:
+            return self.wavegen[1]
+
+        return DCLevel(0.0, noise_v=1e-3)
+
+    def scope_samples(self, channel, t):
+        with self.lock:
+            values = self.analog_source(channel).sample(t, self.rng)
+        return self.scope_gain.get(channel, 1.0) * values + self.scope_offset.get(channel, 0.0)
+
+    def logic_words(self, t, n_pins=32):
+        '''
+        Sample every DIO pin, packed into one word per sample (bit n = DIO n)
+        '''
+        words = np.zeros(len(t), dtype=np.uint32)
+        for pin, signal in self.logic_pins.items():
+            if pin < n_pins:
+                words |= signal.sample(t).astype(np.uint32) << np.uint32(pin)
+        return words
+
+    def next_rising_edge(self, pin_mask, t):
+        '''
+        Time of the first rising edge after t on any pin in pin_mask, None if there is none
+        '''
+        edges = []
+        for pin, signal in self.logic_pins.items():
+            if pin_mask & (1 << pin):
+                edge = signal.next_rising_edge(t)
+                if edge is not None:
+                    edges.append(edge)
+        return min(edges) if edges else None
+
+
+def default_scene(realtime=True):
+    '''
+    Scene matching the template configuration: references on mux inputs 28/27,
+    20 MHz clocks on mux inputs 5/15, a clock on each DIO pin, trigger pulses on DIO 1
+    and a small offset/gain error on each scope channel
+    '''
+    scene = SimulatedScene(realtime=realtime)
+    scene.mux_sources[28] = DCLevel(1.1, noise_v=2e-3)
+    scene.mux_sources[27] = DCLevel(1.8, noise_v=2e-3)
+    scene.mux_sources[5] = ClockSignal(20e6, ppm_error=5, noise_v=5e-3)
+    scene.mux_sources[15] = ClockSignal(20e6, ppm_error=-8, noise_v=5e-3)
+    scene.scope_gain = {1: 1.012, 2: 0.994}
+    scene.scope_offset = {1: 0.006, 2: -0.011}
+    for pin in range(16):
+        scene.logic_pins[pin] = LogicClock(1e6 / (pin + 1))
+    scene.logic_pins[1] = TriggerPulses(period_s=0.05)
+    return scene
+
+
+class SimulatedPico:
+    '''
+    Stand-in for the Pico serial port, applies mux commands to the scene
+    '''
+    def __init__(self, scene):
+        self.scene = scene
+        self.is_open = True
+        self.commands = []
+
+    def write(self, data):
+        for line in data.decode('ascii').split():
+            match = re.fullmatch(r'(\d+)_(\d+)', line)
+            if match:
+                self.commands.append(line)
+                self.scene.route(int(match.group(1)), int(match.group(2)))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def readline(self):
+        return b''
+
+    def close(self):
+        self.is_open = False
+
+
+##################
+# Simulated libdwf
+##################
+
+def _value(arg):
+    '''
+    Value of a ctypes scalar or a plain Python number
+    '''
+    return arg.value if hasattr(arg, 'value') else arg
+
+
+def _address(arg):
+    '''
+    Address behind a ctypes array or byref() pointer
+    '''
+    if isinstance(arg, Array):
+        return addressof(arg)
+    return cast(arg, c_void_p).value
+
+
+def _write_scalar(arg, ctype, value):
+    '''
+    Write a scalar through a byref() pointer, ignored for NULL
+    '''
+    if arg is None or isinstance(arg, int) or _value(arg) is None:
+        return
+    ctype.from_address(_address(arg)).value = value
+
+
+def _write_array(arg, values, ctype=c_double):
+    '''
+    Copy an array into a ctypes buffer or byref() pointer
+    '''
+    if arg is None or len(values) == 0:
+        return
+    buffer = (ctype * len(values)).from_address(_address(arg))
+    np.ctypeslib.as_array(buffer)[:] = values
+
+
+class _AnalogIn:
+    def __init__(self, buffer_max):
+        self.buffer_max = buffer_max
+        self.reset()
+
+    def reset(self):
+        self.frequency = 20e6
+        self.buffer_size = min(8192, self.buffer_max)
+        self.channels = {0, 1}
+        self.mode = 0
+        self.record_length = 0.0
+        self.start = None
+        self.data = {}
+        self.record_produced = 0
+        self.record_consumed = 0
+        self.record_block = {}
+
+
+class _DigitalIn:
+    def __init__(self, clock_hz, buffer_max):
+        self.clock_hz = clock_hz
+        self.buffer_max = buffer_max
+        self.reset()
+
+    def reset(self):
+        self.divider = 1
+        self.buffer_size = min(4096, self.buffer_max)
+        self.sample_format = 16
+        self.trigger_source = 0
+        self.trigger_rise = 0
+        self.trigger_position = self.buffer_size
+        self.auto_timeout = 0.0
+        self.armed_at = None
+        self.trigger_time = None
+        self.data = None
+        self.mode = 0
+        self.record_consumed = 0
+
+    @property
+    def frequency(self):
+        return self.clock_hz / self.divider
+
+
+class _SimulatedDevice:
+    def __init__(self, handle, model):
+        self.handle = handle
+        self.model = model
+        self.analog_in = _AnalogIn(model['analog_buffer_max'])
+        self.digital_in = _DigitalIn(model['digital_clock_hz'], model['digital_buffer_max'])
+
+
+class SimulatedDwf:
+    '''
+    Pure-Python stand-in for the libdwf functions used by the tests.
+    Calls that only configure the hardware (and are not modelled) succeed as no-ops.
+    '''
+    def __init__(self, scene):
+        self.scene = scene
+        self.devices = {}
+        self._next_handle = 1
+        self._enumerated = list(DEVICE_MODELS.values())
+
+    def __getattr__(self, name):
+        if name.startswith('FDwf'):
+            return lambda *args: 1
+        raise AttributeError(name)
+
+    def open_device(self, name):
+        key = re.sub(r'[^a-z0-9]', '', name.lower()) or 'analogdiscovery2'
+        model = DEVICE_MODELS.get(key, DEVICE_MODELS['analogdiscovery2'])
+        handle = self._next_handle
+        self._next_handle += 1
+        self.devices[handle] = _SimulatedDevice(handle, model)
+        return handle
+
+    def _device(self, hdwf):
+        return self.devices[_value(hdwf)]
+
+    # Errors and enumeration
+
+    def FDwfGetLastError(self, perror):
+        _write_scalar(perror, c_int, 0)
+        return 1
+
+    def FDwfGetLastErrorMsg(self, message):
+        return 1
+
+    def FDwfEnum(self, enumfilter, pcount):
+        _write_scalar(pcount, c_int, len(self._enumerated))
+        return 1
+
+    def FDwfEnumDeviceName(self, index, name):
+        name.value = self._enumerated[_value(index)]['name'].encode()
+        return 1
+
+    def FDwfEnumSN(self, index, serial):
+        serial.value = ('SN:' + self._enumerated[_value(index)]['serial']).encode()
+        return 1
+
+    def FDwfEnumDeviceType(self, index, pdevid, pdevver):
+        _write_scalar(pdevid, c_int, self._enumerated[_value(index)]['devid'])
+        _write_scalar(pdevver, c_int, 0)
+        return 1
+
+    # Device
+
+    def FDwfDeviceOpen(self, index, phdwf):
+        model = self._enumerated[max(0, _value(index))]
+        _write_scalar(phdwf, c_int, self.open_device(model['name']))
+        return 1
+
+    def FDwfDeviceConfigOpen(self, index, config, phdwf):
+        return self.FDwfDeviceOpen(index, phdwf)
+
+    def FDwfDeviceClose(self, hdwf):
+        self.devices.pop(_value(hdwf), None)
+        return 1
+
+    def FDwfDeviceCloseAll(self):
+        self.devices.clear()
+        return 1
+
+    # Analog in
+
+    def FDwfAnalogInReset(self, hdwf):
+        self._device(hdwf).analog_in.reset()
+        return 1
+
+    def FDwfAnalogInBufferSizeInfo(self, hdwf, pmin, pmax):
+        _write_scalar(pmin, c_int, 16)
+        _write_scalar(pmax, c_int, self._device(hdwf).analog_in.buffer_max)
+        return 1
+
+    def FDwfAnalogInBufferSizeSet(self, hdwf, size):
+        analog_in = self._device(hdwf).analog_in
+        analog_in.buffer_size = max(16, min(int(_value(size)), analog_in.buffer_max))
+        return 1
+
+    def FDwfAnalogInBufferSizeGet(self, hdwf, psize):
+        _write_scalar(psize, c_int, self._device(hdwf).analog_in.buffer_size)
+        return 1
+
+    def FDwfAnalogInFrequencySet(self, hdwf, frequency):
+        self._device(hdwf).analog_in.frequency = min(float(_value(frequency)), 100e6)
+        return 1
+
+    def FDwfAnalogInFrequencyGet(self, hdwf, pfrequency):
+        _write_scalar(pfrequency, c_double, self._device(hdwf).analog_in.frequency)
+        return 1
+
+    def FDwfAnalogInChannelCount(self, hdwf, pcount):
+        _write_scalar(pcount, c_int, 2)
+        return 1
+
+    def FDwfAnalogInChannelEnableSet(self, hdwf, channel, enable):
+        analog_in = self._device(hdwf).analog_in
+        channels = {0, 1} if _value(channel) < 0 else {_value(channel)}
+        if _value(enable):
+            analog_in.channels |= channels
+        else:
+            analog_in.channels -= channels
+        return 1
+
+    def FDwfAnalogInAcquisitionModeSet(self, hdwf, mode):
+        self._device(hdwf).analog_in.mode = _value(mode)
+        return 1
+
+    def FDwfAnalogInRecordLengthSet(self, hdwf, length):
+        self._device(hdwf).analog_in.record_length = float(_value(length))
+        return 1
+
+    def FDwfAnalogInConfigure(self, hdwf, reconfigure, start):
+        analog_in = self._device(hdwf).analog_in
+        if _value(start):
+            analog_in.start = self.scene.now()
+            analog_in.data = {}
+            analog_in.record_produced = 0
+            analog_in.record_consumed = 0
+        return 1
+
+    def _analog_times(self, analog_in, first, count):
+        return analog_in.start + np.arange(first, first + count) / analog_in.frequency
+
+    def FDwfAnalogInStatus(self, hdwf, read_data, psts):
+        analog_in = self._device(hdwf).analog_in
+        if analog_in.start is None:
+            _write_scalar(psts, c_ubyte, DwfStateReady.value)
+            return 1
+
+        if analog_in.mode == acqmodeRecord.value:
+            total = int(analog_in.record_length * analog_in.frequency) if analog_in.record_length > 0 else np.iinfo(np.int64).max
+            if self.scene.realtime:
+                produced = int((self.scene.now() - analog_in.start) * analog_in.frequency)
+            else:
+                produced = analog_in.record_produced + analog_in.buffer_size
+            produced = min(produced, total)
+            self.scene.advance_to(analog_in.start + produced / analog_in.frequency)
+
+            if _value(read_data):
+                first = analog_in.record_consumed
+                times = self._analog_times(analog_in, first, produced - first)
+                analog_in.record_block = {ch: self.scene.scope_samples(ch + 1, times) for ch in analog_in.channels}
+                analog_in.record_consumed = produced
+            analog_in.record_produced = produced
+            _write_scalar(psts, c_ubyte, DwfStateDone.value if produced >= total else DwfStateRunning.value)
+            return 1
+
+        # Single acquisition, done once the buffer has been filled
+        fill_end = analog_in.start + analog_in.buffer_size / analog_in.frequency
+        if self.scene.realtime and self.scene.now() < fill_end:
+            _write_scalar(psts, c_ubyte, DwfStateTriggered.value)
+            return 1
+        self.scene.advance_to(fill_end)
+
+        if _value(read_data) and not analog_in.data:
+            times = self._analog_times(analog_in, 0, analog_in.buffer_size)
+            analog_in.data = {ch: self.scene.scope_samples(ch + 1, times) for ch in analog_in.channels}
+        _write_scalar(psts, c_ubyte, DwfStateDone.value)
+        return 1
+
+    def FDwfAnalogInStatusData(self, hdwf, channel, buffer, count):
+        return self.FDwfAnalogInStatusData2(hdwf, channel, buffer, 0, count)
+
+    def FDwfAnalogInStatusData2(self, hdwf, channel, buffer, first, count):
+        analog_in = self._device(hdwf).analog_in
+        source = analog_in.record_block if analog_in.mode == acqmodeRecord.value else analog_in.data
+        samples = source.get(_value(channel))
+        if samples is None:
+            samples = np.zeros(analog_in.buffer_size)
+        first, count = int(_value(first)), int(_value(count))
+        _write_array(buffer, samples[first:first + count])
+        return 1
+
+    def FDwfAnalogInStatusRecord(self, hdwf, pavailable, plost, pcorrupted):
+        analog_in = self._device(hdwf).analog_in
+        available = len(next(iter(analog_in.record_block.values()), []))
+        _write_scalar(pavailable, c_int, available)
+        _write_scalar(plost, c_int, 0)
+        _write_scalar(pcorrupted, c_int, 0)
+        return 1
+
+    def FDwfAnalogInStatusSample(self, hdwf, channel, pvoltage):
+        sample = self.scene.scope_samples(_value(channel) + 1, np.array([self.scene.now()]))
+        _write_scalar(pvoltage, c_double, float(sample[0]))
+        return 1
+
+    # Analog out (wavegen), only the carrier node is modelled
+
+    def _wavegen_settings(self, hdwf, channel):
+        device = self._device(hdwf)
+        if not hasattr(device, 'wavegen_settings'):
+            device.wavegen_settings = {}
+        return device.wavegen_settings.setdefault(_value(channel), {'function': funcDC.value, 'frequency': 1e3, 'amplitude': 1.0, 'offset': 0.0, 'symmetry': 50.0})
+
+    def FDwfAnalogOutNodeFunctionSet(self, hdwf, channel, node, function):
+        self._wavegen_settings(hdwf, channel)['function'] = _value(function)
+        return 1
+
+    def FDwfAnalogOutNodeFrequencySet(self, hdwf, channel, node, frequency):
+        self._wavegen_settings(hdwf, channel)['frequency'] = float(_value(frequency))
+        return 1
+
+    def FDwfAnalogOutNodeAmplitudeSet(self, hdwf, channel, node, amplitude):
+        self._wavegen_settings(hdwf, channel)['amplitude'] = float(_value(amplitude))
+        return 1
+
+    def FDwfAnalogOutNodeOffsetSet(self, hdwf, channel, node, offset):
+        self._wavegen_settings(hdwf, channel)['offset'] = float(_value(offset))
+        return 1
+
+    def FDwfAnalogOutNodeSymmetrySet(self, hdwf, channel, node, symmetry):
+        self._wavegen_settings(hdwf, channel)['symmetry'] = float(_value(symmetry))
+        return 1
+
+    def FDwfAnalogOutConfigure(self, hdwf, channel, start):
+        settings = self._wavegen_settings(hdwf, channel)
+        wavegen_channel = _value(channel) + 1
+        if not _value(start):
+            self.scene.wavegen.pop(wavegen_channel, None)
+            return 1
+
+        low = settings['offset'] - settings['amplitude']
+        high = settings['offset'] + settings['amplitude']
+        if settings['function'] == funcDC.value:
+            signal = DCLevel(settings['offset'], noise_v=1e-3)
+        elif settings['function'] == funcSine.value:
+            signal = ClockSignal(settings['frequency'], low=low, high=high, shape='sine', noise_v=1e-3)
+        else:
+            signal = ClockSignal(settings['frequency'], low=low, high=high, duty=settings['symmetry'] / 100, noise_v=1e-3)
+        with self.scene.lock:
+            self.scene.wavegen[wavegen_channel] = signal
+        return 1
+
+    def FDwfAnalogOutReset(self, hdwf, channel):
+        if _value(channel) < 0:
+            self.scene.wavegen.clear()
+        else:
+            self.scene.wavegen.pop(_value(channel) + 1, None)
+        return 1
+
+    # Digital in
+
+    def FDwfDigitalInReset(self, hdwf):
+        self._device(hdwf).digital_in.reset()
+        return 1
+
+    def FDwfDigitalInInternalClockInfo(self, hdwf, pfrequency):
+        _write_scalar(pfrequency, c_double, self._device(hdwf).digital_in.clock_hz)
+        return 1
+
+    def FDwfDigitalInDividerSet(self, hdwf, divider):
+        self._device(hdwf).digital_in.divider = max(1, int(_value(divider)))
+        return 1
+
+    def FDwfDigitalInDividerGet(self, hdwf, pdivider):
+        _write_scalar(pdivider, c_uint, self._device(hdwf).digital_in.divider)
+        return 1
+
+    def FDwfDigitalInBufferSizeInfo(self, hdwf, pmax):
+        _write_scalar(pmax, c_int, self._device(hdwf).digital_in.buffer_max)
+        return 1
+
+    def FDwfDigitalInBufferSizeSet(self, hdwf, size):
+        digital_in = self._device(hdwf).digital_in
+        digital_in.buffer_size = max(1, min(int(_value(size)), digital_in.buffer_max))
+        return 1
+
+    def FDwfDigitalInBufferSizeGet(self, hdwf, psize):
+        _write_scalar(psize, c_int, self._device(hdwf).digital_in.buffer_size)
+        return 1
+
+    def FDwfDigitalInSampleFormatSet(self, hdwf, bits):
+        self._device(hdwf).digital_in.sample_format = int(_value(bits))
+        return 1
+
+    def FDwfDigitalInTriggerSourceSet(self, hdwf, source):
+        self._device(hdwf).digital_in.trigger_source = _value(source)
+        return 1
+
+    def FDwfDigitalInTriggerSet(self, hdwf, level_low, level_high, edge_rise, edge_fall):
+        self._device(hdwf).digital_in.trigger_rise = int(_value(edge_rise))
+        return 1
+
+    def FDwfDigitalInTriggerPositionSet(self, hdwf, samples_after_trigger):
+        self._device(hdwf).digital_in.trigger_position = int(_value(samples_after_trigger))
+        return 1
+
+    def FDwfDigitalInTriggerAutoTimeoutSet(self, hdwf, timeout):
+        self._device(hdwf).digital_in.auto_timeout = float(_value(timeout))
+        return 1
+
+    def FDwfDigitalInConfigure(self, hdwf, reconfigure, start):
+        digital_in = self._device(hdwf).digital_in
+        if _value(start):
+            digital_in.armed_at = self.scene.now()
+            digital_in.data = None
+            digital_in.trigger_time = None
+            digital_in.record_consumed = 0
+            if digital_in.trigger_source == trigsrcDetectorDigitalIn.value and digital_in.trigger_rise:
+                # Samples before the trigger are needed before the instrument can arm
+                pre_trigger = max(0, digital_in.buffer_size - digital_in.trigger_position) / digital_in.frequency
+                edge = self.scene.next_rising_edge(digital_in.trigger_rise, digital_in.armed_at + pre_trigger)
+                if edge is None and digital_in.auto_timeout > 0:
+                    edge = digital_in.armed_at + digital_in.auto_timeout
+                digital_in.trigger_time = edge
+            else:
+                digital_in.trigger_time = digital_in.armed_at
+        return 1
+
+    def FDwfDigitalInAcquisitionModeSet(self, hdwf, mode):
+        self._device(hdwf).digital_in.mode = _value(mode)
+        return 1
+
+    def FDwfDigitalInStatus(self, hdwf, read_data, psts):
+        digital_in = self._device(hdwf).digital_in
+        if digital_in.armed_at is None:
+            _write_scalar(psts, c_ubyte, DwfStateReady.value)
+            return 1
+        if digital_in.mode == acqmodeRecord.value:
+            return self._digital_record_status(digital_in, read_data, psts)
+        if digital_in.trigger_time is None:
+            _write_scalar(psts, c_ubyte, DwfStateArmed.value)
+            return 1
+
+        post_trigger = min(digital_in.trigger_position, digital_in.buffer_size)
+        done_at = digital_in.trigger_time + post_trigger / digital_in.frequency
+        if self.scene.realtime and self.scene.now() < done_at:
+            armed = self.scene.now() < digital_in.trigger_time
+            _write_scalar(psts, c_ubyte, DwfStateArmed.value if armed else DwfStateTriggered.value)
+            return 1
+        self.scene.advance_to(done_at)
+
+        if _value(read_data) and digital_in.data is None:
+            first = digital_in.trigger_time - (digital_in.buffer_size - post_trigger) / digital_in.frequency
+            times = first + np.arange(digital_in.buffer_size) / digital_in.frequency
+            digital_in.data = self.scene.logic_words(times)
+        _write_scalar(psts, c_ubyte, DwfStateDone.value)
+        return 1
+
+    def _digital_record_status(self, digital_in, read_data, psts):
+        '''
+        Record mode, untriggered and unlimited: every status read returns the samples since the last one
+        '''
+        if self.scene.realtime:
+            produced = int((self.scene.now() - digital_in.armed_at) * digital_in.frequency)
+        else:
+            produced = digital_in.record_consumed + digital_in.buffer_size
+            self.scene.advance_to(digital_in.armed_at + produced / digital_in.frequency)
+
+        if _value(read_data):
+            first = digital_in.record_consumed
+            times = digital_in.armed_at + np.arange(first, produced) / digital_in.frequency
+            digital_in.data = self.scene.logic_words(times)
+            digital_in.record_consumed = produced
+        _write_scalar(psts, c_ubyte, DwfStateRunning.value)
+        return 1
+
+    def FDwfDigitalInStatusRecord(self, hdwf, pavailable, plost, pcorrupted):
+        digital_in = self._device(hdwf).digital_in
+        _write_scalar(pavailable, c_int, 0 if digital_in.data is None else len(digital_in.data))
+        _write_scalar(plost, c_int, 0)
+        _write_scalar(pcorrupted, c_int, 0)
+        return 1
+
+    def FDwfDigitalInStatusSamplesValid(self, hdwf, pvalid):
+        digital_in = self._device(hdwf).digital_in
+        _write_scalar(pvalid, c_int, 0 if digital_in.data is None else len(digital_in.data))
+        return 1
+
+    def FDwfDigitalInStatusData(self, hdwf, buffer, count_bytes):
+        digital_in = self._device(hdwf).digital_in
+        word_type = {8: (np.uint8, c_ubyte), 16: (np.uint16, c_uint16), 32: (np.uint32, c_uint32)}[digital_in.sample_format]
+        count = int(_value(count_bytes)) // (digital_in.sample_format // 8)
+        words = digital_in.data if digital_in.data is not None else np.zeros(digital_in.buffer_size, dtype=np.uint32)
+        _write_array(buffer, words[:count].astype(word_type[0]), word_type[1])
+        return 1
+
+    # Spectrum
+
+    def FDwfSpectrumWindow(self, window, count, window_type, beta, penbw):
+        n = int(_value(count))
+        x = np.arange(n) / max(n - 1, 1)
+        if _value(window_type) == DwfWindowFlatTop.value:
+            coefficients = [0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368]
+            values = sum((-1)**k * a * np.cos(2 * np.pi * k * x) for k, a in enumerate(coefficients))
+        elif _value(window_type) == DwfWindowHann.value:
+            values = 0.5 - 0.5 * np.cos(2 * np.pi * x)
+        else:
+            values = np.ones(n)
+        _write_array(window, values)
+        _write_scalar(penbw, c_double, float(n * np.sum(values**2) / np.sum(values)**2))
+        return 1
+
+    def FDwfSpectrumFFT(self, data, count, bins, phase, n_bins):
+        n = int(_value(count))
+        samples = np.ctypeslib.as_array((c_double * n).from_address(_address(data)))
+        spectrum = np.fft.rfft(samples)[:int(_value(n_bins))]
+        _write_array(bins, 2 * np.abs(spectrum) / n)
+        if phase is not None:
+            _write_array(phase, np.angle(spectrum))
+        return 1
+
+
+##################
+# Simulated WF_SDK
+##################
+
+scene = default_scene()
+dwf = SimulatedDwf(scene)
+
+
+def use_scene(new_scene):
+    '''
+    Replace the scene driving the simulated instruments
+
+    Parameters:
+        new_scene (SimulatedScene): The new scene
+
+    Returns:
+        new_scene (SimulatedScene): The scene now in use
+    '''
+    global scene
+    scene = new_scene
+    dwf.scene = new_scene
+    return new_scene
+
+
+def check_error(*args):
+    '''
+    The simulated library never reports an error
+    '''
+    return None
+
+
+def _wait_done(status_fn, handle):
+    sts = c_ubyte()
+    while True:
+        status_fn(handle, c_bool(True), byref(sts))
+        if sts.value == DwfStateDone.value:
+            return
+        time.sleep(1e-4)
+
+
+class WF_SDK:
+    '''
+    Stand-in for the WF_SDK package built on the simulated libdwf
+    '''
+
+    class error(Exception):
+        def __init__(self, message, function, instrument):
+            self.message = message
+            self.function = function
+            self.instrument = instrument
+            super().__init__(message)
+
+    class device:
+        class data:
+            handle = c_int(0)
+            name = ""
+            version = "simulated"
+            serial = ""
+
+        @staticmethod
+        def open(device="", config=0):
+            device_data = WF_SDK.device.data()
+            device_data.handle = c_int(dwf.open_device(device))
+            model = dwf.devices[device_data.handle.value].model
+            device_data.name = model['name']
+            device_data.serial = model['serial']
+            return device_data
+
+        @staticmethod
+        def close(device_data):
+            dwf.FDwfDeviceClose(device_data.handle)
+
+        @staticmethod
+        def check_error(*args):
+            return None
+
+    class scope:
+        class trigger_source:
+            none = trigsrcNone
+            analog = trigsrcDetectorAnalogIn
+            digital = trigsrcDetectorDigitalIn
+            external = [None, trigsrcExternal1, trigsrcExternal2, trigsrcExternal3, trigsrcExternal4]
+
+        class data:
+            sampling_frequency = 20e06
+            buffer_size = 8192
+            max_buffer_size = 0
+
+        @staticmethod
+        def open(device_data, sampling_frequency=20e06, buffer_size=0, offset=0, amplitude_range=5):
+            handle = device_data.handle
+            dwf.FDwfAnalogInChannelEnableSet(handle, c_int(-1), c_bool(True))
+            buffer_max = c_int()
+            dwf.FDwfAnalogInBufferSizeInfo(handle, None, byref(buffer_max))
+            WF_SDK.scope.data.max_buffer_size = buffer_max.value
+            WF_SDK.scope.data.buffer_size = buffer_size if buffer_size else buffer_max.value
+            WF_SDK.scope.data.sampling_frequency = sampling_frequency
+            dwf.FDwfAnalogInAcquisitionModeSet(handle, acqmodeSingle)
+            dwf.FDwfAnalogInFrequencySet(handle, c_double(sampling_frequency))
+            dwf.FDwfAnalogInBufferSizeSet(handle, c_int(WF_SDK.scope.data.buffer_size))
+
+        @staticmethod
+        def measure(device_data, channel):
+            voltage = c_double()
+            dwf.FDwfAnalogInConfigure(device_data.handle, c_bool(False), c_bool(False))
+            dwf.FDwfAnalogInStatus(device_data.handle, c_bool(False), None)
+            dwf.FDwfAnalogInStatusSample(device_data.handle, c_int(channel - 1), byref(voltage))
+            return voltage.value
+
+        @staticmethod
+        def trigger(device_data, enable, source=None, channel=1, timeout=0, edge_rising=True, level=0):
+            return None
+
+        @staticmethod
+        def record(device_data, channel):
+            handle = device_data.handle
+            dwf.FDwfAnalogInConfigure(handle, c_bool(False), c_bool(True))
+            _wait_done(dwf.FDwfAnalogInStatus, handle)
+            buffer = (c_double * WF_SDK.scope.data.buffer_size)()
+            dwf.FDwfAnalogInStatusData(handle, c_int(channel - 1), buffer, c_int(len(buffer)))
+            return [float(value) for value in buffer]
+
+        @staticmethod
+        def close(device_data):
+            dwf.FDwfAnalogInReset(device_data.handle)
+
+    class wavegen:
+        class function:
+            custom = funcCustom
+            sine = funcSine
+            square = funcSquare
+            triangle = funcTriangle
+            noise = funcNoise
+            dc = funcDC
+            pulse = funcPulse
+            trapezium = funcTrapezium
+            sine_power = funcSinePower
+            ramp_up = funcRampUp
+            ramp_down = funcRampDown
+
+        @staticmethod
+        def generate(device_data, channel, function, offset, frequency=1e03, amplitude=1, symmetry=50, wait=0, run_time=0, repeat=0, data=[]):
+            handle = device_data.handle
+            channel = c_int(channel - 1)
+            dwf.FDwfAnalogOutNodeFunctionSet(handle, channel, AnalogOutNodeCarrier, function)
+            dwf.FDwfAnalogOutNodeFrequencySet(handle, channel, AnalogOutNodeCarrier, c_double(frequency))
+            dwf.FDwfAnalogOutNodeAmplitudeSet(handle, channel, AnalogOutNodeCarrier, c_double(amplitude))
+            dwf.FDwfAnalogOutNodeOffsetSet(handle, channel, AnalogOutNodeCarrier, c_double(offset))
+            dwf.FDwfAnalogOutNodeSymmetrySet(handle, channel, AnalogOutNodeCarrier, c_double(symmetry))
+            dwf.FDwfAnalogOutConfigure(handle, channel, c_bool(True))
+
+        @staticmethod
+        def close(device_data, channel=0):
+            dwf.FDwfAnalogOutReset(device_data.handle, c_int(channel - 1))
+
+    class logic:
+        class data:
+            sampling_frequency = 100e06
+            buffer_size = 0
+            max_buffer_size = 0
+
+        @staticmethod
+        def open(device_data, sampling_frequency=100e06, buffer_size=0):
+            handle = device_data.handle
+            clock = c_double()
+            dwf.FDwfDigitalInInternalClockInfo(handle, byref(clock))
+            dwf.FDwfDigitalInDividerSet(handle, c_int(int(clock.value / sampling_frequency)))
+            dwf.FDwfDigitalInSampleFormatSet(handle, c_int(16))
+            buffer_max = c_int()
+            dwf.FDwfDigitalInBufferSizeInfo(handle, byref(buffer_max))
+            WF_SDK.logic.data.max_buffer_size = buffer_max.value
+            WF_SDK.logic.data.buffer_size = buffer_size if 0 < buffer_size <= buffer_max.value else buffer_max.value
+            WF_SDK.logic.data.sampling_frequency = sampling_frequency
+            dwf.FDwfDigitalInBufferSizeSet(handle, c_int(WF_SDK.logic.data.buffer_size))
+            dwf.FDwfDigitalInTriggerSourceSet(handle, trigsrcNone)
+
+        @staticmethod
+        def trigger(device_data, enable, channel, position=0, timeout=0, rising_edge=True, length_min=0, length_max=20, count=0):
+            handle = device_data.handle
+            dwf.FDwfDigitalInTriggerSourceSet(handle, trigsrcDetectorDigitalIn if enable else trigsrcNone)
+            dwf.FDwfDigitalInTriggerPositionSet(handle, c_int(WF_SDK.logic.data.buffer_size - position))
+            dwf.FDwfDigitalInTriggerAutoTimeoutSet(handle, c_double(timeout))
+            mask = c_int(1 << channel)
+            if rising_edge:
+                dwf.FDwfDigitalInTriggerSet(handle, c_int(0), c_int(0), mask, c_int(0))
+            else:
+                dwf.FDwfDigitalInTriggerSet(handle, c_int(0), c_int(0), c_int(0), mask)
+
+        @staticmethod
+        def record(device_data, channel):
+            handle = device_data.handle
+            dwf.FDwfDigitalInConfigure(handle, c_bool(False), c_bool(True))
+            _wait_done(dwf.FDwfDigitalInStatus, handle)
+            buffer = (c_uint16 * WF_SDK.logic.data.buffer_size)()
+            dwf.FDwfDigitalInStatusData(handle, buffer, c_int(2 * len(buffer)))
+            return [int(word >> channel) & 1 for word in buffer]
+
+        @staticmethod
+        def close(device_data):
+            dwf.FDwfDigitalInReset(device_data.handle)
+
+    class pattern:
+        class function:
+            pulse = 0
+            custom = 1
+            random = 2
+
+        @staticmethod
+        def generate(device_data, channel, function, frequency, duty_cycle=50, data=[], wait=0, repeat=0, run_time=0, idle=0, trigger_enabled=False, trigger_source=None, trigger_edge_rising=True):
+            with scene.lock:
+                scene.logic_pins[channel] = LogicClock(frequency, duty=duty_cycle / 100)
+
+        @staticmethod
+        def close(device_data):
+            return None
@@ -0,0 +1,105 @@
+'''
+Constants of the simulated WaveForms backend.
+Mirrors the names and ctypes types of dwfconstants.py from the WaveForms SDK
+so the tests can use either one through dwf_backend.
+'''
+from ctypes import *
+
+# device handle
+hdwfNone = c_int(0)
+
+# device enumeration filters
+enumfilterAll = c_int(0)
+enumfilterEExplorer = c_int(1)
+enumfilterDiscovery = c_int(2)
+enumfilterDiscovery2 = c_int(3)
+enumfilterDDiscovery = c_int(4)
+
+# device ID
+devidEExplorer = c_int(1)
+devidDiscovery = c_int(2)
+devidDiscovery2 = c_int(3)
+devidDDiscovery = c_int(4)
+
+# instrument states
+DwfStateReady = c_ubyte(0)
+DwfStateConfig = c_ubyte(4)
+DwfStatePrefill = c_ubyte(5)
+DwfStateArmed = c_ubyte(1)
+DwfStateWait = c_ubyte(7)
+DwfStateTriggered = c_ubyte(3)
+DwfStateRunning = c_ubyte(3)
+DwfStateDone = c_ubyte(2)
+
+# acquisition modes
+acqmodeSingle = c_int(0)
+acqmodeScanShift = c_int(1)
+acqmodeScanScreen = c_int(2)
+acqmodeRecord = c_int(3)
+acqmodeOvers = c_int(4)
+acqmodeSingle1 = c_int(5)
+
+# trigger sources
+trigsrcNone = c_ubyte(0)
+trigsrcPC = c_ubyte(1)
+trigsrcDetectorAnalogIn = c_ubyte(2)
+trigsrcDetectorDigitalIn = c_ubyte(3)
+trigsrcAnalogIn = c_ubyte(4)
+trigsrcDigitalIn = c_ubyte(5)
+trigsrcDigitalOut = c_ubyte(6)
+trigsrcAnalogOut1 = c_ubyte(7)
+trigsrcAnalogOut2 = c_ubyte(8)
+trigsrcAnalogOut3 = c_ubyte(9)
+trigsrcAnalogOut4 = c_ubyte(10)
+trigsrcExternal1 = c_ubyte(11)
+trigsrcExternal2 = c_ubyte(12)
+trigsrcExternal3 = c_ubyte(13)
+trigsrcExternal4 = c_ubyte(14)
+
+# analog in filters
+filterDecimate = c_int(0)
+filterAverage = c_int(1)
+filterMinMax = c_int(2)
+
+# analog in trigger types and slopes
+trigtypeEdge = c_int(0)
+trigtypePulse = c_int(1)
+trigtypeTransition = c_int(2)
+DwfTriggerSlopeRise = c_int(0)
+DwfTriggerSlopeFall = c_int(1)
+DwfTriggerSlopeEither = c_int(2)
+
+# analog out nodes
+AnalogOutNodeCarrier = c_int(0)
+AnalogOutNodeFM = c_int(1)
+AnalogOutNodeAM = c_int(2)
+
+# analog out functions
+funcDC = c_ubyte(0)
+funcSine = c_ubyte(1)
+funcSquare = c_ubyte(2)
+funcTriangle = c_ubyte(3)
+funcRampUp = c_ubyte(4)
+funcRampDown = c_ubyte(5)
+funcNoise = c_ubyte(6)
+funcPulse = c_ubyte(7)
+funcTrapezium = c_ubyte(8)
+funcSinePower = c_ubyte(9)
+funcCustom = c_ubyte(30)
+funcPlay = c_ubyte(31)
+
+# digital in clock sources and sample modes
+DwfDigitalInClockSourceInternal = c_int(0)
+DwfDigitalInClockSourceExternal = c_int(1)
+DwfDigitalInSampleModeSimple = c_int(0)
+DwfDigitalInSampleModeNoise = c_int(1)
+
+# spectrum windows
+DwfWindowRectangular = c_int(0)
+DwfWindowTriangular = c_int(1)
+DwfWindowHamming = c_int(2)
+DwfWindowHann = c_int(3)
+DwfWindowCosine = c_int(4)
+DwfWindowBlackmanHarris = c_int(5)
+DwfWindowFlatTop = c_int(6)
+DwfWindowKaiser = c_int(7)
@@ -0,0 +1,305 @@
+'''
+Replay backend for the Pluto SDRs used by the RF tests, for running and
+benchmarking the RF DSP on a machine without radios.
+
+The simulated Plutos expose the adi.Pluto attributes and the rx()/tx() calls
+used by RF_tx_rx_tests.py. Every Rx Pluto receives the RFScene:
+- synthetic tones (Tone) and SCuM-like stepped tones (SteppedTone), with an SNR and a frequency offset
+- IQ recorded to .npy files, served through memory mapping (RecordedIQ for one
+  continuous recording, RecordedSweep for a raw_iq.npy archive of a LUT sweep, one row per step)
+- the cyclic buffer of any transmitting simulated Pluto (the FSK self test), looped
+  back with a delay, a frequency offset and an SNR
+- gaussian noise of scene.noise_rms
+
+Stepped sources move to their next step with scene.next_step(), which stands in for
+SCuM's trigger between two LUT settings.
+
+In real-time mode rx() takes rx_buffer_size / sample_rate of wall time, as on the radio.
+
+Select it with SCUM_SDR_BACKEND=replay (see pluto_backend.py).
+'''
+import threading
+import time
+
+import numpy as np
+
+NOISE_POOL_SAMPLES = 1 << 22
+
+
+##################
+# Signal sources
+##################
+
+def amplitude_for_snr(snr_db, noise_rms):
+    '''
+    Amplitude of a complex tone that is snr_db above complex noise of noise_rms
+    '''
+    return noise_rms * 10 ** (snr_db / 20)
+
+
+def tone(frequency_hz, sample_rate_hz, start_sample, n_samples, phase=0.0):
+    '''
+    Unit complex tone (complex64), phase continuous across buffers
+
+    Parameters:
+        frequency_hz (float): The baseband frequency in Hz
+        sample_rate_hz (float): The sample rate in Hz
+        start_sample (int): The index of the first sample since the receiver started
+        n_samples (int): The number of samples
+        phase (float): The phase at sample 0 in radians
+
+    Returns:
+        samples (numpy array): The tone
+    '''
+    step = 2 * np.pi * frequency_hz / sample_rate_hz
+    # The phase is wrapped in float64 so long captures keep their precision in float32
+    phases = np.mod(phase + step * (start_sample + np.arange(n_samples, dtype=np.float64)), 2 * np.pi).astype(np.float32)
+    samples = np.empty(n_samples, dtype=np.complex64)
+    np.cos(phases, out=samples.real)
+    np.sin(phases, out=samples.imag)
+    return samples
+
+
+class Tone:
+    '''
+    Complex tone at an RF frequency
+    '''
+    def __init__(self, frequency_hz, snr_db=30.0, offset_hz=0.0, phase=0.0):
+        '''
+        Parameters:
+            frequency_hz (float): The RF frequency in Hz
+            snr_db (float): The power above the scene noise
+            offset_hz (float): A frequency error added to frequency_hz
+            phase (float): The starting phase in radians
+        '''
+        self.frequency_hz = frequency_hz
+        self.snr_db = snr_db
+        self.offset_hz = offset_hz
+        self.phase = phase
+
+    def current_frequency_hz(self, scene):
+        return self.frequency_hz + self.offset_hz
+
+    def samples(self, scene, rx_lo, sample_rate_hz, start_sample, n_samples):
+        baseband = self.current_frequency_hz(scene) - rx_lo
+        if abs(baseband) >= sample_rate_hz / 2:
+            return None
+        amplitude = amplitude_for_snr(self.snr_db, scene.noise_rms)
+        return np.float32(amplitude) * tone(baseband, sample_rate_hz, start_sample, n_samples, self.phase)
+
+
+class SteppedTone(Tone):
+    '''
+    Tone that moves to the next frequency of a list on every scene.next_step()
+    (SCuM transmitting its LUT settings one per trigger)
+    '''
+    def __init__(self, frequencies_hz, snr_db=30.0, offset_hz=0.0):
+        '''
+        Parameters:
+            frequencies_hz (list): The RF frequency of each step in Hz
+            snr_db (float): The power above the scene noise
+            offset_hz (float): A frequency error added to every step
+        '''
+        super().__init__(frequencies_hz[0], snr_db, offset_hz)
+        self.frequencies_hz = np.asarray(frequencies_hz, dtype=np.float64)
+
+    def current_frequency_hz(self, scene):
+        return self.frequencies_hz[min(scene.step, len(self.frequencies_hz) - 1)] + self.offset_hz
+
+
+class RecordedIQ:
+    '''
+    A continuous IQ recording (1-D complex .npy file), served buffer after buffer
+    (wrapping around) and shifted to the Rx LO
+    '''
+    def __init__(self, path, center_hz, gain=1.0):
+        '''
+        Parameters:
+            path (str): The .npy file, memory mapped
+            center_hz (float): The LO the recording was made at
+            gain (float): Scale applied to the recorded samples
+        '''
+        self.iq = np.load(path, mmap_mode='r')
+        self.center_hz = center_hz
+        self.gain = gain
+        self._position = 0
+
+    def samples(self, scene, rx_lo, sample_rate_hz, start_sample, n_samples):
+        indices = (self._position + np.arange(n_samples)) % len(self.iq)
+        self._position = int((self._position + n_samples) % len(self.iq))
+        samples = np.float32(self.gain) * np.asarray(self.iq[indices], dtype=np.complex64)
+        if rx_lo != self.center_hz:
+            samples *= tone(self.center_hz - rx_lo, sample_rate_hz, start_sample, n_samples)
+        return samples
+
+
+class RecordedSweep:
+    '''
+    A recorded LUT sweep (the raw_iq.npy archive of RF_SCuM_test, one row per step):
+    every rx() serves the row of the current scene step, as recorded
+    '''
+    def __init__(self, path, gain=1.0):
+        '''
+        Parameters:
+            path (str): The .npy archive, memory mapped
+            gain (float): Scale applied to the recorded samples
+        '''
+        self.iq = np.load(path, mmap_mode='r')
+        self.gain = gain
+
+    def samples(self, scene, rx_lo, sample_rate_hz, start_sample, n_samples):
+        row = self.iq[min(scene.step, len(self.iq) - 1)]
+        return np.float32(self.gain) * np.resize(np.asarray(row, dtype=np.complex64), n_samples)
+
+
+class RFScene:
+    '''
+    Signals received by the simulated Rx Plutos
+    '''
+    def __init__(self, realtime=True, noise_rms=1.0, seed=0):
+        self.sources = []                 # Tone / SteppedTone / RecordedIQ / RecordedSweep
+        self.noise_rms = noise_rms        # Complex noise rms added to every buffer
+        self.loopback_snr_db = 40.0       # Tx Pluto buffers arrive this far above the noise...
+        self.loopback_offset_hz = 0.0     # ...with this frequency error...
+        self.loopback_delay_samples = 1234  # ...and this delay
+        self.realtime = realtime
+        self.step = 0
+        self.transmitters = []
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self._noise = None
+
+    def next_step(self, *args, **kwargs):
+        '''
+        Move the stepped sources to their next step (takes and ignores wait_for_trigger's arguments)
+        '''
+        self.step += 1
+
+    def noise(self, n_samples):
+        '''
+        Complex gaussian noise of noise_rms, read at a random offset from a pool
+        generated once (NOISE_POOL_SAMPLES), so large buffers cost a copy and not a draw
+        '''
+        with self.lock:
+            if self._noise is None:
+                pool = self.rng.standard_normal(2 * NOISE_POOL_SAMPLES, dtype=np.float32).view(np.complex64)
+                self._noise = pool * np.float32(self.noise_rms / np.sqrt(2))
+            start = int(self.rng.integers(NOISE_POOL_SAMPLES))
+        return np.take(self._noise, np.arange(start, start + n_samples), mode='wrap')
+
+    def receive(self, rx_lo, sample_rate_hz, start_sample, n_samples):
+        '''
+        Samples seen by an Rx Pluto (complex64)
+
+        Parameters:
+            rx_lo (float): The Rx LO in Hz
+            sample_rate_hz (float): The sample rate in Hz
+            start_sample (int): The sample count of the receiver before this buffer (keeps tones continuous)
+            n_samples (int): The buffer size
+        '''
+        samples = self.noise(n_samples)
+
+        for source in self.sources:
+            signal = source.samples(self, rx_lo, sample_rate_hz, start_sample, n_samples)
+            if signal is not None:
+                samples += signal
+
+        for tx in self.transmitters:
+            if tx.cyclic_samples is None:
+                continue
+            baseband = tx.tx_lo - rx_lo + self.loopback_offset_hz
+            if abs(baseband) >= sample_rate_hz / 2:
+                continue
+            period = tx.cyclic_samples
+            indices = (start_sample + self.loopback_delay_samples + np.arange(n_samples)) % len(period)
+            scale = amplitude_for_snr(self.loopback_snr_db, self.noise_rms) / max(np.sqrt(np.mean(np.abs(period) ** 2)), 1e-12)
+            samples += np.float32(scale) * period[indices] * tone(baseband, sample_rate_hz, start_sample, n_samples)
+        return samples
+
+
+def scum_lut_scene(steps, tone_offset_hz=123e3, snr_db=30.0, realtime=True):
+    '''
+    Scene with SCuM transmitting one tone per LUT step, at the planned LO of the step
+    plus tone_offset_hz and a smooth drift across the sweep
+
+    Parameters:
+        steps (list): [coarse, mid, fine, lo] of each step (lut_sweep_settings / full_lut_sweep_settings)
+        tone_offset_hz (float): The offset of the tones from the planned LO
+        snr_db (float): The tone power above the noise
+        realtime (bool): Whether rx() takes real time
+
+    Returns:
+        [scene, frequencies] (list): The scene and the true tone frequency of each step
+    '''
+    scene = RFScene(realtime=realtime)
+    planned = np.array([step[3] for step in steps], dtype=np.float64)
+    frequencies = planned + tone_offset_hz + 5e3 * np.sin(np.arange(len(steps)) / 40)
+    scene.sources.append(SteppedTone(frequencies, snr_db=snr_db))
+    return [scene, frequencies]
+
+
+scene = RFScene()
+
+
+def use_scene(new_scene):
+    '''
+    Replace the scene received by the simulated Plutos
+
+    Parameters:
+        new_scene (RFScene): The new scene
+
+    Returns:
+        new_scene (RFScene): The scene now in use
+    '''
+    global scene
+    for tx in scene.transmitters:
+        new_scene.transmitters.append(tx)
+    scene = new_scene
+    return new_scene
+
+
+##################
+# Simulated Pluto
+##################
+
+class Pluto:
+    '''
+    Stand-in for adi.Pluto, receiving the module scene
+    '''
+    def __init__(self, uri=""):
+        self.uri = uri
+        self.rx_lo = int(2.4e9)
+        self.tx_lo = int(2.4e9)
+        self.sample_rate = int(30.72e6)
+        self.rx_rf_bandwidth = int(18e6)
+        self.tx_rf_bandwidth = int(18e6)
+        self.rx_buffer_size = 1024
+        self.gain_control_mode_chan0 = "slow_attack"
+        self.tx_hardwaregain_chan0 = -10
+        self.tx_cyclic_buffer = False
+        self.cyclic_samples = None
+        self._samples_received = 0
+        scene.transmitters.append(self)
+
+    def rx(self):
+        '''
+        Receive one buffer of rx_buffer_size samples
+        '''
+        n_samples = int(self.rx_buffer_size)
+        samples = scene.receive(self.rx_lo, self.sample_rate, self._samples_received, n_samples)
+        self._samples_received += n_samples
+        if scene.realtime:
+            time.sleep(n_samples / self.sample_rate)
+        return samples
+
+    def tx(self, data):
+        '''
+        Start transmitting (only cyclic buffers are simulated)
+        '''
+        self.cyclic_samples = np.asarray(data, dtype=np.complex64).copy()
+
+    def tx_destroy_buffer(self):
+        self.cyclic_samples = None
+
+    def rx_destroy_buffer(self):
+        pass
@@ -0,0 +1,267 @@
+'''
+Runs the RF tests against the Pluto replay backend and times them, without any
+radio attached.
+
+The self test is looped back through the simulated Plutos, and the SCuM LUT sweeps
+are fed either a synthetic stepped tone (checked against its known frequencies) or
+a recorded sweep (the raw_iq.npy archive of an earlier RF_SCuM_test, checked against
+the lut_values.csv next to it). SCuM's trigger between two LUT settings is replaced
+by stepping the scene, so only the receive and analysis time is measured.
+
+Usage:
+    python rf_replay_benchmark.py [repeats] [--fast] [--full] [--recorded=PATH]
+        repeats:         number of times each benchmark is run (default 1)
+        --fast:          use virtual time instead of real-time Rx buffers
+        --full:          also run the full resolution (7 x 32 x 32) LUT sweep
+        --recorded=PATH: replay a raw_iq.npy archive instead of the synthetic sweep
+'''
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Must be set before anything imports pluto_backend or dwf_backend
+os.environ['SCUM_SDR_BACKEND'] = 'replay'
+os.environ['SCUM_DWF_BACKEND'] = 'sim'
+
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from Validation.Tests import RF_tx_rx_tests, simulated_pluto
+from Validation.Tests.lut_store import LutStore
+from Validation.simulated_benchmark import time_call, print_timing
+
+# Allowed error against the scene ground truth
+LUT_TOLERANCE_HZ = 200
+FULL_LUT_TOLERANCE_HZ = 2e3
+
+# Drift of one coarse band seen by the incremental resweep
+RESWEEP_DRIFT_HZ = 100e3
+
+# Incremental resweeps without drift after the drifted one (each must only capture the probes)
+STEADY_RESWEEPS = 2
+
+# Frequency jump in some (coarse, mid) rows of the sparse sweep, from SPARSE_KINK_FINE on
+SPARSE_KINK_HZ = 60e3
+SPARSE_KINK_FINE = 20
+
+
+def check_self_test_results(results):
+    '''
+    The looped back self test must pass without bit errors
+
+    Returns:
+        errors (list): Description of each mismatch
+    '''
+    values = {value['name']: value['value'] for value in results[0]['values']}
+    if not results[0]['pass']:
+        return [f"self test failed: {values}"]
+    return []
+
+
+def check_lut(measured, expected, tolerance_hz):
+    '''
+    Compare measured LUT frequencies with the expected ones
+
+    Parameters:
+        measured (numpy array): The measured frequency of each step in Hz
+        expected (numpy array): The expected frequency of each step in Hz
+        tolerance_hz (float): The allowed error
+
+    Returns:
+        errors (list): Description of each mismatch
+    '''
+    error = np.abs(np.asarray(measured, dtype=np.float64) - expected)
+    bad = np.flatnonzero(~(error <= tolerance_hz))
+    if bad.size == 0:
+        return []
+    return [f"{bad.size} of {len(expected)} steps off by more than {tolerance_hz:.0f} Hz (worst {np.nanmax(error):.1f} Hz at step {int(np.nanargmax(error))})"]
+
+
+def check_lut_store(path, steps, expected, tolerance_hz):
+    '''
+    The saved LUT must give back the setting of every expected frequency
+
+    Returns:
+        [errors, query_time] (list): Description of each mismatch and the mean nearest() time in seconds
+    '''
+    lut = LutStore.load(path)
+    errors = []
+    start = time.perf_counter()
+    matches = [lut.nearest(frequency, tolerance_hz) for frequency in expected]
+    query_time = (time.perf_counter() - start) / len(expected)
+    wrong = sum(1 for match, step in zip(matches, steps) if match is None or [match['coarse'], match['mid'], match['fine']] != list(step[:3]))
+    if wrong:
+        errors.append(f"{wrong} of {len(expected)} frequencies looked up to the wrong setting")
+    return [errors, query_time]
+
+
+def check_resweep(summary, drifted_coarse):
+    '''
+    The incremental resweep must re-measure exactly the regions of the drifted coarse setting
+
+    Returns:
+        errors (list): Description of each mismatch
+    '''
+    errors = []
+    for region in summary['regions']:
+        if region['re_measured'] != (region['coarse'] == drifted_coarse):
+            errors.append(f"coarse {region['coarse']} mids {region['mids']}: re-measured {region['re_measured']}, drift {region['probe_drift_hz']} Hz")
+    return errors
+
+
+def run_sweep(test, scene):
+    '''
+    Run one LUT sweep on a fresh step count of the scene
+
+    Returns:
+        success (bool): The result of the test
+    '''
+    scene.step = 0
+    return test(None)
+
+
+def run_benchmark(repeats=1, realtime=True, full=False, recorded=None):
+    '''
+    Run and time the RF tests on the replay backend
+
+    Parameters:
+        repeats (int): The number of runs per benchmark
+        realtime (bool): Whether Rx buffers take real time
+        full (bool): Also run the full resolution LUT sweep
+        recorded (str): A raw_iq.npy archive to replay instead of the synthetic sweep
+
+    Returns:
+        all_ok (bool): True if every result matched the scene
+    '''
+    # Results go to a scratch folder, SCuM's trigger is stood in for by the scene steps
+    RF_tx_rx_tests.default_results_path = os.path.join(tempfile.mkdtemp(), 'ResultBackups', 'PlutoResults')
+    os.makedirs(RF_tx_rx_tests.default_results_path)
+    RF_tx_rx_tests.RF_SCUM_CHIP_ID = 'replay'
+    all_ok = True
+
+    print(f"RF replay benchmark ({'real-time' if realtime else 'virtual time'}, {repeats} runs)")
+    print("---------------------------------------------")
+
+    scene = simulated_pluto.use_scene(simulated_pluto.RFScene(realtime=realtime))
+    results, times = time_call(RF_tx_rx_tests.RF_self_test, repeats)
+    errors = check_self_test_results(results)
+    print_timing("RF_self_test", times, errors)
+    all_ok &= not errors
+
+    steps = RF_tx_rx_tests.lut_sweep_settings()
+    if recorded is None:
+        scene, expected = simulated_pluto.scum_lut_scene(steps, realtime=realtime)
+    else:
+        # The recording already holds the receiver noise
+        scene = simulated_pluto.RFScene(realtime=realtime, noise_rms=0.0)
+        scene.sources.append(simulated_pluto.RecordedSweep(recorded))
+        expected = pd.read_csv(os.path.join(os.path.dirname(recorded), "lut_values.csv")).iloc[0].values.astype(np.float64)
+    simulated_pluto.use_scene(scene)
+    RF_tx_rx_tests.wait_for_trigger = scene.next_step
+
+    ok, times = time_call(lambda: run_sweep(RF_tx_rx_tests.RF_SCuM_test, scene), repeats)
+    if ok:
+        lut = pd.read_csv(os.path.join(RF_tx_rx_tests.timestamped_path, "lut_values.csv")).iloc[0].values
+        errors = check_lut(lut, expected, LUT_TOLERANCE_HZ)
+    else:
+        errors = ["sweep did not complete"]
+    print_timing("RF_SCuM_test", times, errors)
+    timings = RF_tx_rx_tests.sweep_timings
+    print(f"    last run: rx bound {timings['rx bound']:.2f} s, compute bound {timings['compute bound']:.2f} s")
+    all_ok &= not errors
+
+    if ok:
+        errors, query_time = check_lut_store(RF_tx_rx_tests.lut_file, steps, expected, LUT_TOLERANCE_HZ)
+        print_timing("LutStore.nearest", [query_time], errors)
+        print(f"    {query_time * 1e6:.1f} us per lookup")
+        all_ok &= not errors
+
+    if ok and recorded is None:
+        # One coarse band drifts, the resweep starts from the LUT saved above (run once, it saves a new LUT)
+        drifted_coarse = steps[len(steps) // 2][0]
+        scene, expected = simulated_pluto.scum_lut_scene(steps, realtime=realtime)
+        expected[[step[0] == drifted_coarse for step in steps]] += RESWEEP_DRIFT_HZ
+        scene.sources[0].frequencies_hz = expected
+        simulated_pluto.use_scene(scene)
+        RF_tx_rx_tests.wait_for_trigger = scene.next_step
+        RF_tx_rx_tests.RF_LUT_INCREMENTAL = True
+
+        for resweep in range(1 + STEADY_RESWEEPS):
+            resweep_ok, times = time_call(lambda: run_sweep(RF_tx_rx_tests.RF_SCuM_test, scene), 1)
+            if resweep_ok:
+                lut = pd.read_csv(os.path.join(RF_tx_rx_tests.timestamped_path, "lut_values.csv")).iloc[0].values
+                summary = RF_tx_rx_tests.resweep_summary
+                errors = check_lut(lut, expected, LUT_TOLERANCE_HZ) + check_resweep(summary, drifted_coarse if resweep == 0 else None)
+                # Carried over steps stay measured (with the run they were measured in) for the next resweep
+                saved = LutStore.load(RF_tx_rx_tests.lut_file).entries
+                remembered = int(np.count_nonzero(saved['measured'] & (saved['measured_run'] != '')))
+                if remembered != len(steps):
+                    errors.append(f"{remembered} of {len(steps)} steps saved with the run they were measured in")
+                if resweep > 0 and summary['captures'] != len(summary['regions']):
+                    errors.append(f"{summary['captures']} steps captured without drift, expected only the {len(summary['regions'])} probes")
+            else:
+                errors = ["sweep did not complete"]
+            print_timing("RF_SCuM_test (incremental)" if resweep == 0 else f"RF_SCuM_test (incremental, steady {resweep})", times, errors)
+            if resweep_ok:
+                print(f"    {summary['captures']} of {summary['steps']} steps captured, {summary['re_measured']} of {len(summary['regions'])} regions re-measured")
+            all_ok &= not errors
+            # Each run needs its own timestamped results folder
+            time.sleep(1)
+        RF_tx_rx_tests.RF_LUT_INCREMENTAL = False
+
+    if full:
+        steps = RF_tx_rx_tests.full_lut_sweep_settings()
+        scene, expected = simulated_pluto.scum_lut_scene(steps, realtime=realtime)
+        simulated_pluto.use_scene(scene)
+        RF_tx_rx_tests.wait_for_trigger = scene.next_step
+
+        ok, times = time_call(lambda: run_sweep(RF_tx_rx_tests.RF_SCuM_full_lut_test, scene), repeats)
+        if ok:
+            lut = np.load(os.path.join(RF_tx_rx_tests.timestamped_path, "lut_full.npy"))
+            errors = check_lut(lut['frequency_hz'], expected, FULL_LUT_TOLERANCE_HZ)
+        else:
+            errors = ["sweep did not complete"]
+        print()
+        print_timing("RF_SCuM_full_lut_test", times, errors)
+        all_ok &= not errors
+
+        # Sparse sweep, on a LUT where every 50th row has a jump the grid has to catch
+        scene, expected = simulated_pluto.scum_lut_scene(steps, realtime=realtime)
+        kinked = np.array([step[1] % 50 == 7 and step[2] >= SPARSE_KINK_FINE for step in steps])
+        expected[kinked] += SPARSE_KINK_HZ
+        scene.sources[0].frequencies_hz = expected
+        simulated_pluto.use_scene(scene)
+        RF_tx_rx_tests.wait_for_trigger = scene.next_step
+        RF_tx_rx_tests.RF_LUT_MODEL_SPARSE = True
+
+        ok, times = time_call(lambda: run_sweep(RF_tx_rx_tests.RF_SCuM_full_lut_test, scene), repeats)
+        RF_tx_rx_tests.RF_LUT_MODEL_SPARSE = False
+        if ok:
+            lut = np.load(os.path.join(RF_tx_rx_tests.timestamped_path, "lut_full.npy"))
+            measured = lut['measured']
+            # Predicted steps of a jumped row, passed before the grid caught the jump, cannot be right
+            kinked_rows = np.array([step[1] % 50 == 7 for step in steps])
+            checked = measured | ~kinked_rows
+            errors = check_lut(lut['frequency_hz'][measured], expected[measured], FULL_LUT_TOLERANCE_HZ)
+            errors += check_lut(lut['frequency_hz'][checked & ~measured], expected[checked & ~measured], RF_tx_rx_tests.RF_LUT_MODEL_TOLERANCE_HZ)
+        else:
+            errors = ["sweep did not complete"]
+        print()
+        print_timing("RF_SCuM_full_lut_test (sparse)", times, errors)
+        if ok:
+            summary = RF_tx_rx_tests.full_lut_summary
+            print(f"    {int(measured.sum())} of {len(steps)} steps captured ({measured.mean() * 100:.1f}%), {summary['refined_rows']} rows captured densely")
+        all_ok &= not errors
+
+    return all_ok
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    repeats = int(args[0]) if args else 1
+    recorded = next((arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--recorded=')), None)
+    ok = run_benchmark(repeats, realtime='--fast' not in sys.argv, full='--full' in sys.argv, recorded=recorded)
+    sys.exit(0 if ok else 1)
@@ -16,7 +16,7 @@ from time import sleep
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../__VendorAPIs/Diligent')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) 
 
-import WF_SDK
+from Validation.Tests.dwf_backend import WF_SDK
 from Validation.Tests.analog_test import validate_analog_signals
 from config import *
 from Validation.Tests.digital_test import run_logic_analysis
@@ -24,10 +24,10 @@ from Utilities import report_generation
 from Utilities.PicoControl.pico_control import connect_to_pico, send_command_to_pico
 from Utilities.scum_program import scum_program
 from Validation.Tests.power_test import joulescope_start, stop_joulescope
-from Validation.Tests.serial_baud_test import find_best_baud_rate
-from Validation.Tests.RF_tx_rx_tests import RF_SCuM_test, RF_end_test, RF_self_test
+from Validation.Tests.serial_baud_test import find_best_baud_rate, find_baud_rate_from_logic
+from Validation.Tests.RF_tx_rx_tests import RF_SCuM_test, RF_SCuM_full_lut_test, RF_end_test, RF_self_test
 
-from Validation.Tests.helpers import wait_for_trigger
+from Validation.Tests.helpers import wait_for_trigger, start_trigger_listener, stop_trigger_listener, TriggerTimeline
 
 def clear_terminal():
     '''
@@ -48,10 +48,10 @@ binary_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'C-Source/
 tests = {
     'Radio Self Test':        { 'function': RF_self_test,            'independent': True},
     'Program upload':         { 'function': scum_program,            'independent': True},
-    'Radio communication':    { 'function': RF_SCuM_test,            'independent': False},
+    'Radio communication':    { 'function': RF_SCuM_full_lut_test if RF_SCUM_FULL_LUT else RF_SCuM_test, 'independent': False},
     'Digital input/output':   { 'function': run_logic_analysis,      'independent': False}, 
     'Analog validation':      { 'function': validate_analog_signals, 'independent': False}, 
-    'Serial communication':   { 'function': find_best_baud_rate,     'independent': False}, 
+    'Serial communication':   { 'function': find_baud_rate_from_logic if SERIAL_BAUD_FROM_LOGIC else find_best_baud_rate, 'independent': False}, 
     'Power Consumption':      { 'function': stop_joulescope,         'independent': True}, 
 }
 
@@ -147,6 +147,12 @@ if __name__ == '__main__':
         # Use AD2 for digital testing
         dd_handle = ad_handle
 
+    # Keep the trigger pin recorded so each wait_for_trigger only waits for the edge.
+    # Not on a shared AD2: the listener thread would poll the device while the analog tests drive it
+    trigger_timeline = TriggerTimeline()
+    if not AD2_FOR_DIGITAL:
+        start_trigger_listener(dd_handle, timeline=trigger_timeline)
+
     # Startup the joule scope monitoring thread
     joulescope_start()
 
@@ -185,10 +191,12 @@ if __name__ == '__main__':
         print(f"Starting {test_name} test...")
         print("---------------------------------------------")
         # Wait for trigger from SCuM to start the test
+        trigger_timeline.set_phase(f"{test_name} (waiting)")
         with contextlib.redirect_stdout(io.StringIO()):
                     wait_for_trigger(dd_handle)
         #wait_for_trigger(dd_handle)
-        sleep(1)
+        trigger_timeline.set_phase(test_name)
+        trigger_timeline.sleep(1, f"{test_name} start delay")
         # Declare the test being run
         print(f"Running test: {test_name}")
 
@@ -200,8 +208,11 @@ if __name__ == '__main__':
             send_command_to_pico(pico_serial, "0_32")
             send_command_to_pico(pico_serial, "1_32")
             send_command_to_pico(pico_serial, "2_32")
-            # Run the test
+            # Run the test (the logic analyzer is needed, pause the trigger listener)
+            stop_trigger_listener(dd_handle)
             results_handle.extend(test_info['function'](dd_handle, TRIGGER_PIN_NUM))
+            if not AD2_FOR_DIGITAL:
+                start_trigger_listener(dd_handle, timeline=trigger_timeline)
             # Enable all MUX
             send_command_to_pico(pico_serial, "0_33")
             send_command_to_pico(pico_serial, "1_33")
@@ -211,6 +222,13 @@ if __name__ == '__main__':
             results_handle.extend(test_info['function'](ad_handle, pico_serial))
             print("\n")
 
+        elif test_name == 'Serial communication' and SERIAL_BAUD_FROM_LOGIC:
+            # Run the test (the logic analyzer is needed, pause the trigger listener)
+            stop_trigger_listener(dd_handle)
+            results_handle.extend(test_info['function'](dd_handle))
+            if not AD2_FOR_DIGITAL:
+                start_trigger_listener(dd_handle, timeline=trigger_timeline)
+
         elif test_name == 'Radio communication':
             end_time = time.time()
             elapsed_time = (end_time - start_time) / 60
@@ -218,7 +236,7 @@ if __name__ == '__main__':
             
             success = test_info['function'](dd_handle)
             print("Delay for syncing purposes, will take a minute...")
-            sleep(20)
+            trigger_timeline.sleep(20, "Radio communication sync delay")
             
             #print(success)
             if success:
@@ -248,6 +266,10 @@ if __name__ == '__main__':
             # Run the test
             results_handle.extend(test_info['function']())
 
+    # Trigger edges and fixed delays of the run
+    trigger_timeline.end()
+    test_results[first_unit_test_name]['tests']['Trigger timeline'] = {'results': trigger_timeline.report()}
+
     # Stop the joule scope monitoring and get the results
     print("Getting joule scope monitoring results...")
 
@@ -263,6 +285,7 @@ if __name__ == '__main__':
     report_generation.generate_html_report(test_results, results_location)
 
     # Disconnect from Digilent devices
+    stop_trigger_listener(dd_handle)
     if AD2_FOR_DIGITAL:
         WF_SDK.device.close(dd_handle)
     else:
@@ -0,0 +1,200 @@
+'''
+Runs the analog and digital validation tests against the simulated WaveForms
+backend and times them, without any hardware attached.
+
+Each test is checked against the ground truth of the simulated scene
+(reference voltages, clock ppm errors and logic pins), so changes to the
+measurement code can be benchmarked for both speed and accuracy.
+
+Usage:
+    python simulated_benchmark.py [repeats] [--fast]
+        repeats: number of times each benchmark is run (default 3)
+        --fast:  use virtual time instead of real-time acquisitions
+'''
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Must be set before anything imports dwf_backend
+os.environ['SCUM_DWF_BACKEND'] = 'sim'
+
+import tempfile
+
+import numpy as np
+
+from config import *
+from Validation.Tests import analog_calibration, analog_test, simulated_dwf
+from Validation.Tests.dwf_backend import WF_SDK
+from Validation.Tests.analog_test import validate_analog_signals, estimate_signal_frequency, determine_signal_frequency, sequential_signal_frequency, FREQUENCY_UNCERTAINTY_SIGMAS
+from Validation.Tests.digital_test import run_logic_analysis
+from Utilities.PicoControl.pico_control import send_command_to_pico
+
+# Allowed error against the scene ground truth
+VOLTAGE_TOLERANCE_V = 0.01
+FREQUENCY_TOLERANCE_PPM = 2
+
+# Unused mux input of the default scene the wavegen is looped back through for calibration
+CALIBRATION_MUX_INPUT = 30
+
+# Clocks (nominal Hz, ppm error) estimate_signal_frequency must measure within its reported uncertainty,
+# in step with the scope clock and off by enough ppm to fold harmonics next to the fundamental
+UNCERTAINTY_CHECK_CLOCKS = [(1e6, 60), (1e6, -3), (250e3, 60), (32768, -20), (20e6, 5)]
+
+# Clocks (nominal Hz, ppm error, expected verdict) sequential_signal_frequency must decide at SEQUENTIAL_CHECK_TOLERANCE_PPM
+SEQUENTIAL_CHECK_TOLERANCE_PPM = 40
+SEQUENTIAL_CHECK_CLOCKS = [(1e6, 60, False), (1e6, 5, True), (20e6, -8, True), (20e6, 70, False)]
+
+
+def time_call(function, repeats):
+    '''
+    Time a function over a number of runs
+
+    Parameters:
+        function (callable): The function to run (no arguments)
+        repeats (int): The number of runs
+
+    Returns:
+        [result, times] (list): The result of the last run and the wall time of each run in seconds
+    '''
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return [result, times]
+
+
+def check_analog_results(results, scene):
+    '''
+    Compare validate_analog_signals results with the scene ground truth
+
+    Returns:
+        errors (list): Description of each mismatch
+    '''
+    errors = []
+    expected_voltages = {
+        '1.1V reference voltage': scene.mux_sources[28].level,
+        '1.8V reference voltage': scene.mux_sources[27].level,
+    }
+    for test in results:
+        values = {value['name']: value['value'] for value in test['values']}
+        if test['sub-test'] in expected_voltages:
+            measured = values.get('measured_voltage (V)')
+            expected = expected_voltages[test['sub-test']]
+            if measured is None or abs(measured - expected) > VOLTAGE_TOLERANCE_V:
+                errors.append(f"{test['sub-test']}: measured {measured} V, expected {expected} V")
+
+    for clock in CLOCKS_TO_TEST:
+        mux_input = int(clock['mux-command'].split('_')[1])
+        expected_ppm = scene.mux_sources[mux_input].actual_frequency_hz / clock['exp_freq_hz'] * 1e6 - 1e6
+        test = next((t for t in results if t['sub-test'] == f"{clock['name']} clock signal"), None)
+        if test is None:
+            errors.append(f"{clock['name']}: missing from results")
+            continue
+        ppm = next(value['value'] for value in test['values'] if value['name'] == 'ppm')
+        if abs(ppm - expected_ppm) > FREQUENCY_TOLERANCE_PPM:
+            errors.append(f"{clock['name']}: measured {ppm} ppm, expected {expected_ppm:.3f} ppm")
+    return errors
+
+
+def check_logic_results(results, scene):
+    '''
+    Compare run_logic_analysis results with the scene (every pin carrying a clock must pass)
+
+    Returns:
+        errors (list): Description of each mismatch
+    '''
+    errors = []
+    for test in results:
+        pin = int(test['sub-test'].split()[-1])
+        if isinstance(scene.logic_pins.get(pin), simulated_dwf.LogicClock) and not test['pass']:
+            errors.append(f"{test['sub-test']}: failed on a clock")
+    return errors
+
+
+def print_timing(name, times, errors):
+    status = 'OK' if not errors else f'{len(errors)} MISMATCH(ES)'
+    print(f"{name:<32} mean {np.mean(times) * 1e3:9.1f} ms  min {np.min(times) * 1e3:9.1f} ms  [{status}]")
+    for error in errors:
+        print(f"    {error}")
+
+
+def run_benchmark(repeats=3, realtime=True):
+    '''
+    Run and time the simulated tests
+
+    Parameters:
+        repeats (int): The number of runs per benchmark
+        realtime (bool): Whether acquisitions take real time
+
+    Returns:
+        all_ok (bool): True if every result matched the scene
+    '''
+    scene = simulated_dwf.use_scene(simulated_dwf.default_scene(realtime=realtime))
+    # Calibrate against the scene from scratch, without touching the real calibration cache
+    analog_calibration.CALIBRATION_DIR = tempfile.mkdtemp()
+    analog_test.CALIBRATION_MUX_INPUT = CALIBRATION_MUX_INPUT
+    pico = simulated_dwf.SimulatedPico(scene)
+    ad_handle = WF_SDK.device.open("analogdiscovery2")
+    all_ok = True
+
+    print(f"Simulated benchmark ({'real-time' if realtime else 'virtual time'}, {repeats} runs)")
+    print("---------------------------------------------")
+
+    results, times = time_call(lambda: validate_analog_signals(ad_handle, pico), repeats)
+    errors = check_analog_results(results, scene)
+    print_timing("validate_analog_signals", times, errors)
+    all_ok &= not errors
+
+    # Frequency estimators on the first clock
+    clock = CLOCKS_TO_TEST[0]
+    send_command_to_pico(pico, clock['mux-command'])
+    expected = scene.mux_sources[int(clock['mux-command'].split('_')[1])].actual_frequency_hz
+    for name, estimator in [
+        ("estimate_signal_frequency", lambda: estimate_signal_frequency(ad_handle, channel=1)[0]),
+        ("determine_signal_frequency", lambda: determine_signal_frequency(ad_handle, channel=1)),
+    ]:
+        freq, times = time_call(estimator, repeats)
+        error_ppm = (freq - expected) / expected * 1e6
+        errors = [f"{error_ppm:.3f} ppm from truth"] if abs(error_ppm) > FREQUENCY_TOLERANCE_PPM else []
+        print_timing(name, times, errors)
+        all_ok &= not errors
+
+    # Reported uncertainty against the true error on clocks with a known ppm error
+    mux_input = int(clock['mux-command'].split('_')[1])
+    clock_source = scene.mux_sources[mux_input]
+    for frequency_hz, ppm_error in UNCERTAINTY_CHECK_CLOCKS:
+        scene.mux_sources[mux_input] = simulated_dwf.ClockSignal(frequency_hz, ppm_error=ppm_error, noise_v=clock_source.noise_v)
+        expected = scene.mux_sources[mux_input].actual_frequency_hz
+        (freq, uncertainty), times = time_call(lambda: estimate_signal_frequency(ad_handle, channel=1), repeats)
+        errors = []
+        if abs(freq - expected) > FREQUENCY_UNCERTAINTY_SIGMAS * uncertainty:
+            errors.append(f"{(freq - expected) / expected * 1e6:.3f} ppm from truth, reported 1-sigma {uncertainty / expected * 1e6:.3f} ppm")
+        print_timing(f"uncertainty at {frequency_hz:g} Hz {ppm_error:+g} ppm", times, errors)
+        all_ok &= not errors
+
+    # Early sequential decisions must not pass clocks outside the tolerance
+    for frequency_hz, ppm_error, expected_verdict in SEQUENTIAL_CHECK_CLOCKS:
+        scene.mux_sources[mux_input] = simulated_dwf.ClockSignal(frequency_hz, ppm_error=ppm_error, noise_v=clock_source.noise_v)
+        (_, _, acquisitions, verdict), times = time_call(lambda: sequential_signal_frequency(ad_handle, frequency_hz, SEQUENTIAL_CHECK_TOLERANCE_PPM, channel=1), repeats)
+        errors = [f"verdict {verdict} after {acquisitions} acquisitions, expected {expected_verdict}"] if verdict != expected_verdict else []
+        print_timing(f"sequential at {frequency_hz:g} Hz {ppm_error:+g} ppm", times, errors)
+        all_ok &= not errors
+    scene.mux_sources[mux_input] = clock_source
+
+    results, times = time_call(lambda: run_logic_analysis(ad_handle), repeats)
+    errors = check_logic_results(results, scene)
+    print_timing("run_logic_analysis", times, errors)
+    all_ok &= not errors
+
+    WF_SDK.device.close(ad_handle)
+    return all_ok
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    repeats = int(args[0]) if args else 3
+    ok = run_benchmark(repeats, realtime='--fast' not in sys.argv)
+    sys.exit(0 if ok else 1)